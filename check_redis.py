@@ -1,26 +1,40 @@
+"""
+Summarize a Redis instance without blocking it: memory by key prefix, the
+largest keys and pub/sub channels. Uses the same inspector as
+`python manage.py check_redis`, without needing Django settings.
+
+    python check_redis.py [redis://localhost:6379/0] [--match 'stock:*'] [--values 5]
+"""
+import argparse
+import os
+import sys
 import redis
 
-# Connect to your Redis instance
-r = redis.Redis(host='localhost', port=6379, db=0)  # Adjust host/port as needed
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'django'))
+from casestudy.redis_inspector import (  # noqa: E402
+    MEMORY_SAMPLES, PREFIX_DEPTH, TOP_KEYS, format_report, inspect_keyspace, inspect_pubsub
+)
 
-# List all keys
-keys = r.keys('*')
-print("All keys:", keys)
+parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+parser.add_argument('url', nargs='?', default='redis://localhost:6379/0')  # Adjust host/port as needed
+parser.add_argument('--match', default='*')
+parser.add_argument('--depth', type=int, default=PREFIX_DEPTH)
+parser.add_argument('--top', type=int, default=TOP_KEYS)
+parser.add_argument('--samples', type=int, default=MEMORY_SAMPLES)
+parser.add_argument('--max-keys', type=int, default=None)
+parser.add_argument('--pause', type=int, default=0, help='Milliseconds between SCAN batches')
+parser.add_argument('--values', type=int, default=0, help='Elements shown of each of the largest keys')
+args = parser.parse_args()
 
-# For each key, print its type and value
-for key in keys:
-    key_type = r.type(key).decode('utf-8')
-    print(f"\nKey: {key.decode('utf-8')}")
-    print(f"Type: {key_type}")
-    
-    if key_type == 'string':
-        print(f"Value: {r.get(key).decode('utf-8')}")
-    elif key_type == 'list':
-        print(f"Values: {[x.decode('utf-8') for x in r.lrange(key, 0, -1)]}")
-    elif key_type == 'set':
-        print(f"Values: {[x.decode('utf-8') for x in r.smembers(key)]}")
-    elif key_type == 'hash':
-        hash_data = r.hgetall(key)
-        print("Values:", {k.decode('utf-8'): v.decode('utf-8') for k, v in hash_data.items()})
-    elif key_type == 'zset':
-        print(f"Values: {r.zrange(key, 0, -1, withscores=True)}") 
\ No newline at end of file
+r = redis.Redis.from_url(args.url)
+report = inspect_keyspace(
+    r,
+    match=args.match,
+    depth=args.depth,
+    top=args.top,
+    samples=args.samples,
+    max_keys=args.max_keys,
+    pause=args.pause / 1000,
+)
+for line in format_report(report, inspect_pubsub(r, args.depth), r, args.values):
+    print(line)
@@ -11,6 +11,15 @@ class WebSocketService {
     this.pendingSubscriptions = new Set();
     this.connectionPromise = null;
     this.globalMessageHandlers = [];
+    // Sequence number of the newest price update received, used to resume
+    // after a reconnect without reloading everything
+    this.lastSeq = null;
+    // When the server asked us to come back, see the 'reconnect' frame
+    this.reconnectAt = null;
+    // Server-computed watchlist metrics (value, day change) by watchlist id
+    this.watchlistMetrics = {};
+    this.watchlistMetricsHandlers = [];
+    this.priceAlertHandlers = [];
   }
 
   connect(userId) {
@@ -32,13 +41,22 @@ class WebSocketService {
         }
 
         console.log(`Connecting to WebSocket with user ID: ${userId}`);
-        this.socket = new WebSocket(`ws://localhost:8001/ws/securities/?token=${userId}`);
+        const resumeParam = this.lastSeq ? `&resume_from=${encodeURIComponent(this.lastSeq)}` : '';
+        const socket = new WebSocket(`ws://localhost:8001/ws/securities/?token=${userId}${resumeParam}`);
+        this.socket = socket;
 
         this.socket.onopen = () => {
           // console.log('WebSocket connection established');
           this.isConnected = true;
           this.reconnectAttempts = 0;
           
+          // After a reconnect, resubscribe to everything we had; the server
+          // replays what was missed since lastSeq
+          if (this.subscribedTickers.size > 0) {
+            this.subscribedTickers.forEach(ticker => this.pendingSubscriptions.add(ticker));
+            this.subscribedTickers.clear();
+          }
+          
           // Process any pending subscriptions
           if (this.pendingSubscriptions.size > 0) {
             this.processPendingSubscriptions();
@@ -52,6 +70,11 @@ class WebSocketService {
 
         this.socket.onclose = (event) => {
           this.isConnected = false;
+          // Drop the closed socket without clearing subscriptions, so that a
+          // reconnect resubscribes and resumes from lastSeq
+          if (this.socket === socket) {
+            this.socket = null;
+          }
           // console.log('WebSocket connection closed:', event.code, event.reason);
           
           // Reject the connection promise if it's still pending
@@ -60,6 +83,15 @@ class WebSocketService {
             this.connectionPromise = null;
           }
           
+          // The server told us when to reconnect (overloaded or draining node);
+          // this does not count as a failed attempt
+          if (event.code !== 1000 && this.reconnectAt !== null) {
+            const delay = Math.max(0, this.reconnectAt - Date.now());
+            this.reconnectAt = null;
+            this.reconnectTimeout = setTimeout(() => this.connect(userId), delay);
+            return;
+          }
+          
           // Attempt to reconnect if not a normal closure
           if (event.code !== 1000 && this.reconnectAttempts < this.maxReconnectAttempts) {
             this.reconnectTimeout = setTimeout(() => {
@@ -90,17 +122,18 @@ class WebSocketService {
   }
 
   disconnect() {
+    // Clear all subscriptions
+    this.subscribedTickers.clear();
+    this.pendingSubscriptions.clear();
+    this.lastSeq = null;
+    
+    // Clear reconnect timeout if it exists
+    if (this.reconnectTimeout) {
+      clearTimeout(this.reconnectTimeout);
+      this.reconnectTimeout = null;
+    }
+    
     if (this.socket) {
-      // Clear all subscriptions
-      this.subscribedTickers.clear();
-      this.pendingSubscriptions.clear();
-      
-      // Clear reconnect timeout if it exists
-      if (this.reconnectTimeout) {
-        clearTimeout(this.reconnectTimeout);
-        this.reconnectTimeout = null;
-      }
-      
       // Close the socket if it's open
       if (this.socket.readyState === WebSocket.OPEN) {
         this.socket.close(1000, "Disconnecting");
@@ -210,6 +243,22 @@ class WebSocketService {
     // console.log('Global handler removed, remaining:', this.globalMessageHandlers.length);
   }
 
+  addWatchlistMetricsHandler(handler) {
+    this.watchlistMetricsHandlers.push(handler);
+  }
+
+  removeWatchlistMetricsHandler(handler) {
+    this.watchlistMetricsHandlers = this.watchlistMetricsHandlers.filter(h => h !== handler);
+  }
+
+  addPriceAlertHandler(handler) {
+    this.priceAlertHandlers.push(handler);
+  }
+
+  removePriceAlertHandler(handler) {
+    this.priceAlertHandlers = this.priceAlertHandlers.filter(h => h !== handler);
+  }
+
   removeAllGlobalMessageHandlers() {
     // console.log('Removing all global message handlers');
     this.globalMessageHandlers = [];
@@ -223,6 +272,66 @@ class WebSocketService {
       // console.log('🔵 globalMessageHandlers type:', typeof this.globalMessageHandlers);
       // console.log('🔵 globalMessageHandlers value:', this.globalMessageHandlers);
       
+      // Answer heartbeats so the server knows this connection is alive
+      if (data.type === 'heartbeat') {
+        if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+          this.socket.send(JSON.stringify({ action: 'pong' }));
+        }
+        return;
+      }
+
+      // The server asks us to reconnect after a delay: either it turned this
+      // connection away and closes it now, or it is draining and we leave at
+      // our randomized time
+      if (data.type === 'reconnect') {
+        this.reconnectAt = Date.now() + (data.delay_ms || 0);
+        const socket = this.socket;
+        setTimeout(() => {
+          if (socket && socket.readyState === WebSocket.OPEN) {
+            socket.close(4000, 'Reconnecting');
+          }
+        }, data.delay_ms || 0);
+        return;
+      }
+
+      if (data.seq) {
+        this.updateLastSeq(data.seq);
+      }
+
+      // One of the user's price alerts fired; not a price update
+      if (data.type === 'price_alert') {
+        this.priceAlertHandlers.forEach(handler => {
+          try {
+            handler(data);
+          } catch (handlerError) {
+            console.error('❌ Error in price alert handler:', handlerError);
+          }
+        });
+        return;
+      }
+
+      // Watchlist value and day change, computed by the server
+      if (data.type === 'watchlist_metrics') {
+        this.watchlistMetrics[data.watchlist_id] = data;
+        this.watchlistMetricsHandlers.forEach(handler => {
+          try {
+            handler(data);
+          } catch (handlerError) {
+            console.error('❌ Error in watchlist metrics handler:', handlerError);
+          }
+        });
+        return;
+      }
+
+      // A snapshot carries the current price of every newly subscribed ticker,
+      // a delta only those that changed while we were disconnected
+      if ((data.type === 'snapshot' || data.type === 'delta') && data.prices) {
+        Object.entries(data.prices).forEach(([ticker, price]) => {
+          this.dispatchPrice(ticker, price);
+        });
+        return;
+      }
+
       // Check if this is a price update message
       if (data.ticker && data.price !== undefined) {
         // console.log(`🔵 Price update received for ${data.ticker}: ${data.price}`);
@@ -264,6 +373,40 @@ class WebSocketService {
       console.error('❌ Error handling WebSocket message:', error);
     }
   }
+
+  updateLastSeq(seq) {
+    // Sequence numbers are Redis stream ids: "<milliseconds>-<counter>"
+    const parse = (value) => value.split('-').map(Number);
+    if (!this.lastSeq) {
+      this.lastSeq = seq;
+      return;
+    }
+    const [ms, counter] = parse(seq);
+    const [lastMs, lastCounter] = parse(this.lastSeq);
+    if (ms > lastMs || (ms === lastMs && counter > lastCounter)) {
+      this.lastSeq = seq;
+    }
+  }
+
+  dispatchPrice(ticker, price) {
+    this.globalMessageHandlers.forEach((handler, index) => {
+      try {
+        handler(ticker, price);
+      } catch (handlerError) {
+        console.error(`❌ Error in global handler #${index}:`, handlerError);
+      }
+    });
+
+    if (this.messageHandlers[ticker]) {
+      this.messageHandlers[ticker].forEach(handler => {
+        try {
+          handler(price);
+        } catch (handlerError) {
+          console.error(`❌ Error in specific handler for ${ticker}:`, handlerError);
+        }
+      });
+    }
+  }
 }
 
 // Create a singleton instance
@@ -4,10 +4,107 @@ Django admin for the casestudy app.
 The Django admin is a GUI for viewing and managing the database models like 'Security'.
 Models registered with the Django admin will be accessible at http://localhost:8000/admin/.
 
+Price history and watchlist memberships run to tens of millions of rows, so
+their changelists avoid full-table work:
+
+- `EstimatedCountPaginator` takes large row counts from Postgres statistics
+  instead of COUNT(*)
+- related objects are picked with raw id or autocomplete widgets rather than
+  dropdowns of every security and user, and joined with `list_select_related`
+- date hierarchies and default orderings use indexed columns
+
+Watchlists and memberships live on their user's shard (see
+casestudy.sharding); their changelists browse one shard at a time.
+
 https://docs.djangoproject.com/en/4.2/ref/contrib/admin/
 """
 from django.contrib import admin
-from casestudy.models import Security
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import QueryDict
+from django.utils.functional import cached_property
+from casestudy.models import Security, SecurityPriceHistory, UserWatchList, WatchListSecurity
+from casestudy.memberships import delete_watchlist
+from casestudy.prices import format_price
+from casestudy.sharding import get_shards
+from casestudy.watchlist_cache import notify_watchlists_changed
+
+# Results estimated above this many rows show the estimate instead of an exact count
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+SHARD_PARAM = 'shard'
+
+
+def estimate_count(queryset):
+    """
+    Return Postgres' estimate of the rows of a queryset, or None if it has none.
+
+    Unfiltered querysets use the table's pg_class.reltuples, filtered ones the
+    planner's row estimate.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+            # -1 until the table is first vacuumed or analyzed
+            return row[0] if row and row[0] >= 0 else None
+        sql, params = queryset.order_by().query.get_compiler(using=queryset.db).as_sql()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        return cursor.fetchone()[0][0]['Plan']['Plan Rows']
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator counting large changelists from Postgres statistics, and small ones exactly"""
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < ESTIMATED_COUNT_THRESHOLD:
+            return super().count
+        return estimate
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """ModelAdmin for large tables"""
+    paginator = EstimatedCountPaginator
+    # Filtered changelists would otherwise also count the whole table
+    show_full_result_count = False
+
+
+def requested_shard(request):
+    """Return the shard a changelist, or a change form opened from it, browses"""
+    shard = request.GET.get(SHARD_PARAM)
+    if shard is None:
+        shard = QueryDict(request.GET.get('_changelist_filters', '')).get(SHARD_PARAM)
+    shards = get_shards()
+    return shard if shard in shards else shards[0]
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """Changelist filter picking the watchlist shard to browse; hidden with a single shard"""
+    title = 'shard'
+    parameter_name = SHARD_PARAM
+
+    def lookups(self, request, model_admin):
+        shards = get_shards()
+        return [(shard, shard) for shard in shards] if len(shards) > 1 else []
+
+    def queryset(self, request, queryset):
+        # Applied by ShardedAdmin.get_queryset, which change forms use too
+        return queryset
+
+
+class ShardedAdmin(ScalableAdmin):
+    """ScalableAdmin for models living on the watchlist shards"""
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).using(requested_shard(request))
 
 
 # Create an and admin class for each model you want to be able to access in the Django admin, and register it with
@@ -20,8 +117,98 @@ class EmailAdmin(admin.ModelAdmin):
     list_display = [
         'ticker',
         'name',
-        'last_price',
+        'display_last_price',
     ]
 
+    # Used by the security autocomplete of the other admins
+    search_fields = ['ticker', 'name']
+    ordering = ['ticker']
+
+    # Prices are stored in micro-units, see casestudy.prices
+    @admin.display(description='Last price', ordering='last_price')
+    def display_last_price(self, security):
+        return format_price(security.last_price)
+
+
+@admin.register(SecurityPriceHistory)
+class SecurityPriceHistoryAdmin(ScalableAdmin):
+    list_display = ['display_ticker', 'date', 'display_price']
+    list_select_related = ['security']
+    autocomplete_fields = ['security']
+    # Exact ticker match, on the small securities table
+    search_fields = ['=security__ticker']
+    date_hierarchy = 'date'
+    ordering = ['-date']
+
+    @admin.display(description='Ticker', ordering='security__ticker')
+    def display_ticker(self, history):
+        return history.security.ticker
+
+    @admin.display(description='Price', ordering='price')
+    def display_price(self, history):
+        return format_price(history.price)
+
+
+@admin.register(UserWatchList)
+class UserWatchListAdmin(ShardedAdmin):
+    # The user is shown by id: users live on the default database, not the shards
+    list_display = ['name', 'display_user', 'created_at', 'updated_at']
+    list_filter = [ShardFilter]
+    raw_id_fields = ['user']
+    date_hierarchy = 'created_at'
+    ordering = ['-created_at']
+
+    @admin.display(description='User', ordering='user_id')
+    def display_user(self, watchlist):
+        return watchlist.user_id
+
+    def get_readonly_fields(self, request, obj=None):
+        # Changing the owner would leave the watchlist on the wrong shard
+        return ['user'] if obj is not None else []
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        notify_watchlists_changed(obj.user_id)
+
+    def get_deleted_objects(self, objs, request):
+        deleted_objects, model_count, perms_needed, protected = super().get_deleted_objects(objs, request)
+        # Memberships are removed by delete_watchlist, not through their read-only admin
+        perms_needed.discard(WatchListSecurity._meta.verbose_name)
+        return deleted_objects, model_count, perms_needed, protected
+
+    def delete_model(self, request, obj):
+        # Keeps the securities' watcher counts in step
+        delete_watchlist(obj)
+        notify_watchlists_changed(obj.user_id)
+
+    def delete_queryset(self, request, queryset):
+        for watchlist in queryset:
+            self.delete_model(request, watchlist)
+
+
+@admin.register(WatchListSecurity)
+class WatchListSecurityAdmin(ShardedAdmin):
+    """
+    Read-only: memberships are changed through casestudy.memberships, which
+    keeps positions and watcher counts up to date.
+    """
+    list_display = ['watchlist', 'display_ticker', 'position', 'added_at']
+    list_filter = [ShardFilter]
+    list_select_related = ['watchlist', 'security']
+    raw_id_fields = ['watchlist']
+    autocomplete_fields = ['security']
+    date_hierarchy = 'added_at'
+    ordering = ['-added_at']
+
+    @admin.display(description='Ticker', ordering='security__ticker')
+    def display_ticker(self, membership):
+        return membership.security.ticker
+
+    def has_add_permission(self, request):
+        return False
 
+    def has_change_permission(self, request, obj=None):
+        return False
 
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,155 @@
+"""
+Price alert evaluation.
+
+Active alerts are indexed per ticker and direction in sorted threshold lists.
+When a ticker moves from `old` to `new`, only the alerts whose thresholds lie
+between the two prices fire, and they are found by binary search, so a tick
+costs O(log n + crossings) no matter how many alerts there are. Thresholds
+and prices are integer micro-units, so a price equal to a threshold crosses it
+exactly once.
+
+The engine runs in the ingest process (`make_api_calls`). Alerts created
+through the API are picked up on the next tick; fired alerts are deactivated
+and sent to the user's open sockets through `cluster.send_to_user`.
+"""
+import logging
+from bisect import bisect_left, bisect_right
+from django.utils import timezone
+from casestudy.models import PriceAlert
+from casestudy.prices import price_to_float
+from casestudy.websocket.cluster import send_to_user
+
+logger = logging.getLogger(__name__)
+
+# Alerts that were deleted or deactivated elsewhere are dropped from the
+# index by a full reload this often (seconds)
+ALERT_RELOAD_INTERVAL = 300
+
+
+class ThresholdList:
+    """Alerts of one ticker and direction, sorted by threshold"""
+    __slots__ = ('thresholds', 'alerts')
+
+    def __init__(self):
+        # Parallel lists: thresholds for bisect, (threshold, alert id, user id) entries
+        self.thresholds = []
+        self.alerts = []
+
+    def add(self, threshold, alert_id, user_id):
+        entry = (threshold, alert_id, user_id)
+        position = bisect_right(self.alerts, entry)
+        self.alerts.insert(position, entry)
+        self.thresholds.insert(position, threshold)
+
+    def pop_range(self, start, end):
+        """Remove and return the alerts at positions [start, end)"""
+        alerts = self.alerts[start:end]
+        del self.alerts[start:end]
+        del self.thresholds[start:end]
+        return alerts
+
+
+class AlertEngine:
+    """Sorted per-ticker threshold index of the active alerts"""
+    def __init__(self):
+        # (ticker, direction) -> ThresholdList
+        self.index = {}
+        self.last_prices = {}
+        self.max_alert_id = 0
+        self.loaded_at = None
+
+    def load(self):
+        """Rebuild the index from every active alert"""
+        self.index = {}
+        self.max_alert_id = 0
+        self._add_alerts(PriceAlert.objects.filter(active=True))
+        self.loaded_at = timezone.now()
+
+    def refresh(self):
+        """Pick up alerts created since the last call, or reload periodically"""
+        if self.loaded_at is None or (timezone.now() - self.loaded_at).total_seconds() > ALERT_RELOAD_INTERVAL:
+            self.load()
+        else:
+            self._add_alerts(PriceAlert.objects.filter(active=True, id__gt=self.max_alert_id))
+
+    def _add_alerts(self, queryset):
+        rows = queryset.values_list('id', 'user_id', 'security__ticker', 'threshold', 'direction')
+        for alert_id, user_id, ticker, threshold, direction in rows.iterator():
+            thresholds = self.index.get((ticker, direction))
+            if thresholds is None:
+                thresholds = self.index[(ticker, direction)] = ThresholdList()
+            thresholds.add(threshold, alert_id, user_id)
+            self.max_alert_id = max(self.max_alert_id, alert_id)
+
+    def crossed(self, ticker, price):
+        """
+        Record a ticker's new micro-unit price and remove the alerts it crossed from the index.
+
+        Returns the crossing direction and the crossed (threshold, alert id,
+        user id) entries. The first price seen for a ticker only sets the
+        reference price.
+        """
+        old_price = self.last_prices.get(ticker)
+        self.last_prices[ticker] = price
+        if old_price is None or price == old_price:
+            return None, []
+
+        if price > old_price:
+            # Thresholds in (old_price, price] were crossed upwards
+            direction = PriceAlert.ABOVE
+            thresholds = self.index.get((ticker, direction))
+            if not thresholds:
+                return direction, []
+            start = bisect_right(thresholds.thresholds, old_price)
+            end = bisect_right(thresholds.thresholds, price)
+        else:
+            # Thresholds in [price, old_price) were crossed downwards
+            direction = PriceAlert.BELOW
+            thresholds = self.index.get((ticker, direction))
+            if not thresholds:
+                return direction, []
+            start = bisect_left(thresholds.thresholds, price)
+            end = bisect_left(thresholds.thresholds, old_price)
+
+        if start >= end:
+            return direction, []
+        return direction, thresholds.pop_range(start, end)
+
+    def evaluate(self, ticker, price):
+        """Fire the alerts a ticker's new price crossed; returns the number fired"""
+        direction, crossed = self.crossed(ticker, price)
+        if not crossed:
+            return 0
+
+        # Alerts deleted or deactivated since they were indexed do not fire
+        alert_ids = [alert_id for _, alert_id, _ in crossed]
+        active_ids = set(
+            PriceAlert.objects.filter(id__in=alert_ids, active=True).values_list('id', flat=True)
+        )
+        if not active_ids:
+            return 0
+        PriceAlert.objects.filter(id__in=active_ids, active=True).update(
+            active=False,
+            triggered_at=timezone.now(),
+            triggered_price=price,
+        )
+
+        for threshold, alert_id, user_id in crossed:
+            if alert_id not in active_ids:
+                continue
+            try:
+                send_to_user(user_id, {
+                    'type': 'price_alert',
+                    'alert_id': alert_id,
+                    'ticker': ticker,
+                    'threshold': price_to_float(threshold),
+                    'direction': direction,
+                    'price': price_to_float(price),
+                })
+            except Exception as e:
+                logger.error(f"Error delivering price alert {alert_id}: {str(e)}")
+        return len(active_ids)
+
+
+# Create a singleton instance
+alert_engine = AlertEngine()
@@ -0,0 +1,150 @@
+"""
+Vectorized watchlist analytics over price history.
+
+A watchlist's price history is loaded in one query into a (dates x
+securities) NumPy matrix, with each security's price carried forward over
+days it has no row for. Every metric is then computed on whole columns at
+once: total return, annualized volatility of daily returns, maximum drawdown,
+the correlation matrix of daily returns, and the same statistics for an
+equal-weight portfolio of the watchlist's securities rebalanced daily.
+
+Results are memoized by (watchlist, watchlists version, range); the version
+changes on every edit of the user's watchlists.
+"""
+import datetime
+
+import numpy as np
+from django.core.cache import cache
+from casestudy.models import SecurityPriceHistory
+from casestudy.history import CLOSED_RANGE_CACHE_TTL, OPEN_RANGE_CACHE_TTL, get_history_version
+from casestudy.watchlist_cache import get_watchlists_version
+
+# Watchlist ids are unique per shard only, so the key includes the user
+ANALYTICS_CACHE_KEY = 'analytics:{user_id}:{watchlist_id}:{version}:{history_version}:{start}:{end}'
+
+# Trading days per year, to annualize volatility
+TRADING_DAYS = 252
+
+
+def price_matrix(security_ids, start, end):
+    """
+    Return (dates, matrix) for [start, end]: the sorted date ordinals with any
+    price, and a float matrix with a row per date and a column per security in
+    `security_ids` order. Prices are carried forward; cells before a
+    security's first price are NaN.
+    """
+    rows = SecurityPriceHistory.objects.filter(
+        security_id__in=security_ids, date__gte=start, date__lte=end,
+    ).values_list('security_id', 'date', 'price')
+
+    securities, days, prices = [], [], []
+    for security_id, day, price in rows.iterator(chunk_size=5000):
+        securities.append(security_id)
+        days.append(day.toordinal())
+        prices.append(price)
+    securities = np.array(securities, dtype=np.int64)
+    days = np.array(days, dtype=np.int64)
+    prices = np.array(prices, dtype=np.float64)
+
+    ids = np.array(security_ids, dtype=np.int64)
+    order = np.argsort(ids)
+    columns = order[np.searchsorted(ids, securities, sorter=order)]
+    dates, rows_of = np.unique(days, return_inverse=True)
+
+    matrix = np.full((len(dates), len(ids)), np.nan)
+    matrix[rows_of, columns] = prices
+
+    # Carry each column's last price forward over its gaps
+    filled = np.where(np.isnan(matrix), 0, np.arange(len(dates))[:, None])
+    np.maximum.accumulate(filled, axis=0, out=filled)
+    matrix = matrix[filled, np.arange(len(ids))]
+    return dates, matrix
+
+
+def _nan_to_none(values):
+    return [None if np.isnan(value) else round(float(value), 6) for value in values]
+
+
+def series_stats(levels, returns):
+    """Return (total return, annualized volatility, max drawdown) of each column"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        first = levels[np.argmax(~np.isnan(levels), axis=0), np.arange(levels.shape[1])]
+        total_return = levels[-1] / first - 1
+
+        valid = np.sum(~np.isnan(returns), axis=0)
+        mean = np.nansum(returns, axis=0) / valid
+        variance = np.nansum((returns - mean) ** 2, axis=0) / (valid - 1)
+        volatility = np.where(valid > 1, np.sqrt(variance * TRADING_DAYS), np.nan)
+
+        running_max = np.fmax.accumulate(levels, axis=0)
+        max_drawdown = np.fmin.reduce(levels / running_max - 1, axis=0)
+    return total_return, volatility, max_drawdown
+
+
+def compute_analytics(tickers, dates, matrix):
+    """Compute the per-security, portfolio and correlation metrics of a price matrix"""
+    if len(dates) < 2 or not tickers:
+        return {
+            'days': len(dates),
+            'portfolio': None,
+            'securities': {},
+            'correlation': {'tickers': tickers, 'matrix': []},
+        }
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = matrix[1:] / matrix[:-1] - 1
+
+        # Equal weight over the securities priced on each day
+        priced = np.sum(~np.isnan(returns), axis=1)
+        portfolio_returns = np.where(priced > 0, np.nansum(returns, axis=1) / priced, 0)
+        portfolio_levels = np.concatenate([[1.0], np.cumprod(1 + portfolio_returns)])
+
+    total_return, volatility, max_drawdown = series_stats(matrix, returns)
+    portfolio_stats = series_stats(portfolio_levels[:, None], portfolio_returns[:, None])
+
+    # Correlation over the days every security has a return
+    complete = returns[~np.isnan(returns).any(axis=1)]
+    if len(complete) > 1:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlation = np.atleast_2d(np.corrcoef(complete, rowvar=False))
+        correlation_matrix = [_nan_to_none(row) for row in correlation]
+    else:
+        correlation_matrix = []
+
+    return {
+        'days': len(dates),
+        'portfolio': dict(zip(
+            ('return', 'volatility', 'max_drawdown'),
+            (_nan_to_none(stat)[0] for stat in portfolio_stats),
+        )),
+        'securities': {
+            ticker: {'return': ret, 'volatility': vol, 'max_drawdown': drawdown}
+            for ticker, ret, vol, drawdown in zip(
+                tickers, _nan_to_none(total_return), _nan_to_none(volatility), _nan_to_none(max_drawdown)
+            )
+        },
+        'correlation': {'tickers': tickers, 'matrix': correlation_matrix},
+    }
+
+
+def get_watchlist_analytics(watchlist, start, end):
+    """Return the memoized analytics of a watchlist over [start, end]"""
+    key = ANALYTICS_CACHE_KEY.format(
+        user_id=watchlist.user_id,
+        watchlist_id=watchlist.id,
+        version=get_watchlists_version(watchlist.user_id),
+        history_version=get_history_version(),
+        start=start.isoformat(),
+        end=end.isoformat(),
+    )
+    analytics = cache.get(key)
+    if analytics is None:
+        securities = sorted(watchlist.securities.values_list('id', 'ticker'), key=lambda row: row[1])
+        security_ids = [security_id for security_id, _ in securities]
+        tickers = [ticker for _, ticker in securities]
+
+        dates, matrix = price_matrix(security_ids, start, end)
+        analytics = compute_analytics(tickers, dates, matrix)
+        ttl = CLOSED_RANGE_CACHE_TTL if end < datetime.date.today() else OPEN_RANGE_CACHE_TTL
+        cache.set(key, analytics, ttl)
+    return analytics
@@ -7,15 +7,22 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'casestudy.settings')
 django.setup()
 
 # Import after Django is set up to avoid circular imports
+from django.urls import re_path
 from channels.routing import ProtocolTypeRouter, URLRouter
-from .websocket.routing import websocket_urlpatterns
+from .websocket.routing import websocket_urlpatterns, sse_urlpatterns
 from .websocket.middleware import TokenAuthMiddleware
+from .websocket.lifespan import LifespanApp
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": URLRouter([
+        # Server-Sent Events price stream, sharing the WebSocket fan-out hub
+        re_path(r'^stream/', TokenAuthMiddleware(URLRouter(sse_urlpatterns))),
+        re_path(r'', get_asgi_application()),
+    ]),
     "websocket": TokenAuthMiddleware(
         URLRouter(
             websocket_urlpatterns
         )
     ),
+    "lifespan": LifespanApp(),
 }) 
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Price history ranges downsampled to a fixed number of points.
+
+Rows are read from `SecurityPriceHistory` in (security, date) index order,
+loaded into NumPy arrays and reduced server-side, so a chart gets about the
+same payload for a week or for ten years:
+
+- `lttb`: Largest-Triangle-Three-Buckets, which keeps the points that best
+  preserve the line's visual shape
+- `minmax`: the lowest and highest price of each bucket, which keeps every
+  extreme
+
+Prices are read as integer micro-units and returned in currency units.
+
+Results are cached per (security, range, points, method) until the range
+expires or `invalidate_histories` is called after a bulk change.
+"""
+import datetime
+import time
+
+import numpy as np
+from django.core.cache import cache
+from casestudy.models import SecurityPriceHistory
+from casestudy.prices import PRICE_SCALE
+
+DOWNSAMPLING_METHODS = ('lttb', 'minmax')
+
+DEFAULT_POINTS = 500
+MIN_POINTS = 3
+MAX_POINTS = 5000
+
+# Default range when no start date is given
+DEFAULT_RANGE_DAYS = 365
+
+HISTORY_CACHE_KEY = 'history:{version}:{security_id}:{start}:{end}:{points}:{method}'
+HISTORY_VERSION_CACHE_KEY = 'history:version'
+# Ranges ending before today no longer change; today's price row does
+CLOSED_RANGE_CACHE_TTL = 24 * 60 * 60
+OPEN_RANGE_CACHE_TTL = 60
+
+# Rows fetched per round trip while streaming a range
+HISTORY_CHUNK_SIZE = 5000
+
+
+def lttb(x, y, points):
+    """Return the indexes of the `points` samples LTTB keeps out of (x, y)"""
+    length = len(x)
+    if points >= length or points < MIN_POINTS:
+        return np.arange(length)
+
+    # The first and last points are always kept; the rest are split into
+    # points - 2 buckets, and each bucket keeps the point forming the largest
+    # triangle with the previously kept point and the next bucket's average
+    edges = np.linspace(1, length - 1, points - 1).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else length
+        if bucket + 2 < len(edges):
+            next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def min_max(x, y, points):
+    """Return the indexes of the lowest and highest sample of each of `points // 2` buckets"""
+    length = len(x)
+    if points >= length or points < MIN_POINTS:
+        return np.arange(length)
+
+    buckets = np.arange(length) * (points // 2) // length
+    # Sorting by (bucket, price) puts each bucket's minimum first and maximum last
+    order = np.lexsort((y, buckets))
+    starts = np.flatnonzero(np.r_[True, buckets[order][1:] != buckets[order][:-1]])
+    ends = np.r_[starts[1:], length] - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+
+def downsample(dates, prices, points, method):
+    """Downsample parallel date-ordinal and price arrays to about `points` samples"""
+    if method == 'minmax':
+        keep = min_max(dates, prices, points)
+    else:
+        keep = lttb(dates.astype(np.float64), prices, points)
+    return dates[keep], prices[keep]
+
+
+def serialize(dates, prices):
+    return {
+        'dates': [datetime.date.fromordinal(int(day)).isoformat() for day in dates],
+        'prices': [round(float(price) / PRICE_SCALE, 2) for price in prices],
+    }
+
+
+def get_history_version():
+    """Return the current version of the price history, part of every cache key derived from it"""
+    return cache.get_or_set(HISTORY_VERSION_CACHE_KEY, time.time_ns(), None)
+
+
+def invalidate_histories():
+    """Invalidate every cached history range and analytics, e.g. after a bulk import"""
+    cache.set(HISTORY_VERSION_CACHE_KEY, time.time_ns(), None)
+
+
+def history_cache_key(security_id, start, end, points, method, version):
+    return HISTORY_CACHE_KEY.format(
+        version=version, security_id=security_id, start=start.isoformat(), end=end.isoformat(), points=points, method=method
+    )
+
+
+def get_price_histories(security_ids, start, end, points=DEFAULT_POINTS, method='lttb'):
+    """
+    Return {security id: {'dates': [...], 'prices': [...]}} for [start, end], each
+    downsampled to about `points` samples.
+
+    Cached ranges are served from the cache; the rest are read in one query.
+    """
+    version = get_history_version()
+    keys = {
+        security_id: history_cache_key(security_id, start, end, points, method, version)
+        for security_id in security_ids
+    }
+    cached = cache.get_many(list(keys.values()))
+    histories = {
+        security_id: cached[key] for security_id, key in keys.items() if key in cached
+    }
+    missing = [security_id for security_id in security_ids if security_id not in histories]
+    if not missing:
+        return histories
+
+    rows = SecurityPriceHistory.objects.filter(
+        security_id__in=missing, date__gte=start, date__lte=end,
+    ).order_by('security_id', 'date').values_list('security_id', 'date', 'price')
+
+    security_column, date_column, price_column = [], [], []
+    for security_id, day, price in rows.iterator(chunk_size=HISTORY_CHUNK_SIZE):
+        security_column.append(security_id)
+        date_column.append(day.toordinal())
+        price_column.append(price)
+    security_column = np.array(security_column, dtype=np.int64)
+    date_column = np.array(date_column, dtype=np.int64)
+    price_column = np.array(price_column, dtype=np.float64)
+
+    # Rows are grouped by security; split the columns at each new security
+    found, first_rows = np.unique(security_column, return_index=True)
+    last_rows = np.r_[first_rows[1:], len(security_column)]
+    bounds = {
+        security_id: (first, last)
+        for security_id, first, last in zip(found.tolist(), first_rows.tolist(), last_rows.tolist())
+    }
+
+    ttl = CLOSED_RANGE_CACHE_TTL if end < datetime.date.today() else OPEN_RANGE_CACHE_TTL
+    fetched = {}
+    for security_id in missing:
+        first, last = bounds.get(security_id, (0, 0))
+        dates, prices = downsample(date_column[first:last], price_column[first:last], points, method)
+        fetched[keys[security_id]] = histories[security_id] = serialize(dates, prices)
+    cache.set_many(fetched, ttl)
+    return histories
+
+
+def parse_date_range(query_params):
+    """
+    Parse the `from` and `to` query parameters into a (start, end) tuple of dates.
+
+    Raises ValueError with a message fit for the client on invalid input.
+    """
+    try:
+        end = datetime.date.fromisoformat(query_params['to']) if query_params.get('to') else datetime.date.today()
+        start = (
+            datetime.date.fromisoformat(query_params['from']) if query_params.get('from')
+            else end - datetime.timedelta(days=DEFAULT_RANGE_DAYS)
+        )
+    except ValueError:
+        raise ValueError('from and to must be dates in YYYY-MM-DD format')
+    if start > end:
+        raise ValueError('from must not be after to')
+    return start, end
+
+
+def parse_history_params(query_params):
+    """
+    Parse `from`, `to`, `points` and `method` query parameters.
+
+    Returns (start, end, points, method); raises ValueError with a message
+    fit for the client on invalid input.
+    """
+    start, end = parse_date_range(query_params)
+    try:
+        points = int(query_params.get('points', DEFAULT_POINTS))
+    except ValueError:
+        raise ValueError('points must be an integer')
+    if not MIN_POINTS <= points <= MAX_POINTS:
+        raise ValueError(f'points must be between {MIN_POINTS} and {MAX_POINTS}')
+
+    method = query_params.get('method', 'lttb')
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f"method must be one of {', '.join(DOWNSAMPLING_METHODS)}")
+    return start, end, points, method
@@ -0,0 +1,200 @@
+"""
+Bulk import and export of price history through Postgres COPY.
+
+Files hold one row per (ticker, date, price):
+
+- `csv`: a header line, then prices in currency units (e.g. `AAPL,2024-01-02,185.64`)
+- `binary`: Postgres' binary COPY format of (text, date, bigint) columns,
+  prices in micro-units (see casestudy.prices)
+
+An import streams the file into a temporary staging table with a single COPY,
+then merges it into `SecurityPriceHistory` in batches of `MERGE_BATCH_SIZE`
+staged rows, each committed on its own: rows are matched to securities by
+ticker, and a (security, date) already present is overwritten (or kept, with
+`overwrite=False`). When a file repeats a (ticker, date), its last row wins
+when overwriting and its first row when keeping, whichever batches they fall
+in.
+Rows of unknown tickers are skipped and reported.
+
+An export streams a COPY of a query straight to the file. Neither direction
+holds more than a COPY buffer in memory, whatever the size of the file.
+
+`python manage.py import_price_history` and `export_price_history` run them.
+"""
+import logging
+import time
+from django.db import connections, router, transaction
+from casestudy.history import invalidate_histories
+from casestudy.models import Security, SecurityPriceHistory
+from casestudy.prices import PRICE_SCALE
+
+logger = logging.getLogger(__name__)
+
+COPY_FORMATS = ('csv', 'binary')
+COPY_OPTIONS = {
+    'csv': '(FORMAT csv, HEADER true)',
+    'binary': '(FORMAT binary)',
+}
+
+HISTORY_TABLE = SecurityPriceHistory._meta.db_table
+SECURITY_TABLE = Security._meta.db_table
+STAGING_TABLE = 'price_history_import'
+
+# Type of the staged price column, and the micro-unit price it is merged as
+STAGED_PRICES = {
+    'csv': ('numeric', f'round(staged.price * {PRICE_SCALE})::bigint'),
+    'binary': ('bigint', 'staged.price'),
+}
+EXPORTED_PRICES = {
+    'csv': f'(history.price::numeric / {PRICE_SCALE})::numeric(20, 6)',
+    'binary': 'history.price',
+}
+
+# Staged rows merged per transaction
+MERGE_BATCH_SIZE = 100000
+# Bytes passed to or from COPY per read or write
+COPY_BUFFER_SIZE = 1024 * 1024
+# Bytes copied between progress reports
+PROGRESS_BYTES = 64 * 1024 * 1024
+
+
+class ProgressFile:
+    """File wrapper reporting the bytes COPY reads from or writes to it"""
+
+    def __init__(self, file, progress, verb):
+        self.file = file
+        self.progress = progress
+        self.verb = verb
+        self.bytes = 0
+        self.reported = 0
+        self.started = time.monotonic()
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.count(len(data))
+        return data
+
+    def readline(self, size=-1):
+        data = self.file.readline(size)
+        self.count(len(data))
+        return data
+
+    def write(self, data):
+        self.count(len(data))
+        return self.file.write(data)
+
+    def count(self, size):
+        self.bytes += size
+        if self.bytes - self.reported >= PROGRESS_BYTES:
+            self.reported = self.bytes
+            megabytes = self.bytes / 2 ** 20
+            rate = megabytes / max(time.monotonic() - self.started, 1e-6)
+            self.progress(f'{self.verb} {megabytes:.0f} MB ({rate:.1f} MB/s)')
+
+
+def _no_progress(message):
+    pass
+
+
+def import_history(source, fmt='csv', overwrite=True, batch_size=MERGE_BATCH_SIZE, progress=_no_progress):
+    """
+    Import price history from the binary file object `source`.
+
+    Returns (rows staged, rows merged, {unknown ticker: rows skipped}).
+    """
+    connection = connections[router.db_for_write(SecurityPriceHistory)]
+    price_type, merged_price = STAGED_PRICES[fmt]
+    conflict = 'DO UPDATE SET price = EXCLUDED.price' if overwrite else 'DO NOTHING'
+    # Within a batch DISTINCT ON keeps the row the batches that follow would
+    # also let win: later ones overwrite, earlier ones are kept
+    line_order = 'DESC' if overwrite else 'ASC'
+    merge_sql = f'''
+        INSERT INTO {HISTORY_TABLE} (security_id, date, price)
+        SELECT DISTINCT ON (security.id, staged.date) security.id, staged.date, {merged_price}
+        FROM {STAGING_TABLE} staged
+        JOIN {SECURITY_TABLE} security ON security.ticker = staged.ticker
+        WHERE staged.line > %s AND staged.line <= %s
+        ORDER BY security.id, staged.date, staged.line {line_order}
+        ON CONFLICT (security_id, date) {conflict}
+    '''
+
+    started = time.monotonic()
+    with connection.cursor() as cursor:
+        # Temporary tables live as long as the connection, across the batches' commits
+        cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE}')
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {STAGING_TABLE} ('
+            f'line bigserial, ticker text NOT NULL, date date NOT NULL, price {price_type} NOT NULL)'
+        )
+        try:
+            cursor.copy_expert(
+                f'COPY {STAGING_TABLE} (ticker, date, price) FROM STDIN WITH {COPY_OPTIONS[fmt]}',
+                ProgressFile(source, progress, 'Read'),
+                size=COPY_BUFFER_SIZE,
+            )
+            # Indexed after the COPY, which is faster than maintaining it row by row
+            cursor.execute(f'CREATE INDEX ON {STAGING_TABLE} (line)')
+            cursor.execute(f'ANALYZE {STAGING_TABLE}')
+            cursor.execute(f'SELECT coalesce(max(line), 0) FROM {STAGING_TABLE}')
+            staged = cursor.fetchone()[0]
+            progress(f'Staged {staged} rows in {time.monotonic() - started:.1f}s')
+
+            cursor.execute(
+                f'SELECT staged.ticker, count(*) FROM {STAGING_TABLE} staged '
+                f'WHERE NOT EXISTS (SELECT 1 FROM {SECURITY_TABLE} security WHERE security.ticker = staged.ticker) '
+                f'GROUP BY staged.ticker'
+            )
+            unknown = dict(cursor.fetchall())
+
+            merged = 0
+            for start in range(0, staged, batch_size):
+                with transaction.atomic(using=connection.alias):
+                    cursor.execute(merge_sql, [start, start + batch_size])
+                    merged += cursor.rowcount
+                progress(f'Merged {min(start + batch_size, staged)}/{staged} rows')
+        finally:
+            cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE}')
+
+    if merged:
+        invalidate_histories()
+    logger.info(f'Imported {merged} of {staged} price history rows in {time.monotonic() - started:.1f}s')
+    return staged, merged, unknown
+
+
+def export_history(target, fmt='csv', tickers=None, start=None, end=None, progress=_no_progress):
+    """
+    Export price history, optionally limited to some tickers and dates, to the
+    binary file object `target`, ordered by security and date.
+
+    Returns the number of bytes written.
+    """
+    conditions = []
+    params = []
+    if tickers:
+        conditions.append('security.ticker = ANY(%s)')
+        params.append(list(tickers))
+    if start:
+        conditions.append('history.date >= %s')
+        params.append(start)
+    if end:
+        conditions.append('history.date <= %s')
+        params.append(end)
+    where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+    # In (security, date) index order, so no sort is needed
+    query = f'''
+        SELECT security.ticker, history.date, {EXPORTED_PRICES[fmt]} AS price
+        FROM {HISTORY_TABLE} history
+        JOIN {SECURITY_TABLE} security ON security.id = history.security_id
+        {where}
+        ORDER BY history.security_id, history.date
+    '''
+
+    connection = connections[router.db_for_read(SecurityPriceHistory)]
+    started = time.monotonic()
+    output = ProgressFile(target, progress, 'Wrote')
+    with connection.cursor() as cursor:
+        # COPY takes no parameters, so they are bound client-side
+        sql = cursor.mogrify(query, params).decode('utf-8')
+        cursor.copy_expert(f'COPY ({sql}) TO STDOUT WITH {COPY_OPTIONS[fmt]}', output, size=COPY_BUFFER_SIZE)
+    logger.info(f'Exported {output.bytes} bytes of price history in {time.monotonic() - started:.1f}s')
+    return output.bytes
@@ -0,0 +1,130 @@
+"""
+Redis keyspace of the live security data.
+
+Every ticker's data lives in three hashes keyed by ticker, instead of two
+hashes per ticker:
+
+- `PRICES_KEY`: the latest price, in micro-units (see casestudy.prices)
+- `NAMES_KEY`: the company name
+- `RECORDS_KEY`: a packed binary record of the price, when it was last
+  updated and the statistics maintained by the ingest (see
+  casestudy.security_stats)
+
+Reading every price or every security is a single HGETALL (or an HMGET for
+some tickers) instead of a key scan plus one HGETALL per ticker, and Redis
+stores three keys rather than two per ticker. Integer prices are stored in
+Redis' compact integer encoding, and records are fixed-size binary strings.
+
+Price updates are still published on one pub/sub channel per ticker
+(`price_channel`), so WebSocket nodes only receive the tickers they hold.
+
+`python manage.py migrate_redis_keyspace` copies data from the per-ticker
+`stock:detail:<ticker>` and `stock:price:<ticker>` hashes of earlier versions,
+deletes them with `--delete-legacy`, and reports the memory used by each
+layout.
+"""
+import struct
+from casestudy.prices import from_redis
+from casestudy.security_stats import STAT_FIELDS
+
+PRICES_KEY = 'stock:prices'
+NAMES_KEY = 'stock:names'
+RECORDS_KEY = 'stock:records'
+
+PRICE_CHANNEL_PREFIX = 'stock:price:'
+
+# Per-ticker hashes of earlier versions, see migrate_redis_keyspace
+LEGACY_DETAIL_PATTERN = 'stock:detail:*'
+LEGACY_PRICE_PATTERN = 'stock:price:*'
+
+# Price (micro-units), last updated (Unix time), then STAT_FIELDS
+RECORD = struct.Struct('<qd' + 'q' * len(STAT_FIELDS))
+# Stored in place of unknown statistics
+MISSING = -2 ** 63
+
+
+def price_channel(ticker):
+    """Return the pub/sub channel a ticker's price updates are published on"""
+    return f'{PRICE_CHANNEL_PREFIX}{ticker}'
+
+
+def channel_ticker(channel):
+    """Return the ticker of a price channel, or None for any other channel"""
+    if not channel.startswith(PRICE_CHANNEL_PREFIX):
+        return None
+    return channel[len(PRICE_CHANNEL_PREFIX):]
+
+
+def pack_record(price, updated, stats):
+    """Pack a ticker's micro-unit price, update time and statistics dict"""
+    return RECORD.pack(
+        price,
+        updated,
+        *(MISSING if stats.get(field) is None else stats[field] for field in STAT_FIELDS)
+    )
+
+
+def unpack_record(raw):
+    """Return a packed record as a dict of last_price, last_updated and the statistics"""
+    price, updated, *stats = RECORD.unpack(raw)
+    record = {'last_price': price, 'last_updated': updated}
+    for field, value in zip(STAT_FIELDS, stats):
+        record[field] = None if value == MISSING else value
+    return record
+
+
+def write_names(client, names):
+    """Store company names, given as {ticker: name}"""
+    if names:
+        client.hset(NAMES_KEY, mapping=names)
+
+
+def write_prices(client, records):
+    """
+    Store prices and records, given as {ticker: (price, updated, stats)}.
+
+    `client` may be a pipeline; both hashes are written in one round trip.
+    """
+    if not records:
+        return
+    client.hset(PRICES_KEY, mapping={ticker: price for ticker, (price, _, _) in records.items()})
+    client.hset(RECORDS_KEY, mapping={
+        ticker: pack_record(price, updated, stats) for ticker, (price, updated, stats) in records.items()
+    })
+
+
+def read_prices(client, tickers=None):
+    """Return {ticker: micro-unit price} for `tickers` (default: every ticker)"""
+    if tickers is None:
+        return {
+            ticker.decode('utf-8'): from_redis(value)
+            for ticker, value in client.hgetall(PRICES_KEY).items()
+        }
+    return parse_prices(tickers, client.hmget(PRICES_KEY, tickers) if tickers else [])
+
+
+def parse_prices(tickers, values):
+    """Turn the result of an HMGET of PRICES_KEY into {ticker: price}, skipping unknown tickers"""
+    return {ticker: from_redis(value) for ticker, value in zip(tickers, values) if value is not None}
+
+
+def read_securities(client):
+    """
+    Return {ticker: {'name', 'last_price', 'last_updated', statistics...}} for
+    every ticker with a name, in one round trip.
+    """
+    with client.pipeline(transaction=False) as pipe:
+        pipe.hgetall(NAMES_KEY)
+        pipe.hgetall(RECORDS_KEY)
+        names, records = pipe.execute()
+
+    securities = {}
+    for ticker, name in names.items():
+        raw = records.get(ticker)
+        if raw is not None:
+            security = unpack_record(raw)
+        else:
+            security = dict.fromkeys(('last_price', 'last_updated', *STAT_FIELDS))
+        security['name'] = name.decode('utf-8')
+        securities[ticker.decode('utf-8')] = security
+    return securities
@@ -1,33 +1,72 @@
 from django.core.management.base import BaseCommand
+from django.conf import settings
 import redis
+from casestudy.redis_inspector import (
+    MEMORY_SAMPLES, PREFIX_DEPTH, TOP_KEYS, format_report, inspect_keyspace, inspect_pubsub
+)
 
 class Command(BaseCommand):
-    help = 'Check Redis content'
+    help = 'Summarize Redis memory by key prefix, the largest keys and pub/sub channels, without blocking Redis'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default=settings.REDIS_URL,
+            help='Redis to inspect (default: REDIS_URL)'
+        )
+        parser.add_argument(
+            '--match',
+            default='*',
+            help='Only inspect keys matching this pattern (default: all)'
+        )
+        parser.add_argument(
+            '--depth',
+            type=int,
+            default=PREFIX_DEPTH,
+            help=f'Key parts to group by (default: {PREFIX_DEPTH})'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=TOP_KEYS,
+            help=f'Largest keys to list (default: {TOP_KEYS})'
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=MEMORY_SAMPLES,
+            help=f'Elements MEMORY USAGE samples per collection, 0 for all (default: {MEMORY_SAMPLES})'
+        )
+        parser.add_argument(
+            '--max-keys',
+            type=int,
+            default=None,
+            help='Stop after about N keys (default: scan all)'
+        )
+        parser.add_argument(
+            '--pause',
+            type=int,
+            default=0,
+            help='Milliseconds to sleep between SCAN batches (default: 0)'
+        )
+        parser.add_argument(
+            '--values',
+            type=int,
+            default=0,
+            help='Show up to N elements of each of the largest keys (default: 0)'
+        )
 
     def handle(self, *args, **options):
-        # Connect to Redis
-        r = redis.Redis(host='redis', port=6379, db=0)  # Use 'redis' as host if using Docker Compose
-        
-        # List all keys
-        keys = r.keys('*')
-        self.stdout.write(f"Found {len(keys)} keys in Redis")
-        
-        # Display each key and its content
-        for key in keys:
-            key_str = key.decode('utf-8')
-            key_type = r.type(key).decode('utf-8')
-            
-            self.stdout.write(f"\nKey: {key_str}")
-            self.stdout.write(f"Type: {key_type}")
-            
-            if key_type == 'string':
-                self.stdout.write(f"Value: {r.get(key).decode('utf-8')}")
-            elif key_type == 'list':
-                self.stdout.write(f"Values: {[x.decode('utf-8') for x in r.lrange(key, 0, -1)]}")
-            elif key_type == 'set':
-                self.stdout.write(f"Values: {[x.decode('utf-8') for x in r.smembers(key)]}")
-            elif key_type == 'hash':
-                hash_data = r.hgetall(key)
-                self.stdout.write("Values: " + str({k.decode('utf-8'): v.decode('utf-8') for k, v in hash_data.items()}))
-            elif key_type == 'zset':
-                self.stdout.write(f"Values: {r.zrange(key, 0, -1, withscores=True)}") 
\ No newline at end of file
+        r = redis.Redis.from_url(options['url'])
+        report = inspect_keyspace(
+            r,
+            match=options['match'],
+            depth=options['depth'],
+            top=options['top'],
+            samples=options['samples'],
+            max_keys=options['max_keys'],
+            pause=options['pause'] / 1000,
+        )
+        pubsub = inspect_pubsub(r, options['depth'])
+        for line in format_report(report, pubsub, r, options['values']):
+            self.stdout.write(line)
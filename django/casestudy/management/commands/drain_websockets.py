@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+import json
+import redis
+from casestudy.websocket.admission import DRAIN_WINDOW
+from casestudy.websocket.cluster import node_channel
+from casestudy.websocket.redis_listener import CONTROL_CHANNEL
+
+
+class Command(BaseCommand):
+    help = 'Drain WebSocket nodes before a restart, spreading their clients\' reconnects over a window'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--node',
+            type=str,
+            default=None,
+            help='ID of the node to drain (default: every node)'
+        )
+        parser.add_argument(
+            '--window',
+            type=int,
+            default=DRAIN_WINDOW,
+            help=f'Seconds over which clients reconnect (default: {DRAIN_WINDOW})'
+        )
+
+    def handle(self, *args, **options):
+        channel = node_channel(options['node']) if options['node'] else CONTROL_CHANNEL
+        r = redis.Redis.from_url(settings.REDIS_URL)
+        receivers = r.publish(channel, json.dumps({
+            'type': 'drain',
+            'window': options['window'],
+        }))
+        self.stdout.write(self.style.SUCCESS(
+            f"Drain requested on {channel}, {receivers} node(s) notified"
+        ))
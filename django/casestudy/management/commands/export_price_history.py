@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+import datetime
+import gzip
+import logging
+import sys
+from casestudy.history_copy import COPY_FORMATS, export_history
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Bulk export price history to a CSV or binary COPY file (see casestudy/history_copy.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='File to write, - for standard output; .gz files are compressed'
+        )
+        parser.add_argument(
+            '--format',
+            choices=COPY_FORMATS,
+            default='csv',
+            help='File format (default: csv)'
+        )
+        parser.add_argument(
+            '--ticker',
+            action='append',
+            help='Only export this ticker (repeatable)'
+        )
+        parser.add_argument(
+            '--from',
+            dest='start',
+            type=datetime.date.fromisoformat,
+            help='First date to export (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--to',
+            dest='end',
+            type=datetime.date.fromisoformat,
+            help='Last date to export (YYYY-MM-DD)'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path == '-':
+            target = sys.stdout.buffer
+            # Standard output carries the data
+            report = self.stderr
+        elif path.endswith('.gz'):
+            target = gzip.open(path, 'wb')
+            report = self.stdout
+        else:
+            target = open(path, 'wb')
+            report = self.stdout
+
+        try:
+            written = export_history(
+                target,
+                fmt=options['format'],
+                tickers=options['ticker'],
+                start=options['start'],
+                end=options['end'],
+                progress=report.write,
+            )
+        except Exception as e:
+            logger.error(f'Failed to export price history to {path}: {str(e)}')
+            report.write(self.style.ERROR(f'Failed to export price history: {str(e)}'))
+            return
+        finally:
+            if target is sys.stdout.buffer:
+                target.flush()
+            else:
+                target.close()
+
+        report.write(self.style.SUCCESS(f'Exported {written} bytes of price history'))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+import gzip
+import logging
+import sys
+from casestudy.history_copy import COPY_FORMATS, MERGE_BATCH_SIZE, import_history
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Bulk import price history from a CSV or binary COPY file (see casestudy/history_copy.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='File to import, - for standard input; .gz files are decompressed'
+        )
+        parser.add_argument(
+            '--format',
+            choices=COPY_FORMATS,
+            default='csv',
+            help='File format (default: csv)'
+        )
+        parser.add_argument(
+            '--keep-existing',
+            action='store_true',
+            help='Keep prices already stored for a security and date instead of overwriting them'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=MERGE_BATCH_SIZE,
+            help=f'Rows merged per transaction (default: {MERGE_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path == '-':
+            source = sys.stdin.buffer
+        elif path.endswith('.gz'):
+            source = gzip.open(path, 'rb')
+        else:
+            source = open(path, 'rb')
+
+        try:
+            staged, merged, unknown = import_history(
+                source,
+                fmt=options['format'],
+                overwrite=not options['keep_existing'],
+                batch_size=options['batch_size'],
+                progress=self.stdout.write,
+            )
+        except Exception as e:
+            logger.error(f'Failed to import price history from {path}: {str(e)}')
+            self.stdout.write(self.style.ERROR(f'Failed to import price history: {str(e)}'))
+            return
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+
+        for ticker, rows in sorted(unknown.items()):
+            self.stdout.write(self.style.WARNING(f'Skipped {rows} rows of unknown ticker {ticker}'))
+        self.stdout.write(self.style.SUCCESS(f'Imported {merged} of {staged} rows'))
@@ -1,13 +1,21 @@
 from django.core.management.base import BaseCommand
+from django.conf import settings
 import requests
 import time
 import logging
 import json
 import redis
-from datetime import datetime
+from datetime import datetime, date
 from django.db import transaction
-from decimal import Decimal
 from casestudy.models import Security, SecurityPriceHistory
+from casestudy.alerts import alert_engine
+from casestudy.ticks import record_ticks
+from casestudy.prices import PRICE_SCALE, to_micros, from_redis
+from casestudy.keyspace import price_channel, read_prices, write_names, write_prices
+from casestudy.warmup import warm_caches
+from casestudy.sharding import replicate_securities, replicate_all_securities
+from casestudy.security_stats import SecurityStatsEngine
+from casestudy.price_stream import PRICE_STREAM_KEY, PRICE_STREAM_MAXLEN, DAY_OPEN_KEY, DAY_OPEN_DATE_KEY
 import random
 
 logger = logging.getLogger(__name__)
@@ -68,6 +76,22 @@ class Command(BaseCommand):
 
         # Initialize Redis connection
         self.initialize_redis()
+        
+        # Restore the rolling statistics windows from price history
+        self.stats_engine = SecurityStatsEngine()
+        try:
+            self.stats_engine.rebuild()
+        except Exception as e:
+            logger.error(f'Failed to rebuild security statistics: {str(e)}')
+
+        # Bring the watchlist shards' copy of the securities up to date
+        try:
+            replicate_all_securities()
+        except Exception as e:
+            logger.error(f'Failed to replicate securities: {str(e)}')
+
+        # Rehydrate Redis from the database if it restarted empty
+        self.ensure_warm()
 
         self.stdout.write(f'Starting Albert stock API calls with {interval} second intervals')
 
@@ -93,7 +117,10 @@ class Command(BaseCommand):
     def initialize_redis(self):
         """Initialize connection to Redis"""
         try:
-            self.redis_client = redis.Redis(host='redis', port=6379, db=0)
+            self.redis_client = redis.Redis.from_url(settings.REDIS_URL)
+            # Day opens recorded so far today, see get_day_open
+            self.day_opens = {}
+            self.day_opens_date = None
             self.stdout.write(self.style.SUCCESS('Connected to Redis successfully'))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Failed to connect to Redis: {str(e)}'))
@@ -135,6 +162,18 @@ class Command(BaseCommand):
             
         return data
 
+    def ensure_warm(self):
+        """Rebuild the Redis caches from the database if they are cold, see casestudy.warmup"""
+        if not self.redis_client:
+            return
+        try:
+            count = warm_caches(self.redis_client)
+            if count is not None:
+                self.stdout.write(self.style.SUCCESS(f'Warmed Redis caches with {count} prices'))
+        except Exception as e:
+            logger.error(f'Failed to warm Redis caches: {str(e)}')
+            self.stdout.write(self.style.ERROR(f'Failed to warm Redis caches: {str(e)}'))
+
     def write_to_file(self, tickers_data, prices_data, timestamp):
         """Write data to output file"""
         # self.stdout.write(f'Writing to {self.OUTPUT_FILE}')
@@ -145,55 +184,105 @@ class Command(BaseCommand):
         
         # self.stdout.write(f'Successfully wrote data to {self.OUTPUT_FILE}')
 
+    def get_day_open(self, ticker, price):
+        """Return a ticker's day open, recording `price` as the open if it is the first of the day"""
+        today = date.today().isoformat()
+        if self.day_opens_date != today:
+            # New day (or first call): drop the previous day's opens
+            stored_date = self.redis_client.get(DAY_OPEN_DATE_KEY)
+            if stored_date is None or stored_date.decode('utf-8') != today:
+                self.redis_client.delete(DAY_OPEN_KEY)
+                self.redis_client.set(DAY_OPEN_DATE_KEY, today)
+            self.day_opens = {}
+            self.day_opens_date = today
+
+        open_price = self.day_opens.get(ticker)
+        if open_price is None:
+            # Keeps the open recorded before a restart
+            self.redis_client.hsetnx(DAY_OPEN_KEY, ticker, price)
+            open_price = from_redis(self.redis_client.hget(DAY_OPEN_KEY, ticker))
+            self.day_opens[ticker] = open_price
+        return open_price
+
     def write_to_redis(self, tickers_data, prices_data, timestamp):
-        """Write data to Redis and publish updates for changed prices"""
+        """Write data to Redis and publish updates for changed prices; returns the published prices"""
+        published_prices = {}
         if not self.redis_client:
-            return
+            return published_prices
             
         try:
             # Store timestamp for reference
             current_time = datetime.now().timestamp()
             
-            # Store ticker details in Redis
-            for ticker, company_name in tickers_data.items():
-                self.redis_client.hset(
-                    f"stock:detail:{ticker}",
-                    mapping={
-                        "company_name": company_name
-                    }
-                )
+            # Store ticker names, and read the current prices to detect
+            # changes, in one round trip each
+            write_names(self.redis_client, tickers_data)
+            tickers = [ticker for ticker, price in prices_data.items() if price is not None]
+            current_prices = read_prices(self.redis_client, tickers)
             
-            # Store price data in Redis and publish updates
-            for ticker, price in prices_data.items():
-                if price is not None:  # Skip None values
-                    # Get current price to check if it changed
-                    current_price_data = self.redis_client.hget(f"stock:price:{ticker}", "value")
-                    current_price = float(current_price_data.decode('utf-8')) if current_price_data else None
-                    
-                    # Update price in Redis
-                    self.redis_client.hset(
-                        f"stock:price:{ticker}",
-                        mapping={
-                            "lastUpdated": current_time,
-                            "value": price
-                        }
-                    )
+            records = {}
+            updates = []
+            for ticker in tickers:
+                # The fetched price is stored; AUTO_UPDATE_PRICES only changes the published one
+                price = stored_price = prices_data[ticker]
+                current_price = current_prices.get(ticker)
 
-                    if AUTO_UPDATE_PRICES:
-                        price = current_price + random.randint(-10, 10)
-                    
-                    # Publish update if price changed
-                    if current_price is None or current_price != price or ALLOW_SAME_PRICE:
-                        self.redis_client.publish(f"stock:price:{ticker}", json.dumps({
-                            "ticker": ticker,
-                            "price": price,
-                            "timestamp": current_time
-                        }))
+                if AUTO_UPDATE_PRICES and current_price is not None:
+                    price = current_price + random.randint(-10, 10) * PRICE_SCALE
+                
+                # Publish update if price changed
+                if current_price is None or current_price != price or ALLOW_SAME_PRICE:
+                    updates.append((ticker, price, self.stats_engine.update(ticker, price)))
+                records[ticker] = (stored_price, current_time, self.stats_engine.current(ticker))
+            
+            # Store every price before publishing, so a snapshot read after an
+            # update's stream entry includes it
+            write_prices(self.redis_client, records)
+            
+            # Append to the capped stream first; the entry ids are the
+            # updates' sequence numbers
+            with self.redis_client.pipeline(transaction=False) as pipe:
+                for ticker, price, _ in updates:
+                    pipe.xadd(
+                        PRICE_STREAM_KEY,
+                        {"ticker": ticker, "price": price, "timestamp": current_time},
+                        maxlen=PRICE_STREAM_MAXLEN,
+                        approximate=True,
+                    )
+                seqs = pipe.execute()
+            
+            opens = {ticker: self.get_day_open(ticker, price) for ticker, price, _ in updates}
+            with self.redis_client.pipeline(transaction=False) as pipe:
+                for (ticker, price, stats), seq in zip(updates, seqs):
+                    pipe.publish(price_channel(ticker), json.dumps({
+                        "ticker": ticker,
+                        "price": price,
+                        "open": opens[ticker],
+                        "timestamp": current_time,
+                        "seq": seq.decode('utf-8'),
+                        "stats": stats
+                    }))
+                    published_prices[ticker] = price
+                pipe.execute()
             
             # self.stdout.write(self.style.SUCCESS('Successfully wrote data to Redis'))
         except Exception as e:
             logger.error(f'Failed to write to Redis: {str(e)}')
             self.stdout.write(self.style.ERROR(f'Failed to write to Redis: {str(e)}'))
+        return published_prices
+
+    def evaluate_alerts(self, prices):
+        """Fire the price alerts crossed by this cycle's published prices"""
+        try:
+            alert_engine.refresh()
+            fired = 0
+            for ticker, price in prices.items():
+                fired += alert_engine.evaluate(ticker, price)
+            if fired:
+                logger.info(f'Fired {fired} price alerts')
+        except Exception as e:
+            logger.error(f'Failed to evaluate price alerts: {str(e)}')
+            self.stdout.write(self.style.ERROR(f'Failed to evaluate price alerts: {str(e)}'))
 
     def write_to_database(self, tickers_data, prices_data, timestamp):
         """Write data to PostgreSQL database"""
@@ -201,6 +290,11 @@ class Command(BaseCommand):
             # Convert timestamp string to date object for price history
             date_obj = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').date()
             
+            # Intraday ticks, appended in one bulk insert below
+            ticks = {}
+            # Securities written this cycle, copied to the watchlist shards below
+            securities = []
+            
             # Use a transaction to ensure data consistency
             with transaction.atomic():
                 # Process each ticker and its price
@@ -216,7 +310,8 @@ class Command(BaseCommand):
                         ticker=ticker,
                         defaults={
                             'name': company_name,
-                            'last_price': Decimal(str(price))
+                            'last_price': price,
+                            **self.stats_engine.current(ticker)
                         }
                     )
                     
@@ -225,9 +320,15 @@ class Command(BaseCommand):
                         security=security,
                         date=date_obj,
                         defaults={
-                            'price': Decimal(str(price))
+                            'price': price
                         }
                     )
+                    ticks[security.id] = price
+                    securities.append(security)
+                
+                record_ticks(ticks)
+            
+            replicate_securities(securities)
                 
             # self.stdout.write(self.style.SUCCESS('Successfully wrote data to database'))
         except Exception as e:
@@ -241,6 +342,9 @@ class Command(BaseCommand):
         try:
             logger.info("Starting API call cycle")
             
+            # Redis may have restarted empty since the last cycle
+            self.ensure_warm()
+            
             # Get tickers
             if self.debug_mode:
                 self.stdout.write("Fetching ticker data...")
@@ -258,8 +362,14 @@ class Command(BaseCommand):
             # Write data to file
             self.write_to_file(tickers_data, prices_data, timestamp)
             
+            # Prices are integer micro-units from here on, see casestudy.prices
+            prices_data = {ticker: to_micros(price) for ticker, price in prices_data.items()}
+            
             # Write data to Redis
-            self.write_to_redis(tickers_data, prices_data, timestamp)
+            published_prices = self.write_to_redis(tickers_data, prices_data, timestamp)
+            
+            # Notify users whose price alerts were crossed
+            self.evaluate_alerts(published_prices)
             
             # Write data to database
             self.write_to_database(tickers_data, prices_data, timestamp)
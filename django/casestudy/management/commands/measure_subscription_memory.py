@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand
+import json
+import random
+import tracemalloc
+import uuid
+from casestudy.websocket.subscriptions import SubscriptionIndex
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-connection memory cost of WebSocket subscription state'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--connections',
+            type=int,
+            default=100000,
+            help='Number of simulated connections (default: 100000)'
+        )
+        parser.add_argument(
+            '--tickers-per-connection',
+            type=int,
+            default=20,
+            help='Tickers each connection subscribes to (default: 20)'
+        )
+        parser.add_argument(
+            '--universe',
+            type=int,
+            nargs='+',
+            default=[100, 1000, 5000],
+            help='Numbers of distinct tickers to measure with (default: 100 1000 5000)'
+        )
+
+    def handle(self, *args, **options):
+        connections = options['connections']
+        self.stdout.write(f'{connections} connections, {options["tickers_per_connection"]} tickers each')
+        # Bitmasks grow with the highest ticker id they hold, so the saving
+        # shrinks as the universe grows
+        results = [
+            (size, *self.measure_universe(connections, options['tickers_per_connection'], size))
+            for size in options['universe']
+        ]
+
+        self.stdout.write(f'{"Universe":>8} {"Set-based":>12} {"Compact":>12} {"Saving":>7}  (bytes/connection)')
+        for size, set_bytes, compact_bytes in results:
+            self.stdout.write(
+                f'{size:>8} {set_bytes / connections:12.1f} {compact_bytes / connections:12.1f} '
+                f'{set_bytes / compact_bytes:6.1f}x'
+            )
+        savings = [set_bytes / compact_bytes for _, set_bytes, compact_bytes in results]
+        self.stdout.write(self.style.SUCCESS(
+            f'Compact layout uses {min(savings):.1f}x to {max(savings):.1f}x less memory'
+        ))
+
+    def measure_universe(self, connections, per_connection, size):
+        """Return the bytes of the set-based and compact layouts over `size` tickers"""
+        universe = [f'T{i:04d}' for i in range(size)]
+
+        # Each client's subscribe message is parsed separately, so the old layout
+        # held its own copies of the ticker strings
+        messages = [
+            json.dumps(random.sample(universe, min(per_connection, len(universe))))
+            for _ in range(connections)
+        ]
+        # Channel names exist on the consumers either way, so they are created
+        # outside the measurement
+        channel_names = [f'specific.{uuid.uuid4().hex}!{uuid.uuid4().hex[:12]}' for _ in range(connections)]
+
+        set_bytes = self.measure(self.build_set_layout, messages, channel_names)
+        compact_bytes = self.measure(self.build_compact_layout, messages, channel_names)
+        return set_bytes, compact_bytes
+
+    def measure(self, build, messages, channel_names):
+        tracemalloc.start()
+        state = build(messages, channel_names)
+        total, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del state
+        return total
+
+    def build_set_layout(self, messages, channel_names):
+        """The previous layout: string sets per connection and per ticker"""
+        consumer_tickers = {}
+        security_subscribers = {}
+        for message, channel_name in zip(messages, channel_names):
+            tickers = set(json.loads(message))
+            consumer_tickers[channel_name] = tickers
+            for ticker in tickers:
+                security_subscribers.setdefault(ticker, set()).add(channel_name)
+        return consumer_tickers, security_subscribers
+
+    def build_compact_layout(self, messages, channel_names):
+        index = SubscriptionIndex()
+        records = []
+        for message, channel_name in zip(messages, channel_names):
+            record = index.add_connection(channel_name)
+            index.subscribe(record, index.ticker_ids.mask(json.loads(message)))
+            records.append(record)
+        return index, records
@@ -0,0 +1,127 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+import redis
+from casestudy.keyspace import (
+    PRICES_KEY, NAMES_KEY, RECORDS_KEY, RECORD, LEGACY_DETAIL_PATTERN, LEGACY_PRICE_PATTERN,
+    write_names, write_prices,
+)
+from casestudy.prices import from_redis
+from casestudy.security_stats import STAT_FIELDS
+
+# Keys read, written or deleted per round trip
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Copy per-ticker Redis hashes into the consolidated keyspace and compare their memory usage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be copied and the memory used, without writing'
+        )
+        parser.add_argument(
+            '--delete-legacy',
+            action='store_true',
+            help='Delete the per-ticker hashes once copied'
+        )
+
+    def handle(self, *args, **options):
+        r = redis.Redis.from_url(settings.REDIS_URL)
+
+        detail_keys = list(r.scan_iter(match=LEGACY_DETAIL_PATTERN, count=BATCH_SIZE))
+        price_keys = list(r.scan_iter(match=LEGACY_PRICE_PATTERN, count=BATCH_SIZE))
+        legacy_keys = detail_keys + price_keys
+        self.stdout.write(f'Found {len(detail_keys)} detail and {len(price_keys)} price hashes')
+
+        legacy_bytes = self.memory_usage(r, legacy_keys)
+        names = self.read_names(r, detail_keys)
+        records = self.read_prices(r, price_keys)
+        # Whatever the new ingest (or the cache warm-up) already wrote is newer
+        names = self.without_existing(r, NAMES_KEY, names)
+        records = self.without_existing(r, PRICES_KEY, records)
+        self.stdout.write(f'{len(names)} names and {len(records)} prices to copy (tickers already consolidated are kept)')
+
+        if options['dry_run']:
+            new_bytes = self.memory_usage(r, [PRICES_KEY, NAMES_KEY, RECORDS_KEY]) + self.estimate_size(names, records)
+            new_label = 'estimated: their current size plus the data to copy, without Redis\' per-entry overhead'
+        else:
+            write_names(r, names)
+            with r.pipeline(transaction=False) as pipe:
+                write_prices(pipe, records)
+                pipe.execute()
+            self.stdout.write(f'Copied {len(names)} names and {len(records)} prices')
+            new_bytes = self.memory_usage(r, [PRICES_KEY, NAMES_KEY, RECORDS_KEY])
+            new_label = 'measured'
+
+        self.stdout.write(f'Per-ticker hashes: {len(legacy_keys)} keys, {legacy_bytes} bytes')
+        self.stdout.write(f'Consolidated hashes: 3 keys, {new_bytes} bytes ({new_label})')
+        if legacy_bytes and new_bytes:
+            self.stdout.write(f'Consolidated layout uses {new_bytes / legacy_bytes:.0%} of the per-ticker layout')
+        else:
+            self.stdout.write('No comparison possible: one of the layouts holds no data')
+
+        if options['delete_legacy'] and not options['dry_run']:
+            for start in range(0, len(legacy_keys), BATCH_SIZE):
+                r.unlink(*legacy_keys[start:start + BATCH_SIZE])
+            self.stdout.write(f'Deleted {len(legacy_keys)} per-ticker hashes')
+
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def memory_usage(self, r, keys):
+        """Return the bytes used by `keys`, as reported by MEMORY USAGE"""
+        total = 0
+        for start in range(0, len(keys), BATCH_SIZE):
+            with r.pipeline(transaction=False) as pipe:
+                for key in keys[start:start + BATCH_SIZE]:
+                    pipe.memory_usage(key, samples=0)
+                total += sum(usage or 0 for usage in pipe.execute())
+        return total
+
+    def estimate_size(self, names, records):
+        """Return the bytes of the fields and values the copy would add to the consolidated hashes"""
+        total = 0
+        for ticker, name in names.items():
+            total += len(ticker) + len(name.encode('utf-8'))
+        for ticker, (price, _, _) in records.items():
+            total += 2 * len(ticker) + len(str(price)) + RECORD.size
+        return total
+
+    def read_hashes(self, r, keys):
+        """Yield (ticker, hash) for `keys` named <prefix>:<ticker>, one round trip per batch"""
+        for start in range(0, len(keys), BATCH_SIZE):
+            batch = keys[start:start + BATCH_SIZE]
+            with r.pipeline(transaction=False) as pipe:
+                for key in batch:
+                    pipe.hgetall(key)
+                for key, data in zip(batch, pipe.execute()):
+                    if data:
+                        yield key.decode('utf-8').split(':')[-1], data
+
+    def without_existing(self, r, key, values):
+        """Drop the tickers already present in the consolidated hash `key` from {ticker: value}"""
+        tickers = list(values)
+        for start in range(0, len(tickers), BATCH_SIZE):
+            batch = tickers[start:start + BATCH_SIZE]
+            for ticker, existing in zip(batch, r.hmget(key, batch)):
+                if existing is not None:
+                    del values[ticker]
+        return values
+
+    def read_names(self, r, keys):
+        return {
+            ticker: data.get(b'company_name', b'Unknown').decode('utf-8')
+            for ticker, data in self.read_hashes(r, keys)
+        }
+
+    def read_prices(self, r, keys):
+        records = {}
+        for ticker, data in self.read_hashes(r, keys):
+            price = from_redis(data.get(b'value'))
+            if price is None:
+                continue
+            updated = float(data.get(b'lastUpdated') or 0)
+            stats = {field: from_redis(data.get(field.encode('utf-8'))) for field in STAT_FIELDS}
+            records[ticker] = (price, updated, stats)
+        return records
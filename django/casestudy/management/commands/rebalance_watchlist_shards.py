@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+import logging
+from casestudy.sharding import get_retired_shards, get_shards, misplaced_users, move_user, replicate_all_securities
+from casestudy.watchlist_cache import notify_watchlists_changed
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Move users\' watchlists to the shard WATCHLIST_SHARDS assigns them, after shards are added, '
+        'or removed (moved to RETIRED_WATCHLIST_SHARDS)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the users that would move without moving them'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=0,
+            help='Move at most N users (default: all)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Shards: {", ".join(get_shards())}')
+        if get_retired_shards():
+            self.stdout.write(f'Retired shards: {", ".join(get_retired_shards())}')
+        if not options['dry_run']:
+            # Memberships reference securities on the target shard
+            replicate_all_securities()
+
+        # Collected first: moving users changes the rows being scanned
+        moves = list(misplaced_users())
+        if options['limit']:
+            moves = moves[:options['limit']]
+
+        moved = failed = 0
+        for user_id, source, target in moves:
+            if options['dry_run']:
+                self.stdout.write(f'User {user_id}: {source} -> {target}')
+                continue
+            try:
+                count = move_user(user_id, source, target)
+            except Exception as e:
+                failed += 1
+                logger.error(f'Failed to move user {user_id} from {source} to {target}: {str(e)}')
+                continue
+            moved += 1
+            # Watchlist ids changed; drop cached watchlists and resync sockets
+            notify_watchlists_changed(user_id)
+            self.stdout.write(f'User {user_id}: moved {count} watchlists from {source} to {target}')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{len(moves)} users would move'))
+        elif failed:
+            self.stdout.write(self.style.ERROR(f'Moved {moved} users, {failed} failed'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Moved {moved} users'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from casestudy.memberships import recount_watchers
+
+
+class Command(BaseCommand):
+    help = 'Recompute every security\'s denormalized watcher count from the watchlist memberships'
+
+    def handle(self, *args, **options):
+        recount_watchers()
+        self.stdout.write(self.style.SUCCESS('Watcher counts recomputed'))
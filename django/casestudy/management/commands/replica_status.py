@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+import time
+from casestudy.replicas import get_replicas, measure_lag, MAX_REPLICA_LAG_SECONDS
+
+
+class Command(BaseCommand):
+    help = 'Report the replication lag of every read replica'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch',
+            type=int,
+            default=0,
+            help='Repeat every N seconds until interrupted (default: report once)'
+        )
+
+    def handle(self, *args, **options):
+        replicas = get_replicas()
+        if not replicas:
+            self.stdout.write('No read replicas configured (set <ALIAS>_REPLICA_HOSTS)')
+            return
+
+        try:
+            while True:
+                self.report(replicas)
+                if not options['watch']:
+                    break
+                time.sleep(options['watch'])
+        except KeyboardInterrupt:
+            pass
+
+    def report(self, replicas):
+        for primary, aliases in replicas.items():
+            for alias in aliases:
+                lag = measure_lag(alias)
+                if lag is None:
+                    self.stdout.write(self.style.ERROR(f'{alias} ({primary}): unreachable'))
+                elif lag > MAX_REPLICA_LAG_SECONDS:
+                    self.stdout.write(self.style.WARNING(f'{alias} ({primary}): {lag:.1f}s behind, skipped for reads'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'{alias} ({primary}): {lag:.1f}s behind'))
@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+import logging
+import random
+import time
+import redis
+from casestudy.price_stream import PRICE_STREAM_KEY
+from casestudy.price_table import PriceTable, PRICE_TABLE_CAPACITY, acquire_updater_lock
+from casestudy.prices import from_redis
+
+logger = logging.getLogger(__name__)
+
+# Stream entries read per round trip, and how long XREAD blocks (milliseconds)
+BATCH_SIZE = 1000
+BLOCK_MS = 5000
+# Reconnect backoff bounds in seconds
+RECONNECT_BACKOFF_BASE = 0.5
+RECONNECT_BACKOFF_MAX = 30.0
+
+
+class Command(BaseCommand):
+    help = 'Keep the host\'s shared-memory price table up to date from the price stream'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--capacity',
+            type=int,
+            default=PRICE_TABLE_CAPACITY,
+            help=f'Number of tickers the table can hold (default: {PRICE_TABLE_CAPACITY})'
+        )
+
+    def handle(self, *args, **options):
+        lock = acquire_updater_lock()
+        if lock is None:
+            self.stdout.write(self.style.WARNING('Another price table updater is running on this host'))
+            return
+
+        table = PriceTable.create(capacity=options['capacity'])
+        r = redis.Redis.from_url(settings.REDIS_URL)
+        self.stdout.write(self.style.SUCCESS(f'Price table created ({table.capacity} tickers)'))
+
+        try:
+            last_id = '-'
+            replayed = False
+            attempts = 0
+            while True:
+                try:
+                    if not replayed:
+                        last_id = self.replay(r, table, last_id)
+                        replayed = True
+                    while True:
+                        response = r.xread({PRICE_STREAM_KEY: last_id}, count=BATCH_SIZE, block=BLOCK_MS)
+                        attempts = 0
+                        for _, entries in response:
+                            last_id = self.apply(table, entries)
+                        if not response:
+                            # Readers treat a table without heartbeats as abandoned
+                            table.heartbeat()
+                except redis.RedisError as e:
+                    # Keep the table: readers fall back to Redis while it goes
+                    # without heartbeats, and pick it up again once they resume
+                    delay = min(RECONNECT_BACKOFF_MAX, RECONNECT_BACKOFF_BASE * (2 ** attempts))
+                    attempts += 1
+                    logger.error(f'Lost the price stream, retrying in {delay:.1f}s: {str(e)}')
+                    self.stdout.write(self.style.ERROR(f'Lost the price stream: {str(e)}'))
+                    time.sleep(delay * random.uniform(0.5, 1.0))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            table.close()
+            table.unlink()
+            lock.close()
+
+    def replay(self, r, table, last_id):
+        """
+        Apply the retained stream after `last_id`, so the table starts with
+        every ticker's latest price; returns the id to follow the stream from.
+        """
+        while True:
+            start = last_id if last_id == '-' else f'({last_id}'
+            entries = r.xrange(PRICE_STREAM_KEY, min=start, count=BATCH_SIZE)
+            if not entries:
+                break
+            last_id = self.apply(table, entries)
+        return '$' if last_id == '-' else last_id
+
+    def apply(self, table, entries):
+        """Write a batch of stream entries to the table; returns the last entry id"""
+        for entry_id, fields in entries:
+            try:
+                table.update(
+                    fields[b'ticker'].decode('utf-8'),
+                    from_redis(fields[b'price']),
+                    float(fields.get(b'timestamp', 0)),
+                )
+            except (KeyError, ValueError) as e:
+                logger.error(f'Skipping malformed price stream entry {entry_id}: {str(e)}')
+        last_id = entries[-1][0].decode('utf-8')
+        table.set_position(last_id)
+        return last_id
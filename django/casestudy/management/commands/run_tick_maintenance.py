@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from datetime import timedelta
+import logging
+import time
+from django.utils import timezone
+from casestudy.ticks import (
+    ensure_partitions, rollup_recent, drop_expired_partitions, drop_expired_bars, TICK_RETENTION_DAYS
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Create tick partitions, build OHLC rollups and apply tick retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='Seconds between maintenance passes (default: 60)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run a single pass and exit'
+        )
+        parser.add_argument(
+            '--backfill-hours',
+            type=int,
+            default=0,
+            help='Rebuild the bars of the last N hours on the first pass (default: 0)'
+        )
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=TICK_RETENTION_DAYS,
+            help=f'Days of raw ticks to keep (default: {TICK_RETENTION_DAYS})'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['backfill_hours']:
+            since = timezone.now() - timedelta(hours=options['backfill_hours'])
+
+        try:
+            while True:
+                self.run_pass(since, options['retention_days'])
+                since = None
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def run_pass(self, since, retention_days):
+        try:
+            ensure_partitions()
+            bars = rollup_recent(since)
+            dropped = drop_expired_partitions(retention_days)
+            deleted_bars = drop_expired_bars()
+
+            summary = ', '.join(f'{resolution}: {count}' for resolution, count in bars.items())
+            self.stdout.write(f'Rolled up bars ({summary})')
+            for name in dropped:
+                self.stdout.write(self.style.SUCCESS(f'Dropped expired tick partition {name}'))
+            if deleted_bars:
+                self.stdout.write(f'Deleted {deleted_bars} expired bars')
+        except Exception as e:
+            logger.error(f'Tick maintenance failed: {str(e)}')
+            self.stdout.write(self.style.ERROR(f'Tick maintenance failed: {str(e)}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+import redis
+from casestudy.warmup import warm_caches
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Redis caches (names, prices, statistics, day opens) from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Warm the caches even if they are already warm'
+        )
+
+    def handle(self, *args, **options):
+        r = redis.Redis.from_url(settings.REDIS_URL)
+        count = warm_caches(r, force=options['force'])
+        if count is None:
+            self.stdout.write('Caches are already warm or being warmed (use --force to rebuild them)')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Warmed caches with {count} prices'))
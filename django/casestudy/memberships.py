@@ -0,0 +1,92 @@
+"""
+Watchlist membership changes and the denormalized watcher counts.
+
+`Security.watcher_count` is the number of users with the security in at least
+one of their watchlists. It is adjusted as memberships are added and removed,
+checking only the (security, watchlist) index for the user's other
+memberships, so "how many users watch TSLA" and popularity rankings read one
+column instead of counting the join table. `recount_watchers` recomputes the
+counts from scratch.
+
+Memberships live on their watchlist's shard (see casestudy.sharding) and the
+counts on `default`; a user's memberships are all on one shard, so counting
+users per shard and summing gives the total.
+"""
+from django.db import transaction
+from django.db.models import F, Max
+from casestudy.models import Security, WatchListSecurity
+from casestudy.sharding import count_watchers
+
+
+def _memberships(watchlist):
+    return WatchListSecurity.objects.using(watchlist._state.db)
+
+
+def _user_watches(watchlist, security_id):
+    return _memberships(watchlist).filter(
+        security_id=security_id, watchlist__user_id=watchlist.user_id
+    ).exists()
+
+
+def add_security(watchlist, security_id):
+    """Append a security to a watchlist; returns False if it was already there"""
+    with transaction.atomic(using=watchlist._state.db):
+        if _memberships(watchlist).filter(watchlist=watchlist, security_id=security_id).exists():
+            return False
+        first_for_user = not _user_watches(watchlist, security_id)
+
+        last_position = watchlist.memberships.aggregate(last=Max('position'))['last']
+        _memberships(watchlist).create(
+            watchlist=watchlist,
+            security_id=security_id,
+            position=0 if last_position is None else last_position + 1,
+        )
+        if first_for_user:
+            Security.objects.filter(id=security_id).update(watcher_count=F('watcher_count') + 1)
+    return True
+
+
+def remove_security(watchlist, security_id):
+    """Remove a security from a watchlist; returns False if it was not there"""
+    with transaction.atomic(using=watchlist._state.db):
+        deleted, _ = _memberships(watchlist).filter(watchlist=watchlist, security_id=security_id).delete()
+        if not deleted:
+            return False
+        if not _user_watches(watchlist, security_id):
+            Security.objects.filter(id=security_id, watcher_count__gt=0).update(
+                watcher_count=F('watcher_count') - 1
+            )
+    return True
+
+
+def set_securities(watchlist, security_ids):
+    """Make a watchlist hold exactly `security_ids`, in that order"""
+    with transaction.atomic(using=watchlist._state.db):
+        current = set(watchlist.memberships.values_list('security_id', flat=True))
+        wanted = list(dict.fromkeys(security_ids))
+        for security_id in current - set(wanted):
+            remove_security(watchlist, security_id)
+        for security_id in wanted:
+            if security_id not in current:
+                add_security(watchlist, security_id)
+        for position, security_id in enumerate(wanted):
+            _memberships(watchlist).filter(watchlist=watchlist, security_id=security_id).update(position=position)
+
+
+def delete_watchlist(watchlist):
+    """Delete a watchlist, releasing its securities' watcher counts"""
+    with transaction.atomic(using=watchlist._state.db):
+        for security_id in list(watchlist.memberships.values_list('security_id', flat=True)):
+            remove_security(watchlist, security_id)
+        watchlist.delete()
+
+
+def recount_watchers():
+    """Recompute every security's watcher count from the memberships on every shard"""
+    counts = count_watchers()
+    with transaction.atomic():
+        for security_id, watcher_count in Security.objects.values_list('id', 'watcher_count'):
+            watchers = counts.get(security_id, 0)
+            if watchers != watcher_count:
+                Security.objects.filter(id=security_id).update(watcher_count=watchers)
+
@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-19 10:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('casestudy', '0002_userwatchlist_securitypricehistory_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('threshold', models.DecimalField(decimal_places=2, max_digits=11)),
+                ('direction', models.CharField(choices=[('above', 'Crosses above'), ('below', 'Crosses below')], max_length=5)),
+                ('active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('triggered_at', models.DateTimeField(blank=True, null=True)),
+                ('triggered_price', models.DecimalField(blank=True, decimal_places=2, max_digits=11, null=True)),
+                ('security', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='casestudy.security')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_alerts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pricealert',
+            index=models.Index(fields=['active', 'id'], name='casestudy_p_active_bc0604_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pricealert',
+            index=models.Index(fields=['user', 'created_at'], name='casestudy_p_user_id_4e0bb2_idx'),
+        ),
+    ]
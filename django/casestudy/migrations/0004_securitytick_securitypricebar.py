@@ -0,0 +1,73 @@
+# Generated by Django 4.2 on 2026-10-19 10:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('casestudy', '0003_pricealert'),
+    ]
+
+    operations = [
+        # Ticks are range partitioned by day, which Django cannot create, so
+        # the table is created by hand; casestudy.ticks creates the partitions
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='SecurityTick',
+                    fields=[
+                        ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                        ('time', models.DateTimeField()),
+                        ('price', models.DecimalField(decimal_places=2, max_digits=11)),
+                        ('security', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ticks', to='casestudy.security')),
+                    ],
+                ),
+                migrations.AddIndex(
+                    model_name='securitytick',
+                    index=models.Index(fields=['security', 'time'], name='casestudy_s_securit_3259a7_idx'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    sql=[
+                        '''
+                        CREATE TABLE casestudy_securitytick (
+                            id bigint GENERATED BY DEFAULT AS IDENTITY,
+                            time timestamp with time zone NOT NULL,
+                            price numeric(11, 2) NOT NULL,
+                            security_id bigint NOT NULL
+                                REFERENCES casestudy_security (id) DEFERRABLE INITIALLY DEFERRED,
+                            PRIMARY KEY (id, time)
+                        ) PARTITION BY RANGE (time)
+                        ''',
+                        'CREATE INDEX casestudy_s_securit_3259a7_idx ON casestudy_securitytick (security_id, time)',
+                    ],
+                    reverse_sql='DROP TABLE casestudy_securitytick',
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SecurityPriceBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('1m', '1 minute'), ('5m', '5 minutes'), ('1h', '1 hour'), ('1d', '1 day')], max_length=2)),
+                ('start', models.DateTimeField()),
+                ('open', models.DecimalField(decimal_places=2, max_digits=11)),
+                ('high', models.DecimalField(decimal_places=2, max_digits=11)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=11)),
+                ('close', models.DecimalField(decimal_places=2, max_digits=11)),
+                ('tick_count', models.IntegerField(default=0)),
+                ('security', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_bars', to='casestudy.security')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='securitypricebar',
+            index=models.Index(fields=['resolution', 'start'], name='casestudy_s_resolut_d8873c_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='securitypricebar',
+            unique_together={('security', 'resolution', 'start')},
+        ),
+    ]
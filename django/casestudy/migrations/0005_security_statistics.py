@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-19 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('casestudy', '0004_securitytick_securitypricebar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='security',
+            name='day_high',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=11, null=True),
+        ),
+        migrations.AddField(
+            model_name='security',
+            name='day_low',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=11, null=True),
+        ),
+        migrations.AddField(
+            model_name='security',
+            name='sma_20',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=11, null=True),
+        ),
+        migrations.AddField(
+            model_name='security',
+            name='sma_200',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=11, null=True),
+        ),
+        migrations.AddField(
+            model_name='security',
+            name='sma_50',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=11, null=True),
+        ),
+        migrations.AddField(
+            model_name='security',
+            name='week52_high',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=11, null=True),
+        ),
+        migrations.AddField(
+            model_name='security',
+            name='week52_low',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=11, null=True),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 4.2 on 2026-10-19 10:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+from django.utils import timezone
+
+
+def copy_memberships(apps, schema_editor):
+    UserWatchList = apps.get_model('casestudy', 'UserWatchList')
+    WatchListSecurity = apps.get_model('casestudy', 'WatchListSecurity')
+    db_alias = schema_editor.connection.alias
+    now = timezone.now()
+
+    positions = {}
+    memberships = []
+    rows = UserWatchList.securities.through.objects.using(db_alias).order_by('userwatchlist_id', 'id').values_list(
+        'userwatchlist_id', 'security_id'
+    )
+    for watchlist_id, security_id in rows.iterator():
+        position = positions.get(watchlist_id, 0)
+        positions[watchlist_id] = position + 1
+        memberships.append(WatchListSecurity(
+            watchlist_id=watchlist_id, security_id=security_id, position=position, added_at=now
+        ))
+    WatchListSecurity.objects.using(db_alias).bulk_create(memberships, batch_size=1000)
+
+
+def count_watchers(apps, schema_editor):
+    Security = apps.get_model('casestudy', 'Security')
+    db_alias = schema_editor.connection.alias
+    counts = Security.objects.using(db_alias).annotate(
+        watchers=Count('memberships__watchlist__user', distinct=True)
+    ).values_list('id', 'watchers')
+    for security_id, watchers in counts.iterator():
+        if watchers:
+            Security.objects.using(db_alias).filter(id=security_id).update(watcher_count=watchers)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('casestudy', '0005_security_statistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WatchListSecurity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('added_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['position', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='security',
+            name='watcher_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='security',
+            index=models.Index(fields=['-watcher_count'], name='security_watchers_idx'),
+        ),
+        migrations.AddField(
+            model_name='watchlistsecurity',
+            name='security',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='casestudy.security'),
+        ),
+        migrations.AddField(
+            model_name='watchlistsecurity',
+            name='watchlist',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='casestudy.userwatchlist'),
+        ),
+        migrations.AddIndex(
+            model_name='watchlistsecurity',
+            index=models.Index(fields=['security', 'watchlist'], name='casestudy_w_securit_7667a9_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='watchlistsecurity',
+            unique_together={('watchlist', 'security')},
+        ),
+        # A M2M field cannot be altered to use a through model, so the
+        # memberships are copied over and the field is replaced
+        migrations.RunPython(copy_memberships, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='userwatchlist',
+            name='securities',
+        ),
+        migrations.AddField(
+            model_name='userwatchlist',
+            name='securities',
+            field=models.ManyToManyField(blank=True, related_name='watchlists', through='casestudy.WatchListSecurity', to='casestudy.security'),
+        ),
+        migrations.RunPython(count_watchers, migrations.RunPython.noop),
+    ]
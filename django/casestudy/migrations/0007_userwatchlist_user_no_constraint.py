@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-19 11:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('casestudy', '0006_watchlistsecurity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userwatchlist',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='watchlists', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2 on 2026-10-19 12:14
+
+from django.db import migrations, models
+
+# (model, table, field, null) of every price column, converted in place from
+# numeric(11, 2) to bigint micro-units. Django's own AlterField would cast the
+# values without scaling them.
+PRICE_COLUMNS = [
+    ('security', 'casestudy_security', 'last_price', True),
+    ('security', 'casestudy_security', 'day_high', True),
+    ('security', 'casestudy_security', 'day_low', True),
+    ('security', 'casestudy_security', 'week52_high', True),
+    ('security', 'casestudy_security', 'week52_low', True),
+    ('security', 'casestudy_security', 'sma_20', True),
+    ('security', 'casestudy_security', 'sma_50', True),
+    ('security', 'casestudy_security', 'sma_200', True),
+    ('securitypricehistory', 'casestudy_securitypricehistory', 'price', False),
+    ('securitytick', 'casestudy_securitytick', 'price', False),
+    ('securitypricebar', 'casestudy_securitypricebar', 'open', False),
+    ('securitypricebar', 'casestudy_securitypricebar', 'high', False),
+    ('securitypricebar', 'casestudy_securitypricebar', 'low', False),
+    ('securitypricebar', 'casestudy_securitypricebar', 'close', False),
+    ('pricealert', 'casestudy_pricealert', 'threshold', False),
+    ('pricealert', 'casestudy_pricealert', 'triggered_price', True),
+]
+
+
+def to_micros_sql(table, columns):
+    changes = ', '.join(
+        f'ALTER COLUMN {column} TYPE bigint USING round({column} * 1000000)::bigint' for column in columns
+    )
+    return f'ALTER TABLE {table} {changes}'
+
+
+def to_numeric_sql(table, columns):
+    changes = ', '.join(
+        f'ALTER COLUMN {column} TYPE numeric(11, 2) USING round({column} / 1000000.0, 2)' for column in columns
+    )
+    return f'ALTER TABLE {table} {changes}'
+
+
+def convert_tables():
+    # One ALTER TABLE per table, so each table is rewritten once
+    tables = {}
+    for _, table, column, _ in PRICE_COLUMNS:
+        tables.setdefault(table, []).append(column)
+    return [
+        migrations.RunSQL(to_micros_sql(table, columns), to_numeric_sql(table, columns))
+        for table, columns in tables.items()
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('casestudy', '0007_userwatchlist_user_no_constraint'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=convert_tables(),
+            state_operations=[
+                migrations.AlterField(
+                    model_name=model_name,
+                    name=field,
+                    field=models.BigIntegerField(null=null, blank=null),
+                )
+                for model_name, _, field, null in PRICE_COLUMNS
+            ],
+        ),
+    ]
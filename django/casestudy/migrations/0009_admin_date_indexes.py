@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-19 16:40
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Indexes are built without locking the tables against writes, which
+    # cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('casestudy', '0008_integer_prices'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='securitypricehistory',
+            index=models.Index(fields=['date'], name='history_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='userwatchlist',
+            index=models.Index(fields=['created_at'], name='watchlist_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='watchlistsecurity',
+            index=models.Index(fields=['added_at'], name='membership_added_idx'),
+        ),
+    ]
@@ -27,10 +27,32 @@ class Security(models.Model):
     # The security's ticker (e.g. NFLX)
     ticker = models.TextField(null=False, blank=False)
 
-    # This field is used to store the last price of a security
-    last_price = models.DecimalField(
-        null=True, blank=True, decimal_places=2, max_digits=11,
-    )
+    # This field is used to store the last price of a security. Prices are
+    # stored as integer micro-units throughout, see casestudy.prices
+    last_price = models.BigIntegerField(null=True, blank=True)
+
+    # Statistics maintained by the ingest alongside last_price, see
+    # casestudy.security_stats
+    day_high = models.BigIntegerField(null=True, blank=True)
+    day_low = models.BigIntegerField(null=True, blank=True)
+    week52_high = models.BigIntegerField(null=True, blank=True)
+    week52_low = models.BigIntegerField(null=True, blank=True)
+    sma_20 = models.BigIntegerField(null=True, blank=True)
+    sma_50 = models.BigIntegerField(null=True, blank=True)
+    sma_200 = models.BigIntegerField(null=True, blank=True)
+
+    # Number of users with the security in at least one watchlist, kept up to
+    # date by casestudy.memberships
+    watcher_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Popularity ranking
+            models.Index(fields=['-watcher_count'], name='security_watchers_idx'),
+        ]
+
+    def __str__(self):
+        return self.ticker
 
 
 class SecurityPriceHistory(models.Model):
@@ -47,10 +69,9 @@ class SecurityPriceHistory(models.Model):
     # The date of this price record
     date = models.DateField(null=False, blank=False)
     
-    # Single price field (matching the structure of the main Security model)
-    price = models.DecimalField(
-        null=False, blank=False, decimal_places=2, max_digits=11,
-    )
+    # Single price field (matching the structure of the main Security model),
+    # in micro-units
+    price = models.BigIntegerField(null=False, blank=False)
     
     class Meta:
         # Ensure we don't have duplicate entries for the same security on the same date
@@ -58,18 +79,102 @@ class SecurityPriceHistory(models.Model):
         # Add index for faster querying by date ranges
         indexes = [
             models.Index(fields=['security', 'date']),
+            # Date ranges across securities, e.g. the admin's date hierarchy
+            models.Index(fields=['date'], name='history_date_idx'),
+        ]
+
+
+class SecurityTick(models.Model):
+    """
+    An intraday price observation of a Security.
+
+    The table is range partitioned by `time` into one Postgres partition per day
+    (see `casestudy.ticks`), so expired days are dropped as whole partitions.
+    Its primary key is (id, time), as Postgres requires the partition key in it.
+    """
+    id = models.BigAutoField(primary_key=True)
+
+    security = models.ForeignKey(
+        Security,
+        on_delete=models.CASCADE,
+        related_name='ticks'
+    )
+
+    # When the price was observed
+    time = models.DateTimeField(null=False, blank=False)
+
+    # In micro-units
+    price = models.BigIntegerField(null=False, blank=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['security', 'time']),
         ]
 
 
+class SecurityPriceBar(models.Model):
+    """
+    An OHLC bar of a Security at one resolution, rolled up from the intraday
+    ticks (1m) or from the next finer resolution (5m, 1h, 1d).
+    """
+    RESOLUTION_CHOICES = [
+        ('1m', '1 minute'),
+        ('5m', '5 minutes'),
+        ('1h', '1 hour'),
+        ('1d', '1 day'),
+    ]
+
+    security = models.ForeignKey(
+        Security,
+        on_delete=models.CASCADE,
+        related_name='price_bars'
+    )
+
+    resolution = models.CharField(max_length=2, choices=RESOLUTION_CHOICES)
+
+    # Start of the bar's interval
+    start = models.DateTimeField(null=False, blank=False)
+
+    # Prices in micro-units
+    open = models.BigIntegerField()
+    high = models.BigIntegerField()
+    low = models.BigIntegerField()
+    close = models.BigIntegerField()
+
+    # Number of ticks the bar was built from
+    tick_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['security', 'resolution', 'start']
+        indexes = [
+            models.Index(fields=['resolution', 'start']),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """
+    How far the bars of a resolution have been rolled up (see `casestudy.ticks`),
+    so a rollup pass after downtime resumes from there instead of only
+    rebuilding the latest bars.
+    """
+    resolution = models.CharField(max_length=2, choices=SecurityPriceBar.RESOLUTION_CHOICES, unique=True)
+
+    # Bars before this moment are up to date
+    rolled_up_until = models.DateTimeField()
+
+
 class UserWatchList(models.Model):
     """
     Represents a user's watchlist of securities they want to track.
     """
-    # Link to Django's built-in User model
+    # Link to Django's built-in User model. Users live on the default database
+    # and watchlists on their user's shard (see casestudy.sharding), so the
+    # reference has no database constraint
     user = models.ForeignKey(
         'auth.User',
         on_delete=models.CASCADE,
-        related_name='watchlists'
+        related_name='watchlists',
+        db_constraint=False,
     )
     
     # The name of the watchlist (e.g. "Tech Stocks", "My Portfolio")
@@ -84,9 +189,11 @@ class UserWatchList(models.Model):
     # Date the watchlist was last updated
     updated_at = models.DateTimeField(auto_now=True)
     
-    # Many-to-many relationship with Security model
+    # Many-to-many relationship with Security model, through the ordered
+    # WatchListSecurity memberships
     securities = models.ManyToManyField(
         Security,
+        through='WatchListSecurity',
         related_name='watchlists',
         blank=True,
     )
@@ -96,9 +203,93 @@ class UserWatchList(models.Model):
         indexes = [
             models.Index(fields=['user']),
             models.Index(fields=['user', 'created_at']),
+            # Admin date hierarchy and ordering
+            models.Index(fields=['created_at'], name='watchlist_created_idx'),
         ]
         # Optional: ensure each user can't have duplicate watchlist names
         unique_together = ['user', 'name']
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class WatchListSecurity(models.Model):
+    """
+    A security's membership of a watchlist.
+
+    Add and remove memberships through casestudy.memberships, which keeps the
+    positions and `Security.watcher_count` up to date.
+    """
+    watchlist = models.ForeignKey(
+        UserWatchList,
+        on_delete=models.CASCADE,
+        related_name='memberships'
+    )
+
+    security = models.ForeignKey(
+        Security,
+        on_delete=models.CASCADE,
+        related_name='memberships'
+    )
+
+    # Order of the security within the watchlist
+    position = models.PositiveIntegerField(default=0)
+
+    # When the security was added to the watchlist
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['watchlist', 'security']
+        ordering = ['position', 'id']
+        indexes = [
+            # Reverse lookups: which watchlists (and users) hold a security
+            models.Index(fields=['security', 'watchlist']),
+            # Admin date hierarchy and ordering
+            models.Index(fields=['added_at'], name='membership_added_idx'),
+        ]
+
+
+class PriceAlert(models.Model):
+    """
+    A user's request to be notified when a security's price crosses a threshold.
+
+    Alerts fire once: the alert engine deactivates an alert when it fires.
+    """
+    ABOVE = 'above'
+    BELOW = 'below'
+    DIRECTION_CHOICES = [
+        (ABOVE, 'Crosses above'),
+        (BELOW, 'Crosses below'),
+    ]
+
+    user = models.ForeignKey(
+        'auth.User',
+        on_delete=models.CASCADE,
+        related_name='price_alerts'
+    )
+
+    security = models.ForeignKey(
+        Security,
+        on_delete=models.CASCADE,
+        related_name='alerts'
+    )
+
+    # The price to watch for (in micro-units), and which way it has to be crossed
+    threshold = models.BigIntegerField(null=False, blank=False)
+    direction = models.CharField(max_length=5, choices=DIRECTION_CHOICES)
+
+    # Cleared when the alert fires
+    active = models.BooleanField(default=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # When the alert fired and at what price (in micro-units)
+    triggered_at = models.DateTimeField(null=True, blank=True)
+    triggered_price = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The alert engine loads active alerts
+            models.Index(fields=['active', 'id']),
+            models.Index(fields=['user', 'created_at']),
+        ]
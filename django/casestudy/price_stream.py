@@ -0,0 +1,61 @@
+"""
+Capped Redis Stream of price updates.
+
+Besides being published on its ticker's price channel (see casestudy.keyspace),
+every price update is appended to a single capped stream. The stream entry id
+(e.g. `1713000000000-3`) is the update's sequence number: it is sent with every
+WebSocket frame, and a client that reconnects with `resume_from=<seq>` is
+replayed only the entries it missed.
+
+The ingest also records each ticker's first price of the day (its day open) in
+`DAY_OPEN_KEY`, which derived metrics such as day change are computed from.
+Prices in the stream, the day opens and pub/sub messages are integer
+micro-units (see casestudy.prices).
+"""
+from casestudy.prices import price_to_float
+
+# Key of the stream holding every price update
+PRICE_STREAM_KEY = 'stock:stream'
+
+# Approximate cap on the stream length (~8 minutes of updates for 100 tickers
+# every 5 seconds)
+PRICE_STREAM_MAXLEN = 10000
+
+# Clients further behind than this get a snapshot instead of a replay
+MAX_RESUME_ENTRIES = 2000
+
+# Hash of ticker -> day open, and the date (YYYY-MM-DD) those opens are for
+DAY_OPEN_KEY = 'stock:day_open'
+DAY_OPEN_DATE_KEY = 'stock:day_open:date'
+
+
+def parse_seq(seq):
+    """
+    Parse a stream id into a comparable (milliseconds, sequence) tuple.
+
+    Returns None if `seq` is not a valid stream id.
+    """
+    if isinstance(seq, bytes):
+        seq = seq.decode('utf-8')
+    try:
+        milliseconds, _, sequence = str(seq).partition('-')
+        return int(milliseconds), int(sequence or 0)
+    except ValueError:
+        return None
+
+
+def day_change(price, open_price):
+    """
+    Return a ticker's day change metrics as a dict of open, change and change_pct,
+    given micro-unit prices. The values are floats in currency units, for frames.
+
+    Returns an empty dict if the day open is not known.
+    """
+    if price is None or open_price is None:
+        return {}
+    change = price - open_price
+    return {
+        'open': price_to_float(open_price),
+        'change': price_to_float(change),
+        'change_pct': round(change * 100 / open_price, 4) if open_price else None,
+    }
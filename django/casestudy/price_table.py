@@ -0,0 +1,273 @@
+"""
+Host-local live price table in shared memory.
+
+A single updater per host (`python manage.py run_price_table`) follows the price
+stream and writes every update into a `multiprocessing.shared_memory` segment.
+Every web and WebSocket process on the host attaches to the segment read-only,
+so current prices are memory lookups instead of Redis round trips.
+
+Segment layout (little endian):
+
+- header: magic, layout version, capacity, ticker count, header version, the
+  price stream id of the last applied update, the updater's generation and
+  its heartbeat
+- ticker names: `capacity` fixed-width slots; a ticker's slot is its id
+- records: `capacity` slots of (version, price in micro-units, timestamp)
+
+Records and the header are guarded by seqlocks: the writer makes the version
+odd, writes, then makes it even again. Readers retry until they see the same
+even version before and after reading, so they never return a torn record.
+
+Each updater creates a new segment with a new generation, and stamps the
+header with a heartbeat at least every few seconds, even when no prices
+change. A reader whose table has gone `PRICE_TABLE_STALE_SECONDS` without a
+heartbeat (its updater died or was restarted, leaving the reader mapped to an
+unlinked segment) re-attaches to the host's current segment, and gets no
+table, so it falls back to Redis, until one has a live updater.
+"""
+import fcntl
+import logging
+import os
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+logger = logging.getLogger(__name__)
+
+PRICE_TABLE_NAME = os.environ.get('PRICE_TABLE_NAME', 'watchlist_prices')
+PRICE_TABLE_CAPACITY = 8192
+
+# Only one updater per host may own the segment
+PRICE_TABLE_LOCK_FILE = f'/tmp/{PRICE_TABLE_NAME}.lock'
+
+MAGIC = b'WLPT'
+# Version 2: prices are int64 micro-units instead of doubles
+# Version 3: updater generation and heartbeat in the header
+LAYOUT_VERSION = 3
+
+HEADER = struct.Struct('<4sIIIQQQQd')
+HEADER_SIZE = 64
+NAME_SIZE = 16
+RECORD = struct.Struct('<Qqd')
+
+# Give up on a record a writer keeps changing under us after this many tries
+MAX_READ_RETRIES = 100
+
+# Tables without an updater heartbeat for this long are not read
+PRICE_TABLE_STALE_SECONDS = 15
+# Seconds between attempts to attach while there is no live table
+REATTACH_INTERVAL = 1
+
+
+class PriceTable:
+    """
+    A view of the shared price table.
+
+    Created by the updater with `create`; every other process uses `attach`
+    and only reads.
+    """
+    def __init__(self, shm, capacity):
+        self.shm = shm
+        self.buf = shm.buf
+        self.capacity = capacity
+        self.names_offset = HEADER_SIZE
+        self.records_offset = HEADER_SIZE + capacity * NAME_SIZE
+        # This process's copy of the ticker -> id directory
+        self.ids = {}
+
+    @classmethod
+    def create(cls, name=PRICE_TABLE_NAME, capacity=PRICE_TABLE_CAPACITY):
+        """Create (or replace) the segment; only the host's updater calls this"""
+        size = HEADER_SIZE + capacity * (NAME_SIZE + RECORD.size)
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:size] = bytes(size)
+        HEADER.pack_into(shm.buf, 0, MAGIC, LAYOUT_VERSION, capacity, 0, 0, 0, 0, time.time_ns(), time.time())
+        return cls(shm, capacity)
+
+    @classmethod
+    def attach(cls, name=PRICE_TABLE_NAME):
+        """Attach to the host's segment; returns None if there is no updater"""
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except (FileNotFoundError, OSError):
+            return None
+
+        # Readers must not unlink the segment when they exit (Python < 3.13
+        # registers every attached segment with the resource tracker)
+        try:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+
+        magic, layout_version, capacity = HEADER.unpack_from(shm.buf, 0)[:3]
+        if magic != MAGIC or layout_version != LAYOUT_VERSION:
+            shm.close()
+            return None
+        return cls(shm, capacity)
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+    # Writer side
+
+    def _header(self):
+        return list(HEADER.unpack_from(self.buf, 0))
+
+    def _write_header(self, count=None, position=None):
+        """Update the header, stamping it with a heartbeat"""
+        magic, layout_version, capacity, old_count, version, milliseconds, sequence, generation, _ = self._header()
+        if count is not None:
+            old_count = count
+        if position is not None:
+            milliseconds, sequence = position
+        fields = (old_count, version + 1, milliseconds, sequence, generation, time.time())
+        HEADER.pack_into(self.buf, 0, magic, layout_version, capacity, *fields)
+        HEADER.pack_into(self.buf, 0, magic, layout_version, capacity, *fields[:1], version + 2, *fields[2:])
+
+    def _add_ticker(self, ticker):
+        count = self._header()[3]
+        if count >= self.capacity:
+            raise ValueError(f'Price table is full ({self.capacity} tickers)')
+        encoded = ticker.encode('utf-8')[:NAME_SIZE]
+        offset = self.names_offset + count * NAME_SIZE
+        self.buf[offset:offset + NAME_SIZE] = encoded.ljust(NAME_SIZE, b'\0')
+        # Publish the name before the count that makes it visible
+        self._write_header(count=count + 1)
+        self.ids[ticker] = count
+        return count
+
+    def update(self, ticker, price, timestamp):
+        """Write a ticker's micro-unit price; only the updater calls this"""
+        ticker_id = self.ids.get(ticker)
+        if ticker_id is None:
+            ticker_id = self._add_ticker(ticker)
+
+        offset = self.records_offset + ticker_id * RECORD.size
+        version = RECORD.unpack_from(self.buf, offset)[0]
+        RECORD.pack_into(self.buf, offset, version + 1, price, timestamp)
+        RECORD.pack_into(self.buf, offset, version + 2, price, timestamp)
+
+    def set_position(self, seq):
+        """Record the price stream id of the last applied update"""
+        milliseconds, _, sequence = seq.partition('-')
+        self._write_header(position=(int(milliseconds), int(sequence or 0)))
+
+    def heartbeat(self):
+        """Show readers the updater is alive while no prices change"""
+        self._write_header()
+
+    # Reader side
+
+    def _refresh_ids(self):
+        count = self._read_header()[3]
+        for ticker_id in range(len(self.ids), count):
+            offset = self.names_offset + ticker_id * NAME_SIZE
+            name = bytes(self.buf[offset:offset + NAME_SIZE]).rstrip(b'\0').decode('utf-8')
+            self.ids[name] = ticker_id
+
+    def _read_header(self):
+        for _ in range(MAX_READ_RETRIES):
+            header = HEADER.unpack_from(self.buf, 0)
+            if header[4] % 2 == 0 and HEADER.unpack_from(self.buf, 0)[4] == header[4]:
+                return header
+        raise RuntimeError('Price table header kept changing while being read')
+
+    def get(self, ticker):
+        """Return (micro-unit price, timestamp, version) for a ticker, or None if unknown"""
+        ticker_id = self.ids.get(ticker)
+        if ticker_id is None:
+            self._refresh_ids()
+            ticker_id = self.ids.get(ticker)
+            if ticker_id is None:
+                return None
+
+        offset = self.records_offset + ticker_id * RECORD.size
+        for _ in range(MAX_READ_RETRIES):
+            version, price, timestamp = RECORD.unpack_from(self.buf, offset)
+            if version % 2 == 0 and RECORD.unpack_from(self.buf, offset)[0] == version:
+                return (price, timestamp, version) if version else None
+        return None
+
+    def position(self):
+        """Return the price stream id of the last applied update, or None"""
+        milliseconds, sequence = self._read_header()[5:7]
+        if not milliseconds:
+            return None
+        return f'{milliseconds}-{sequence}'
+
+    def generation(self):
+        """Return the id of the updater that created the segment"""
+        return self._read_header()[7]
+
+    def is_stale(self):
+        """Whether the updater has not written a heartbeat for PRICE_TABLE_STALE_SECONDS"""
+        return time.time() - self._read_header()[8] > PRICE_TABLE_STALE_SECONDS
+
+    def snapshot(self, tickers):
+        """Return a (prices, seq) tuple for the known tickers, prices at least as new as seq"""
+        seq = self.position()
+        prices = {}
+        for ticker in tickers:
+            record = self.get(ticker)
+            if record is not None:
+                prices[ticker] = record[0]
+        return prices, seq
+
+
+_attached = None
+_attached_generation = None
+_next_attach = 0
+
+
+def get_price_table():
+    """
+    Return this process's view of the host's price table, or None if there is
+    no table with a live updater.
+    """
+    global _attached, _attached_generation, _next_attach
+    if _attached is not None and _attached.is_stale():
+        # The mapping is released once no request still reads from it
+        _attached = None
+    if _attached is not None:
+        return _attached
+
+    # Retry at most every REATTACH_INTERVAL, rather than on every request
+    now = time.monotonic()
+    if now < _next_attach:
+        return None
+    _next_attach = now + REATTACH_INTERVAL
+
+    table = PriceTable.attach()
+    if table is None:
+        return None
+    if table.is_stale():
+        # The updater died, and a new one has not replaced its segment yet
+        table.close()
+        return None
+    generation = table.generation()
+    if _attached_generation is not None and generation != _attached_generation:
+        logger.info('Price table updater restarted; attached to its new segment')
+    _attached, _attached_generation = table, generation
+    return _attached
+
+
+def acquire_updater_lock():
+    """Take the host-wide updater lock; returns the open lock file, or None if held"""
+    lock_file = open(PRICE_TABLE_LOCK_FILE, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
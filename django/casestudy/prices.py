@@ -0,0 +1,90 @@
+"""
+Fixed-point prices.
+
+Inside the app a price is an integer number of micro-units (millionths of a
+currency unit, `PRICE_SCALE`): in the database, in Redis hashes, the price
+stream and pub/sub messages, in the shared-memory price table and in memory.
+Integer prices compare exactly, so change detection and alert crossings do not
+depend on float rounding, and a tick is never turned into a Decimal or a string
+on its way through.
+
+Prices are converted only at the edges: `to_micros` when a price comes in (the
+stock API, a client request), `format_price` and `price_to_float` when one goes
+out to a client.
+"""
+from decimal import Decimal
+
+PRICE_SCALE = 1_000_000
+SCALE_DIGITS = 6
+
+# Decimal places of prices returned by the REST API
+API_DECIMAL_PLACES = 2
+
+
+def to_micros(value):
+    """
+    Convert a price in currency units (int, float, Decimal, str or bytes) to
+    integer micro-units, rounding half up past the sixth decimal.
+
+    Raises ValueError if a string is not a number.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    if isinstance(value, str):
+        return _parse_micros(value)
+    if isinstance(value, Decimal):
+        return int((value * PRICE_SCALE).to_integral_value())
+    if isinstance(value, int):
+        return value * PRICE_SCALE
+    return round(value * PRICE_SCALE)
+
+
+def _parse_micros(text):
+    text = text.strip()
+    if 'e' in text or 'E' in text:
+        return round(float(text) * PRICE_SCALE)
+    negative = text.startswith('-')
+    whole, _, fraction = text.lstrip('+-').partition('.')
+    if not (whole or fraction) or not (whole or '0').isdigit() or not (fraction or '0').isdigit():
+        raise ValueError(f'Invalid price: {text!r}')
+    # One digit past the scale, to round on
+    digits = fraction[:SCALE_DIGITS + 1].ljust(SCALE_DIGITS + 1, '0')
+    micros = int(whole or '0') * PRICE_SCALE + (int(digits) + 5) // 10
+    return -micros if negative else micros
+
+
+def from_redis(raw):
+    """
+    Return the micro-unit price stored in Redis as `raw` (bytes), or None.
+
+    Accepts prices stored as decimal strings by versions before micro-units.
+    """
+    if raw is None:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        return to_micros(raw)
+
+
+def price_to_float(micros):
+    """Return a micro-unit price as a float in currency units, for JSON frames"""
+    return micros / PRICE_SCALE if micros is not None else None
+
+
+def prices_to_floats(prices):
+    """Convert a dict of micro-unit prices (None allowed) to floats"""
+    return {key: price_to_float(value) for key, value in prices.items()}
+
+
+def format_price(micros, places=API_DECIMAL_PLACES):
+    """Return a micro-unit price as a decimal string with `places` decimals, rounding half up"""
+    if micros is None:
+        return None
+    unit = 10 ** (SCALE_DIGITS - places)
+    scaled = (abs(micros) * 2 + unit) // (2 * unit)
+    whole, fraction = divmod(scaled, 10 ** places)
+    sign = '-' if micros < 0 and scaled else ''
+    return f'{sign}{whole}.{fraction:0{places}d}' if places else f'{sign}{whole}'
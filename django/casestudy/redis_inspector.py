@@ -0,0 +1,236 @@
+"""
+Non-blocking Redis inspector.
+
+Walks the keyspace with incremental SCAN rather than KEYS, so Redis keeps
+serving other clients between batches, and reads per key only O(1) metadata:
+TYPE, MEMORY USAGE (which samples `samples` elements of large collections
+instead of walking them), PTTL and the collection's length, pipelined in one
+round trip per SCAN batch.
+
+The report groups keys by prefix (their first `depth` `:`-separated parts,
+e.g. `stock:price:*`) with the number of keys, bytes, elements, types and TTL
+distribution of each, lists the largest keys, and counts pub/sub channels and
+their subscribers by prefix. Values are only read for the largest keys on
+request, and only the first `limit` elements of each.
+
+It depends on redis-py only, so the root `check_redis.py` script can use it
+without Django.
+"""
+import heapq
+import time
+from collections import Counter, defaultdict
+
+# Keys asked for per SCAN call
+SCAN_COUNT = 1000
+# Nested elements MEMORY USAGE samples per collection
+MEMORY_SAMPLES = 5
+# Key parts the summary groups by
+PREFIX_DEPTH = 2
+# Largest keys listed
+TOP_KEYS = 10
+# Elements read per key when showing values
+VALUE_SAMPLE_SIZE = 10
+# Channels per PUBSUB NUMSUB call
+NUMSUB_BATCH_SIZE = 500
+
+# (upper bound in seconds, label) of the TTL distribution buckets
+TTL_BUCKETS = [(60, '<1m'), (3600, '<1h'), (86400, '<1d'), (None, '>=1d')]
+NO_TTL = 'no ttl'
+
+# Command returning the number of elements of each key type
+LENGTH_COMMANDS = {
+    'string': 'strlen',
+    'hash': 'hlen',
+    'list': 'llen',
+    'set': 'scard',
+    'zset': 'zcard',
+    'stream': 'xlen',
+}
+
+
+def key_prefix(key, depth=PREFIX_DEPTH):
+    """Return the group of a key: its first `depth` parts, with `:*` if it has more"""
+    parts = key.split(':', depth)
+    if len(parts) <= depth:
+        return key
+    return ':'.join(parts[:depth]) + ':*'
+
+
+def ttl_bucket(pttl):
+    """Return the TTL distribution bucket of a PTTL reply in milliseconds"""
+    if pttl < 0:
+        return NO_TTL
+    for bound, label in TTL_BUCKETS:
+        if bound is None or pttl < bound * 1000:
+            return label
+
+
+def human_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+
+
+class PrefixStats:
+    """Totals of the keys sharing a prefix"""
+    __slots__ = ('keys', 'bytes', 'elements', 'types', 'ttls')
+
+    def __init__(self):
+        self.keys = 0
+        self.bytes = 0
+        self.elements = 0
+        self.types = Counter()
+        self.ttls = Counter()
+
+
+class KeyspaceReport:
+    """Keyspace totals by prefix, and the largest keys"""
+
+    def __init__(self, depth=PREFIX_DEPTH, top=TOP_KEYS):
+        self.depth = depth
+        self.top = top
+        self.prefixes = defaultdict(PrefixStats)
+        # Min-heap of (bytes, key, type, elements) of the largest keys
+        self.largest = []
+        self.keys = 0
+        self.bytes = 0
+        self.dbsize = None
+        self.used_memory = None
+
+    def add(self, key, key_type, size, pttl, elements):
+        stats = self.prefixes[key_prefix(key, self.depth)]
+        stats.keys += 1
+        stats.bytes += size
+        stats.elements += elements
+        stats.types[key_type] += 1
+        stats.ttls[ttl_bucket(pttl)] += 1
+        self.keys += 1
+        self.bytes += size
+
+        entry = (size, key, key_type, elements)
+        if len(self.largest) < self.top:
+            heapq.heappush(self.largest, entry)
+        elif entry > self.largest[0]:
+            heapq.heapreplace(self.largest, entry)
+
+    def largest_keys(self):
+        return sorted(self.largest, reverse=True)
+
+
+def inspect_keyspace(client, match='*', depth=PREFIX_DEPTH, top=TOP_KEYS, samples=MEMORY_SAMPLES,
+                     max_keys=None, pause=0):
+    """
+    Scan the keys matching `match` into a KeyspaceReport.
+
+    Stops after about `max_keys` keys if given, and sleeps `pause` seconds
+    between SCAN batches.
+    """
+    report = KeyspaceReport(depth, top)
+    report.dbsize = client.dbsize()
+    report.used_memory = client.info('memory').get('used_memory')
+
+    cursor = 0
+    while True:
+        cursor, keys = client.scan(cursor, match=match, count=SCAN_COUNT)
+        if keys:
+            with client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.type(key)
+                    pipe.memory_usage(key, samples=samples)
+                    pipe.pttl(key)
+                replies = pipe.execute()
+
+            metadata = []
+            with client.pipeline(transaction=False) as pipe:
+                for index, key in enumerate(keys):
+                    key_type, size, pttl = replies[3 * index:3 * index + 3]
+                    key_type = key_type.decode('utf-8')
+                    # Deleted since the SCAN
+                    if key_type == 'none' or size is None:
+                        continue
+                    metadata.append((key.decode('utf-8', 'replace'), key_type, size, pttl))
+                    if key_type in LENGTH_COMMANDS:
+                        getattr(pipe, LENGTH_COMMANDS[key_type])(key)
+                    else:
+                        pipe.exists(key)
+                lengths = pipe.execute()
+
+            for (key, key_type, size, pttl), elements in zip(metadata, lengths):
+                report.add(key, key_type, size, pttl, elements)
+
+        if cursor == 0 or (max_keys and report.keys >= max_keys):
+            break
+        if pause:
+            time.sleep(pause)
+    return report
+
+
+def inspect_pubsub(client, depth=PREFIX_DEPTH):
+    """
+    Return ({channel prefix: (channels, subscribers)}, pattern subscriptions)
+    for the channels with at least one subscriber.
+    """
+    channels = client.pubsub_channels()
+    prefixes = defaultdict(lambda: [0, 0])
+    for start in range(0, len(channels), NUMSUB_BATCH_SIZE):
+        for channel, subscribers in client.pubsub_numsub(*channels[start:start + NUMSUB_BATCH_SIZE]):
+            totals = prefixes[key_prefix(channel.decode('utf-8', 'replace'), depth)]
+            totals[0] += 1
+            totals[1] += subscribers
+    return {prefix: tuple(totals) for prefix, totals in prefixes.items()}, client.pubsub_numpat()
+
+
+def sample_value(client, key, key_type, limit=VALUE_SAMPLE_SIZE):
+    """Return up to `limit` elements of a key (a prefix of a string), read without walking it"""
+    if key_type == 'string':
+        return client.getrange(key, 0, 200)
+    if key_type == 'hash':
+        return client.hscan(key, 0, count=limit)[1]
+    if key_type == 'set':
+        return client.sscan(key, 0, count=limit)[1]
+    if key_type == 'zset':
+        return client.zscan(key, 0, count=limit)[1]
+    if key_type == 'list':
+        return client.lrange(key, 0, limit - 1)
+    if key_type == 'stream':
+        return client.xrevrange(key, count=limit)
+    return None
+
+
+def format_report(report, pubsub=None, client=None, values_limit=0):
+    """
+    Return the report as lines of text.
+
+    `pubsub` is the result of inspect_pubsub; with a `client` and a
+    `values_limit`, the largest keys are shown with a sample of their values.
+    """
+    lines = []
+    of_total = f' of {report.dbsize}' if report.dbsize is not None else ''
+    lines.append(f'Scanned {report.keys}{of_total} keys: {human_bytes(report.bytes)}')
+    if report.used_memory is not None:
+        lines.append(f'Redis used memory: {human_bytes(report.used_memory)}')
+
+    lines.append('')
+    lines.append(f'{"Prefix":<40} {"Keys":>8} {"Bytes":>10} {"Elements":>10}  Types / TTLs')
+    for prefix, stats in sorted(report.prefixes.items(), key=lambda item: item[1].bytes, reverse=True):
+        types = ', '.join(f'{key_type} {count}' for key_type, count in stats.types.most_common())
+        ttls = ', '.join(f'{bucket} {count}' for bucket, count in stats.ttls.most_common())
+        lines.append(
+            f'{prefix:<40} {stats.keys:>8} {human_bytes(stats.bytes):>10} {stats.elements:>10}  {types} / {ttls}'
+        )
+
+    lines.append('')
+    lines.append('Largest keys:')
+    for size, key, key_type, elements in report.largest_keys():
+        lines.append(f'  {key} ({key_type}, {elements} elements): {human_bytes(size)}')
+        if client is not None and values_limit:
+            lines.append(f'    {sample_value(client, key, key_type, values_limit)!r}')
+
+    if pubsub is not None:
+        channels, patterns = pubsub
+        lines.append('')
+        lines.append(f'Pub/sub: {sum(count for count, _ in channels.values())} channels, {patterns} pattern subscriptions')
+        for prefix, (count, subscribers) in sorted(channels.items(), key=lambda item: item[1][1], reverse=True):
+            lines.append(f'  {prefix:<40} {count:>6} channels {subscribers:>8} subscribers')
+    return lines
@@ -0,0 +1,167 @@
+"""
+Read replicas with read-your-writes consistency.
+
+`settings.DATABASE_REPLICAS` maps a database alias (`default` or a watchlist
+shard) to the aliases of its streaming replicas. Views using
+`ReplicaReadMixin` run the queries of their GET requests on a replica, which
+takes read load off the primary the ingest upserts prices into every cycle.
+
+Replicas lag behind their primary, so:
+
+- a user who just edited their watchlists is pinned to the primaries for
+  `READ_YOUR_WRITES_SECONDS` by a marker in the cache (`pin_user`, called by
+  `notify_watchlists_changed`), and sees their own edit on the next read
+- replicas more than `MAX_REPLICA_LAG_SECONDS` behind are not read from
+  until they catch up; lag is measured at most every
+  `REPLICA_LAG_CHECK_INTERVAL` seconds per process, in a background thread so
+  requests never wait on an unreachable replica, and replicas without a
+  recent measurement are not read from either
+
+`python manage.py replica_status` reports every replica's lag.
+"""
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger(__name__)
+
+PIN_CACHE_KEY = 'db:pin:{user_id}'
+# How long a user's reads stay on the primaries after a write
+READ_YOUR_WRITES_SECONDS = 10
+# Replicas further behind are skipped; kept below the pin window, so a pinned
+# user's first read from a replica already includes their write
+MAX_REPLICA_LAG_SECONDS = 5
+REPLICA_LAG_CHECK_INTERVAL = 5
+# Measurements older than this (e.g. stuck on a hung connection) no longer count
+REPLICA_LAG_MAX_AGE = 3 * REPLICA_LAG_CHECK_INTERVAL
+
+REPLICA_LAG_QUERY = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+'''
+
+# Whether the current request may read from replicas, see ReplicaReadMixin
+_replica_reads = ContextVar('replica_reads', default=False)
+
+# Replica alias -> (monotonic time measured, lag in seconds or None if unreachable)
+_lags = {}
+# Replica aliases being measured, and the lock guarding it
+_measuring = set()
+_measuring_lock = threading.Lock()
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', {})
+
+
+def primary_of(alias):
+    """Return the primary of a replica alias, or the alias itself"""
+    for primary, replicas in get_replicas().items():
+        if alias in replicas:
+            return primary
+    return alias
+
+
+def is_replica(alias):
+    return primary_of(alias) != alias
+
+
+def measure_lag(alias):
+    """Return how many seconds a replica is behind its primary, or None if it cannot be reached"""
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(REPLICA_LAG_QUERY)
+            lag = float(cursor.fetchone()[0] or 0)
+    except Exception as e:
+        logger.error(f'Failed to measure lag of replica {alias}: {str(e)}')
+        return None
+    if lag > MAX_REPLICA_LAG_SECONDS:
+        logger.warning(f'Replica {alias} is {lag:.1f}s behind, not reading from it')
+    return lag
+
+
+def refresh_lag(alias):
+    """Measure a replica's lag into _lags; runs in a background thread"""
+    try:
+        _lags[alias] = (time.monotonic(), measure_lag(alias))
+    finally:
+        # The thread's own connection
+        connections[alias].close()
+        with _measuring_lock:
+            _measuring.discard(alias)
+
+
+def replica_lag(alias):
+    """
+    Return a replica's last measured lag, or None if it is unknown or was not
+    measured in the last REPLICA_LAG_MAX_AGE seconds.
+
+    Measurements older than REPLICA_LAG_CHECK_INTERVAL are refreshed in the
+    background; the caller never waits for one.
+    """
+    now = time.monotonic()
+    measured = _lags.get(alias)
+    if measured is None or now - measured[0] >= REPLICA_LAG_CHECK_INTERVAL:
+        with _measuring_lock:
+            start = alias not in _measuring
+            _measuring.add(alias)
+        if start:
+            threading.Thread(target=refresh_lag, args=(alias,), name=f'replica-lag-{alias}', daemon=True).start()
+    if measured is None or now - measured[0] > REPLICA_LAG_MAX_AGE:
+        return None
+    return measured[1]
+
+
+def replica_for(alias):
+    """
+    Return the alias to read `alias`'s data from: an up-to-date replica when
+    the current request may read from replicas, else `alias` itself.
+    """
+    if not _replica_reads.get():
+        return alias
+    healthy = [
+        replica for replica in get_replicas().get(alias, ())
+        if (lag := replica_lag(replica)) is not None and lag <= MAX_REPLICA_LAG_SECONDS
+    ]
+    return random.choice(healthy) if healthy else alias
+
+
+def pin_user(user_id):
+    """Send a user's reads to the primaries for the next READ_YOUR_WRITES_SECONDS"""
+    if get_replicas():
+        cache.set(PIN_CACHE_KEY.format(user_id=user_id), 1, READ_YOUR_WRITES_SECONDS)
+
+
+def is_pinned(user_id):
+    return cache.get(PIN_CACHE_KEY.format(user_id=user_id)) is not None
+
+
+class ReplicaReadMixin:
+    """
+    APIView mixin running the queries of safe (GET, HEAD, OPTIONS) requests on
+    replicas, unless the user wrote within the read-your-writes window.
+    """
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            request.method in SAFE_METHODS
+            and get_replicas()
+            and not is_pinned(request.user.id)
+        ):
+            self._replica_reads_token = _replica_reads.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_reads_token', None)
+        if token is not None:
+            _replica_reads.reset(token)
+            self._replica_reads_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
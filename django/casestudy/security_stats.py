@@ -0,0 +1,143 @@
+"""
+Incrementally maintained per-security statistics.
+
+The ingest keeps, per ticker, the day's high and low, the 52-week high and
+low, and the 20/50/200-day simple moving averages, updated in O(1) per price:
+
+- completed days' closes feed running sums over the last n - 1 closes, so a
+  moving average is (sum + current price) / n
+- 52-week extremes come from monotonic deques of (day, close): the front of
+  each is the window's extreme, and expired days fall off the front
+
+Prices are integer micro-units (see casestudy.prices), so the running sums
+are exact. The statistics are stored next to `Security.last_price`, in the
+ticker's Redis price hash and in every published price update, so they are
+served without aggregate queries. `SecurityStatsEngine.rebuild` restores the windows
+from `SecurityPriceHistory` (and today's ticks) when the ingest starts.
+"""
+import datetime
+from collections import deque
+from django.db.models import Max, Min
+from casestudy.models import Security, SecurityPriceHistory, SecurityTick
+
+SMA_WINDOWS = (20, 50, 200)
+# Calendar days covered by the 52-week extremes
+YEAR_DAYS = 365
+
+STAT_FIELDS = ('day_high', 'day_low', 'week52_high', 'week52_low', 'sma_20', 'sma_50', 'sma_200')
+
+
+class RollingStats:
+    """Rolling windows of one security"""
+    __slots__ = ('day', 'price', 'day_high', 'day_low', 'closes', 'sums', 'highs', 'lows')
+
+    def __init__(self):
+        self.day = None
+        self.price = None
+        self.day_high = None
+        self.day_low = None
+        # Completed days' closes, enough for the longest moving average
+        self.closes = deque(maxlen=max(SMA_WINDOWS))
+        # Window -> sum of the last window - 1 closes
+        self.sums = {window: 0 for window in SMA_WINDOWS}
+        # Monotonic deques of (day ordinal, close): decreasing and increasing
+        self.highs = deque()
+        self.lows = deque()
+
+    def close_day(self, day, close):
+        """Add a completed day's close to the windows"""
+        for window in SMA_WINDOWS:
+            self.sums[window] += close
+            if len(self.closes) >= window - 1:
+                self.sums[window] -= self.closes[-(window - 1)]
+        self.closes.append(close)
+
+        while self.highs and self.highs[-1][1] <= close:
+            self.highs.pop()
+        self.highs.append((day, close))
+        while self.lows and self.lows[-1][1] >= close:
+            self.lows.pop()
+        self.lows.append((day, close))
+
+    def update(self, price, day):
+        """Apply a price observed on `day` (a date ordinal)"""
+        if self.day != day:
+            if self.day is not None and self.price is not None:
+                self.close_day(self.day, self.price)
+            self.day = day
+            self.day_high = self.day_low = price
+
+        self.price = price
+        self.day_high = max(self.day_high, price)
+        self.day_low = min(self.day_low, price)
+
+        # Drop closes older than a year
+        oldest = day - YEAR_DAYS
+        while self.highs and self.highs[0][0] <= oldest:
+            self.highs.popleft()
+        while self.lows and self.lows[0][0] <= oldest:
+            self.lows.popleft()
+
+    def values(self):
+        """Return the current statistics as a dict of micro-unit prices (None where unknown)"""
+        if self.price is None:
+            return dict.fromkeys(STAT_FIELDS)
+
+        stats = {
+            'day_high': self.day_high,
+            'day_low': self.day_low,
+            'week52_high': max(self.highs[0][1], self.day_high) if self.highs else self.day_high,
+            'week52_low': min(self.lows[0][1], self.day_low) if self.lows else self.day_low,
+        }
+        for window in SMA_WINDOWS:
+            stats[f'sma_{window}'] = (
+                round((self.sums[window] + self.price) / window) if len(self.closes) >= window - 1 else None
+            )
+        return stats
+
+
+class SecurityStatsEngine:
+    """Rolling statistics of every ticker the ingest sees"""
+    def __init__(self):
+        self.stats = {}
+
+    def rebuild(self, today=None):
+        """Restore every security's windows from its price history and today's ticks"""
+        today = today or datetime.date.today()
+        since = today - datetime.timedelta(days=max(YEAR_DAYS, max(SMA_WINDOWS) * 2))
+        tickers = dict(Security.objects.values_list('id', 'ticker'))
+
+        self.stats = {}
+        rows = SecurityPriceHistory.objects.filter(
+            date__gte=since, date__lte=today,
+        ).order_by('security_id', 'date').values_list('security_id', 'date', 'price')
+        for security_id, day, price in rows.iterator(chunk_size=5000):
+            stats = self.stats.setdefault(tickers[security_id], RollingStats())
+            stats.update(price, day.toordinal())
+
+        # Today's history row holds only the latest price; the ticks have the range
+        start_of_day = datetime.datetime.combine(today, datetime.time.min, tzinfo=datetime.timezone.utc)
+        day_ranges = SecurityTick.objects.filter(time__gte=start_of_day).values('security_id').annotate(
+            high=Max('price'), low=Min('price')
+        )
+        for row in day_ranges:
+            stats = self.stats.get(tickers.get(row['security_id']))
+            if stats is not None and stats.day == today.toordinal():
+                stats.day_high = max(stats.day_high, row['high'])
+                stats.day_low = min(stats.day_low, row['low'])
+
+    def update(self, ticker, price, today=None):
+        """Apply a ticker's new micro-unit price and return its statistics"""
+        today = today or datetime.date.today()
+        stats = self.stats.get(ticker)
+        if stats is None:
+            stats = self.stats[ticker] = RollingStats()
+        stats.update(price, today.toordinal())
+        return stats.values()
+
+    def current(self, ticker):
+        """Return a ticker's statistics for the Security model"""
+        stats = self.stats.get(ticker)
+        if stats is None:
+            return {}
+        return stats.values()
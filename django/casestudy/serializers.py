@@ -1,21 +1,117 @@
 from rest_framework import serializers
-from .models import Security, UserWatchList
+from .models import Security, UserWatchList, PriceAlert
+from .memberships import set_securities
+from .sharding import shard_for_user, user_watchlists
+from .prices import format_price, to_micros
+
+
+class PriceField(serializers.Field):
+    """
+    A micro-unit price (see casestudy.prices), exchanged with clients as a
+    decimal string such as "123.45".
+    """
+    default_error_messages = {
+        'invalid': 'A valid price is required.',
+    }
+
+    def to_representation(self, value):
+        return format_price(value)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('invalid')
+        try:
+            return to_micros(data)
+        except (TypeError, ValueError):
+            self.fail('invalid')
 
 
 class SecuritySerializer(serializers.ModelSerializer):
     """
     Serializer for the Security model.
     """
+    last_price = PriceField(required=False, allow_null=True)
+    day_high = PriceField(read_only=True)
+    day_low = PriceField(read_only=True)
+    week52_high = PriceField(read_only=True)
+    week52_low = PriceField(read_only=True)
+    sma_20 = PriceField(read_only=True)
+    sma_50 = PriceField(read_only=True)
+    sma_200 = PriceField(read_only=True)
+
     class Meta:
         model = Security
-        fields = ['id', 'name', 'ticker', 'last_price']
+        fields = [
+            'id', 'name', 'ticker', 'last_price',
+            'day_high', 'day_low', 'week52_high', 'week52_low', 'sma_20', 'sma_50', 'sma_200',
+            'watcher_count',
+        ]
+        read_only_fields = ['watcher_count']
 
 
 class UserWatchListSerializer(serializers.ModelSerializer):
     """
     Serializer for the UserWatchList model.
+
+    `securities` lists the security ids in watchlist order; writing it
+    replaces the watchlist's memberships.
     """
+    securities = serializers.PrimaryKeyRelatedField(
+        many=True, queryset=Security.objects.all(), required=False
+    )
+
     class Meta:
         model = UserWatchList
         fields = ['id', 'user', 'name', 'description', 'created_at', 'updated_at', 'securities']
-        read_only_fields = ['created_at', 'updated_at'] 
\ No newline at end of file
+        read_only_fields = ['created_at', 'updated_at']
+        # DRF's (user, name) validator queries the default database; see validate
+        validators = []
+
+    def validate(self, attrs):
+        # Each user's names are unique on their shard. The owner is taken by
+        # id: users live on default, not on the watchlist's shard
+        user_id = attrs['user'].id if 'user' in attrs else getattr(self.instance, 'user_id', None)
+        name = attrs.get('name', getattr(self.instance, 'name', None))
+        if user_id is not None and name is not None:
+            duplicates = user_watchlists(user_id).filter(name=name)
+            if self.instance is not None:
+                duplicates = duplicates.exclude(pk=self.instance.pk)
+            if duplicates.exists():
+                raise serializers.ValidationError('The fields user, name must make a unique set.', code='unique')
+        return attrs
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Memberships are ordered by position (prefetch them for lists)
+        data['securities'] = [membership.security_id for membership in instance.memberships.all()]
+        return data
+
+    def create(self, validated_data):
+        securities = validated_data.pop('securities', [])
+        shard = shard_for_user(validated_data['user'].id)
+        watchlist = UserWatchList.objects.using(shard).create(**validated_data)
+        set_securities(watchlist, [security.id for security in securities])
+        return watchlist
+
+    def update(self, instance, validated_data):
+        securities = validated_data.pop('securities', None)
+        instance = super().update(instance, validated_data)
+        if securities is not None:
+            set_securities(instance, [security.id for security in securities])
+        return instance
+
+
+class PriceAlertSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the PriceAlert model.
+    """
+    threshold = PriceField()
+    triggered_price = PriceField(read_only=True)
+
+    class Meta:
+        model = PriceAlert
+        fields = [
+            'id', 'user', 'security', 'threshold', 'direction', 'active',
+            'created_at', 'triggered_at', 'triggered_price',
+        ]
+        read_only_fields = ['active', 'created_at', 'triggered_at', 'triggered_price']
@@ -95,6 +95,43 @@ DATABASES = {
     }
 }
 
+# Database aliases holding users' watchlists, see casestudy.sharding. Shards
+# other than default are databases of the same name on the default server,
+# unless <ALIAS>_DB_HOST points elsewhere; run `migrate --database=<alias>`
+# for each of them
+WATCHLIST_SHARDS = os.environ.get('WATCHLIST_SHARDS', 'default').split(',')
+# Aliases removed from WATCHLIST_SHARDS whose users have not been moved off
+# yet; rebalance_watchlist_shards empties them, after which they can go
+RETIRED_WATCHLIST_SHARDS = [alias for alias in os.environ.get('RETIRED_WATCHLIST_SHARDS', '').split(',') if alias]
+for alias in WATCHLIST_SHARDS + RETIRED_WATCHLIST_SHARDS:
+    if alias not in DATABASES:
+        DATABASES[alias] = {
+            **DATABASES['default'],
+            'NAME': alias,
+            'HOST': os.environ.get(f'{alias.upper()}_DB_HOST', DATABASES['default']['HOST']),
+        }
+
+# Streaming read replicas: <ALIAS>_REPLICA_HOSTS lists the hosts replicating
+# that database (e.g. DEFAULT_REPLICA_HOSTS=db-replica1,db-replica2), see
+# casestudy.replicas. Connecting to an unreachable replica gives up after
+# REPLICA_CONNECT_TIMEOUT seconds
+REPLICA_CONNECT_TIMEOUT = 2
+DATABASE_REPLICAS = {}
+for alias in list(DATABASES):
+    hosts = os.environ.get(f'{alias.upper()}_REPLICA_HOSTS')
+    if hosts:
+        DATABASE_REPLICAS[alias] = []
+        for index, host in enumerate(hosts.split(','), start=1):
+            DATABASES[f'{alias}_replica{index}'] = {
+                **DATABASES[alias],
+                'HOST': host,
+                'OPTIONS': {**DATABASES[alias].get('OPTIONS', {}), 'connect_timeout': REPLICA_CONNECT_TIMEOUT},
+                'TEST': {'MIRROR': alias},
+            }
+            DATABASE_REPLICAS[alias].append(f'{alias}_replica{index}')
+
+DATABASE_ROUTERS = ['casestudy.sharding.ShardRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -138,6 +175,9 @@ STATIC_URL = '/static/'
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Redis instance used for prices, pub/sub and caching
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://redis:6379/0')
+
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.redis.RedisCache",
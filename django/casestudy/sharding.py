@@ -0,0 +1,249 @@
+"""
+Watchlist sharding across databases.
+
+Each user's watchlists and their memberships live on one of the database
+aliases in `settings.WATCHLIST_SHARDS`, picked from the user id with jump
+consistent hashing: growing the list from n to n + 1 shards moves only about
+1/(n + 1) of the users, and `python manage.py rebalance_watchlist_shards`
+copies exactly those users to their new shard.
+
+`Security` is a reference table replicated to every shard, so memberships
+keep their foreign key and joins to securities stay local to a shard. The
+ingest writes securities to `default` and copies them to the other shards
+with `replicate_securities`. Users stay on `default`; watchlists reference
+them by id only.
+
+Queries on sharded models must name their shard with
+`.using(shard_for_user(user_id))`, or start from `user_watchlists(user_id)`.
+`ShardRouter` routes new watchlists and memberships, and anything reached
+through a watchlist instance, to the right shard on its own.
+
+To remove a shard, move its alias from `WATCHLIST_SHARDS` to
+`RETIRED_WATCHLIST_SHARDS` and rebalance: retired shards are no longer
+assigned users, but are still scanned for users to move off them.
+"""
+import logging
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count
+from casestudy.models import Security, UserWatchList, WatchListSecurity
+from casestudy.replicas import is_replica, primary_of, replica_for
+
+logger = logging.getLogger(__name__)
+
+# Models stored on the owning user's shard
+SHARDED_MODELS = {'userwatchlist', 'watchlistsecurity'}
+
+# Securities copied to the shards per bulk upsert
+REPLICATION_BATCH_SIZE = 1000
+
+
+def get_shards():
+    return settings.WATCHLIST_SHARDS
+
+
+def get_retired_shards():
+    """Aliases removed from the shards that may still hold watchlists"""
+    return [alias for alias in settings.RETIRED_WATCHLIST_SHARDS if alias not in get_shards()]
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash (Lamping and Veach) of an integer key into [0, buckets)"""
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for_user(user_id, shards=None):
+    """Return the database alias holding a user's watchlists"""
+    shards = shards or get_shards()
+    return shards[jump_hash(int(user_id), len(shards))]
+
+
+def user_watchlists(user_id):
+    """Return a queryset of a user's watchlists, on their shard (or its replica, see casestudy.replicas)"""
+    return UserWatchList.objects.using(replica_for(shard_for_user(user_id))).filter(user_id=user_id)
+
+
+def secondary_shards():
+    """Return the shards securities are replicated to"""
+    return [alias for alias in get_shards() if alias != 'default']
+
+
+class ShardRouter:
+    """
+    Route watchlists and memberships to their user's shard.
+
+    Securities, users and everything else go to `default`; every model is
+    migrated on every shard so securities can be replicated and foreign keys
+    resolve locally. Reads go to a replica of the chosen database when the
+    request allows it, and writes always to the primary (see
+    casestudy.replicas).
+    """
+    def _shard_of(self, instance):
+        # Unsaved instances may have picked up the database of an object
+        # assigned to them (such as the user on `default`), so they are
+        # placed by their owner instead
+        if instance._state.adding:
+            if instance._meta.model_name == 'userwatchlist' and instance.user_id is not None:
+                return shard_for_user(instance.user_id)
+            if instance._meta.model_name == 'watchlistsecurity':
+                field = instance._meta.get_field('watchlist')
+                if field.is_cached(instance):
+                    return self._shard_of(instance.watchlist)
+        return instance._state.db
+
+    def _db_for(self, model, hints):
+        # Querysets reached from a watchlist (its memberships or securities)
+        # run on the watchlist's shard
+        instance = hints.get('instance')
+        if instance is not None and instance._meta.model_name in SHARDED_MODELS:
+            return self._shard_of(instance)
+        return None
+
+    def _instance_db(self, model, hints):
+        db = self._db_for(model, hints)
+        instance = hints.get('instance')
+        if db is None and instance is not None:
+            db = instance._state.db
+        return db
+
+    def db_for_read(self, model, **hints):
+        return replica_for(self._instance_db(model, hints) or DEFAULT_DB_ALIAS)
+
+    def db_for_write(self, model, **hints):
+        # Instances read from a replica are saved to its primary
+        db = self._instance_db(model, hints)
+        return primary_of(db) if db else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        models = {obj1._meta.model_name, obj2._meta.model_name}
+        # Securities are replicated and users are referenced by id, so both
+        # can be related to objects on any shard
+        if 'security' in models or 'user' in models:
+            return True
+        if models <= SHARDED_MODELS:
+            return primary_of(obj1._state.db) == primary_of(obj2._state.db)
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from their primary
+        if is_replica(db):
+            return False
+        return None
+
+
+def replicate_securities(securities):
+    """Upsert the given Security rows from `default` into every other shard"""
+    shards = secondary_shards()
+    if not shards or not securities:
+        return
+    fields = [field.attname for field in Security._meta.concrete_fields if not field.primary_key]
+    for alias in shards:
+        try:
+            Security.objects.using(alias).bulk_create(
+                [Security(pk=security.pk, **{field: getattr(security, field) for field in fields})
+                 for security in securities],
+                batch_size=REPLICATION_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['id'],
+                update_fields=fields,
+            )
+        except Exception as e:
+            logger.error(f'Failed to replicate securities to shard {alias}: {str(e)}')
+
+
+def replicate_all_securities():
+    """Copy every security from `default` to the other shards"""
+    batch = []
+    for security in Security.objects.using('default').order_by('id').iterator(chunk_size=REPLICATION_BATCH_SIZE):
+        batch.append(security)
+        if len(batch) >= REPLICATION_BATCH_SIZE:
+            replicate_securities(batch)
+            batch = []
+    replicate_securities(batch)
+
+
+def misplaced_users(shards=None):
+    """
+    Yield (user id, current alias, target alias) for every user whose
+    watchlists are not on the shard `shards` (default: the configured list)
+    assigns them, including every user left on a retired shard.
+    """
+    shards = shards or get_shards()
+    for alias in get_shards() + get_retired_shards():
+        user_ids = UserWatchList.objects.using(alias).values_list('user_id', flat=True).distinct()
+        for user_id in user_ids.iterator():
+            target = shard_for_user(user_id, shards)
+            if target != alias:
+                yield user_id, alias, target
+
+
+def move_user(user_id, source, target):
+    """
+    Copy a user's watchlists and memberships from `source` to `target`, then
+    delete them from `source`. Returns the number of watchlists copied.
+
+    The copy is committed on the target before anything is deleted from the
+    source, so a failure never loses watchlists. Watchlists whose name the user
+    already has on the target (copied by an interrupted earlier run, or created
+    there since) are not copied again, so an interrupted move can be re-run.
+
+    Watchlists get new ids on the target shard.
+    """
+    existing = set(UserWatchList.objects.using(target).filter(user_id=user_id).values_list('name', flat=True))
+    watchlists = [
+        watchlist
+        for watchlist in UserWatchList.objects.using(source).filter(user_id=user_id).order_by('id')
+        if watchlist.name not in existing
+    ]
+    memberships = list(
+        WatchListSecurity.objects.using(source).filter(
+            watchlist__in=[watchlist.id for watchlist in watchlists]
+        ).order_by('watchlist_id', 'position', 'id')
+    )
+
+    with transaction.atomic(using=target):
+        copies = UserWatchList.objects.using(target).bulk_create([
+            UserWatchList(user_id=user_id, name=watchlist.name, description=watchlist.description)
+            for watchlist in watchlists
+        ])
+        new_ids = {watchlist.id: copy.id for watchlist, copy in zip(watchlists, copies)}
+        membership_copies = WatchListSecurity.objects.using(target).bulk_create([
+            WatchListSecurity(
+                watchlist_id=new_ids[membership.watchlist_id],
+                security_id=membership.security_id,
+                position=membership.position,
+            )
+            for membership in memberships
+        ])
+
+        # bulk_create stamps the auto_now(_add) fields; restore the originals
+        for copy, watchlist in zip(copies, watchlists):
+            copy.created_at, copy.updated_at = watchlist.created_at, watchlist.updated_at
+        UserWatchList.objects.using(target).bulk_update(copies, ['created_at', 'updated_at'])
+        for copy, membership in zip(membership_copies, memberships):
+            copy.added_at = membership.added_at
+        WatchListSecurity.objects.using(target).bulk_update(membership_copies, ['added_at'])
+
+    # Only once the copy is committed; if this fails, a re-run copies nothing
+    # and deletes again
+    with transaction.atomic(using=source):
+        UserWatchList.objects.using(source).filter(user_id=user_id).delete()
+    return len(watchlists)
+
+
+def count_watchers():
+    """Return {security id: number of users watching it} summed across shards"""
+    counts = {}
+    for alias in get_shards():
+        rows = WatchListSecurity.objects.using(alias).values('security_id').annotate(
+            watchers=Count('watchlist__user_id', distinct=True)
+        ).values_list('security_id', 'watchers')
+        for security_id, watchers in rows:
+            counts[security_id] = counts.get(security_id, 0) + watchers
+    return counts
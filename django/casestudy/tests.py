@@ -0,0 +1,67 @@
+import time
+from channels.testing import HttpCommunicator
+from django.test import SimpleTestCase
+from casestudy.asgi import application
+from casestudy.websocket.heartbeat import HEARTBEAT_INTERVAL, MAX_MISSED_PONGS, HeartbeatScheduler
+
+# Django rejects requests without an allowed Host
+HEADERS = [(b'host', b'testserver')]
+
+
+class AsgiRoutingTests(SimpleTestCase):
+    """The ASGI router sends each HTTP path to the right application"""
+
+    async def test_price_stream_reaches_sse_consumer(self):
+        # Unauthenticated, so PriceStreamConsumer answers 401 (Django would 404)
+        communicator = HttpCommunicator(application, 'GET', '/stream/prices/', headers=HEADERS)
+        response = await communicator.get_response()
+        self.assertEqual(response['status'], 401)
+        self.assertEqual(response['body'], b'Authentication required')
+
+    async def test_unknown_stream_path_falls_through_to_django(self):
+        communicator = HttpCommunicator(application, 'GET', '/stream/unknown/', headers=HEADERS)
+        response = await communicator.get_response()
+        self.assertEqual(response['status'], 404)
+
+
+class FakeConnection:
+    expects_pongs = True
+    channel_name = 'test'
+
+    def __init__(self, sent_ago, received_ago):
+        now = time.monotonic()
+        self.last_sent = now - sent_ago
+        self.last_received = now - received_ago
+        self.sent = []
+        self.closed_with = None
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def close_connection(self, code=None):
+        self.closed_with = code
+
+
+class HeartbeatSchedulerTests(SimpleTestCase):
+    """Liveness comes from what clients send, not from what they are sent"""
+
+    async def fire(self, connection):
+        await HeartbeatScheduler()._fire({connection})
+        return connection
+
+    async def test_busy_connection_without_inbound_traffic_is_closed(self):
+        connection = await self.fire(FakeConnection(0, MAX_MISSED_PONGS * HEARTBEAT_INTERVAL + 1))
+        self.assertEqual(connection.closed_with, 4000)
+
+    async def test_busy_silent_connection_still_gets_heartbeats(self):
+        connection = await self.fire(FakeConnection(0, HEARTBEAT_INTERVAL + 1))
+        self.assertIsNone(connection.closed_with)
+        self.assertEqual(len(connection.sent), 1)
+
+    async def test_busy_responsive_connection_is_skipped(self):
+        connection = await self.fire(FakeConnection(0, 0))
+        self.assertEqual(connection.sent, [])
+
+    async def test_idle_connection_gets_heartbeat(self):
+        connection = await self.fire(FakeConnection(HEARTBEAT_INTERVAL + 1, 0))
+        self.assertEqual(len(connection.sent), 1)
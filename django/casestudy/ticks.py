@@ -0,0 +1,297 @@
+"""
+Intraday tick store and OHLC rollups.
+
+Every price the ingest fetches is appended to `SecurityTick`, a table range
+partitioned into one Postgres partition per day. Ticks are written with bulk
+inserts, and ticks older than `TICK_RETENTION_DAYS` are removed by dropping
+their partitions instead of a mass DELETE.
+
+Rollups build `SecurityPriceBar` OHLC bars: 1m bars from the ticks, then each
+coarser resolution from the one below it (5m from 1m, 1h from 5m, 1d from 1h),
+so each pass reads a small, already aggregated table. Each resolution's
+`RollupWatermark` records how far it has been rolled up, and the next pass
+resumes from there. Chart queries read the
+finest rollup that fits the requested number of points (`bars_for_range`)
+rather than raw ticks; `GET /securities/<id>/bars/` serves them.
+
+`python manage.py run_tick_maintenance` creates upcoming partitions, refreshes
+recent bars and applies retention in the background.
+"""
+import logging
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import connection
+from django.utils import timezone
+from casestudy.models import RollupWatermark, SecurityTick, SecurityPriceBar
+from casestudy.prices import PRICE_SCALE
+
+logger = logging.getLogger(__name__)
+
+TICK_TABLE = SecurityTick._meta.db_table
+BAR_TABLE = SecurityPriceBar._meta.db_table
+
+# Days of raw ticks kept; older partitions are dropped
+TICK_RETENTION_DAYS = 7
+# Days of partitions created ahead of time
+PARTITIONS_AHEAD = 2
+
+# Rollup resolutions from finest to coarsest: (resolution, width, source)
+# where source is None for bars built from the ticks
+RESOLUTIONS = [
+    ('1m', timedelta(minutes=1), None),
+    ('5m', timedelta(minutes=5), '1m'),
+    ('1h', timedelta(hours=1), '5m'),
+    ('1d', timedelta(days=1), '1h'),
+]
+RESOLUTION_WIDTHS = {resolution: width for resolution, width, _ in RESOLUTIONS}
+
+# Days each resolution's bars are kept; None keeps them forever
+BAR_RETENTION_DAYS = {
+    '1m': 30,
+    '5m': 180,
+    '1h': 730,
+    '1d': None,
+}
+
+# Range of the bars endpoint when `from` is not given
+DEFAULT_BARS_RANGE = timedelta(days=1)
+# Bounds of the bars endpoint's `points`
+DEFAULT_BAR_POINTS = 500
+MAX_BAR_POINTS = 5000
+
+# Bars are aligned to this origin (UTC midnight)
+BAR_ORIGIN = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+
+PARTITION_NAME = re.compile(rf'^{TICK_TABLE}_p(\d{{8}})$')
+
+# Last day a partition was ensured for by this process, see record_ticks
+_partition_ready_for = None
+
+
+def partition_name(day):
+    return f'{TICK_TABLE}_p{day:%Y%m%d}'
+
+
+def ensure_partitions(start_day=None, days=PARTITIONS_AHEAD + 1):
+    """Create the daily partitions from `start_day` (default today, UTC) if they do not exist"""
+    start_day = start_day or timezone.now().date()
+    with connection.cursor() as cursor:
+        for offset in range(days):
+            day = start_day + timedelta(days=offset)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF {TICK_TABLE} '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [day.isoformat(), (day + timedelta(days=1)).isoformat()]
+            )
+
+
+def tick_partitions():
+    """Return the (day, table name) of every tick partition, oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE parent.relname = %s',
+            [TICK_TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((datetime.strptime(match.group(1), '%Y%m%d').date(), name))
+    return sorted(partitions)
+
+
+def drop_expired_partitions(retention_days=TICK_RETENTION_DAYS):
+    """Drop the tick partitions entirely older than the retention window; returns their names"""
+    cutoff = timezone.now().date() - timedelta(days=retention_days)
+    dropped = []
+    with connection.cursor() as cursor:
+        for day, name in tick_partitions():
+            if day < cutoff:
+                cursor.execute(f'DROP TABLE IF EXISTS {name}')
+                dropped.append(name)
+    return dropped
+
+
+def record_ticks(prices, observed_at=None):
+    """
+    Append one tick per security in a single bulk insert.
+
+    `prices` maps security ids to micro-unit prices.
+    """
+    global _partition_ready_for
+
+    observed_at = observed_at or timezone.now()
+    day = observed_at.astimezone(dt_timezone.utc).date()
+    if _partition_ready_for != day:
+        ensure_partitions(day)
+        _partition_ready_for = day
+
+    SecurityTick.objects.bulk_create([
+        SecurityTick(security_id=security_id, time=observed_at, price=price)
+        for security_id, price in prices.items()
+    ])
+
+
+def align(moment, resolution):
+    """Return the start of the `resolution` bar containing `moment`"""
+    width = RESOLUTION_WIDTHS[resolution]
+    return moment - (moment - BAR_ORIGIN) % width
+
+
+def rollup(resolution, since, until=None):
+    """
+    (Re)build the `resolution` bars covering [since, until) from their source.
+
+    `since` is aligned down to a bar boundary so partially covered bars are
+    rebuilt whole. Returns the number of bars written.
+    """
+    width, source = next((width, source) for name, width, source in RESOLUTIONS if name == resolution)
+    since = align(since, resolution)
+    until = until or timezone.now()
+
+    if source is None:
+        query = f'''
+            SELECT security_id, date_bin(%s, time, %s) AS bucket,
+                   (array_agg(price ORDER BY time))[1],
+                   max(price), min(price),
+                   (array_agg(price ORDER BY time DESC))[1],
+                   count(*)
+            FROM {TICK_TABLE}
+            WHERE time >= %s AND time < %s
+            GROUP BY security_id, bucket
+        '''
+        params = [width, BAR_ORIGIN, since, until]
+    else:
+        query = f'''
+            SELECT security_id, date_bin(%s, start, %s) AS bucket,
+                   (array_agg(open ORDER BY start))[1],
+                   max(high), min(low),
+                   (array_agg(close ORDER BY start DESC))[1],
+                   sum(tick_count)
+            FROM {BAR_TABLE}
+            WHERE resolution = %s AND start >= %s AND start < %s
+            GROUP BY security_id, bucket
+        '''
+        params = [width, BAR_ORIGIN, source, since, until]
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            INSERT INTO {BAR_TABLE} (security_id, resolution, start, open, high, low, close, tick_count)
+            SELECT security_id, %s, bucket, open, high, low, close, tick_count
+            FROM ({query}) AS bars (security_id, bucket, open, high, low, close, tick_count)
+            ON CONFLICT (security_id, resolution, start) DO UPDATE SET
+                open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+                close = EXCLUDED.close, tick_count = EXCLUDED.tick_count
+        ''', [resolution] + params)
+        return cursor.rowcount
+
+
+def rollup_recent(since=None):
+    """
+    Refresh every resolution's bars, finest first.
+
+    Each resolution resumes from its watermark, the moment its previous pass
+    rolled up to, so bars are caught up after downtime; the previous and
+    current bar are always rebuilt, and everything from `since` onwards when
+    given. Returns the number of bars written per resolution.
+    """
+    now = timezone.now()
+    watermarks = dict(RollupWatermark.objects.values_list('resolution', 'rolled_up_until'))
+    written = {}
+    for resolution, width, _ in RESOLUTIONS:
+        start = min(watermarks.get(resolution, now), now - width)
+        if since is not None:
+            start = min(start, since)
+        written[resolution] = rollup(resolution, start, now)
+        # Only advanced once the bars are written, so a failed pass is retried
+        RollupWatermark.objects.update_or_create(resolution=resolution, defaults={'rolled_up_until': now})
+    return written
+
+
+def drop_expired_bars():
+    """Delete bars past their resolution's retention; returns the number deleted"""
+    deleted = 0
+    now = timezone.now()
+    for resolution, days in BAR_RETENTION_DAYS.items():
+        if days is not None:
+            deleted += SecurityPriceBar.objects.filter(
+                resolution=resolution, start__lt=now - timedelta(days=days)
+            ).delete()[0]
+    return deleted
+
+
+def pick_resolution(start, end, max_points):
+    """
+    Return the finest resolution giving at most `max_points` bars over [start, end).
+
+    Falls back to the coarsest resolution for very long ranges.
+    """
+    span = end - start
+    for resolution, width, _ in RESOLUTIONS:
+        if span / width <= max_points:
+            return resolution
+    return RESOLUTIONS[-1][0]
+
+
+def bars_for_range(security_ids, start, end, max_points):
+    """
+    Return (resolution, bars) for the securities over [start, end), reading the
+    finest rollup that needs at most `max_points` bars per security.
+    """
+    resolution = pick_resolution(start, end, max_points)
+    bars = SecurityPriceBar.objects.filter(
+        security_id__in=security_ids, resolution=resolution, start__gte=start, start__lt=end,
+    ).order_by('security_id', 'start').values_list(
+        'security_id', 'start', 'open', 'high', 'low', 'close'
+    )
+    return resolution, bars
+
+
+def serialize_bars(bars):
+    """Return bars from bars_for_range as a list of dicts with prices in currency units"""
+    return [
+        {
+            'start': start.isoformat(),
+            'open': round(open_ / PRICE_SCALE, 2),
+            'high': round(high / PRICE_SCALE, 2),
+            'low': round(low / PRICE_SCALE, 2),
+            'close': round(close / PRICE_SCALE, 2),
+        }
+        for _, start, open_, high, low, close in bars
+    ]
+
+
+def parse_datetime_param(query_params, name, default):
+    """Parse an ISO 8601 date and time query parameter, taken as UTC if it has no offset"""
+    if not query_params.get(name):
+        return default
+    moment = datetime.fromisoformat(query_params[name])
+    return moment if moment.tzinfo else moment.replace(tzinfo=dt_timezone.utc)
+
+
+def parse_bars_params(query_params):
+    """
+    Parse the `from`, `to` (ISO 8601 date and time) and `points` query parameters.
+
+    Returns (start, end, points); raises ValueError with a message fit for the
+    client on invalid input.
+    """
+    try:
+        end = parse_datetime_param(query_params, 'to', timezone.now())
+        start = parse_datetime_param(query_params, 'from', end - DEFAULT_BARS_RANGE)
+    except ValueError:
+        raise ValueError('from and to must be ISO 8601 dates and times')
+    if start >= end:
+        raise ValueError('from must be before to')
+    try:
+        points = int(query_params.get('points', DEFAULT_BAR_POINTS))
+    except ValueError:
+        raise ValueError('points must be an integer')
+    if not 1 <= points <= MAX_BAR_POINTS:
+        raise ValueError(f'points must be between 1 and {MAX_BAR_POINTS}')
+    return start, end, points
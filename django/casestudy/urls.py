@@ -18,9 +18,9 @@ from django.contrib import admin
 from django.urls import path
 
 from casestudy.views import (
-    LoginView, SecurityListView, UserWatchListView, 
-    UserWatchListDetailView, add_security_to_watchlist,
-    remove_security_from_watchlist
+    LoginView, ReadinessView, SecurityListView, SecurityHistoryView, SecurityBarsView, SecuritiesHistoryView, UserWatchListView, 
+    UserWatchListDetailView, UserWatchListAnalyticsView, add_security_to_watchlist,
+    remove_security_from_watchlist, PriceAlertListView, PriceAlertDetailView
 )
 
 urlpatterns = [
@@ -30,9 +30,16 @@ urlpatterns = [
     path('admin/', admin.site.urls),
 
     path('login/', LoginView.as_view(), name='login'),
+    path('ready/', ReadinessView.as_view(), name='ready'),
     path('securities/', SecurityListView.as_view(), name='security-list'),
+    path('securities/history/', SecuritiesHistoryView.as_view(), name='securities-history'),
+    path('securities/<int:pk>/history/', SecurityHistoryView.as_view(), name='security-history'),
+    path('securities/<int:pk>/bars/', SecurityBarsView.as_view(), name='security-bars'),
     path('watchlists/', UserWatchListView.as_view(), name='watchlist-list'),
     path('watchlists/<int:pk>/', UserWatchListDetailView.as_view(), name='watchlist-detail'),
+    path('watchlists/<int:pk>/analytics/', UserWatchListAnalyticsView.as_view(), name='watchlist-analytics'),
     path('watchlists/<int:watchlist_id>/add_security/', add_security_to_watchlist, name='add_security_to_watchlist'),
     path('watchlists/<int:pk>/remove_security/', remove_security_from_watchlist, name='remove-security-from-watchlist'),
+    path('alerts/', PriceAlertListView.as_view(), name='alert-list'),
+    path('alerts/<int:pk>/', PriceAlertDetailView.as_view(), name='alert-detail'),
 ]
@@ -3,8 +3,8 @@ For more information on setting up DRF views see docs:
 https://www.django-rest-framework.org/api-guide/views/#class-based-views
 """
 import os
+import time
 import redis
-from decimal import Decimal
 
 from rest_framework.views import APIView
 from rest_framework import authentication, permissions, status
@@ -13,8 +13,20 @@ from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404, redirect
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from django.conf import settings
-from .models import Security, UserWatchList
-from .serializers import SecuritySerializer, UserWatchListSerializer
+from .models import Security, PriceAlert
+from .serializers import SecuritySerializer, UserWatchListSerializer, PriceAlertSerializer
+from .watchlist_cache import notify_watchlists_changed
+from .price_table import get_price_table
+from .history import get_price_histories, parse_history_params, parse_date_range
+from .ticks import bars_for_range, parse_bars_params, serialize_bars
+from .analytics import get_watchlist_analytics
+from .security_stats import STAT_FIELDS
+from .prices import format_price
+from .keyspace import read_securities
+from .warmup import is_warm
+from .memberships import add_security, remove_security, delete_watchlist
+from .sharding import user_watchlists
+from .replicas import ReplicaReadMixin
 from django.contrib import messages
 from django.urls import reverse
 from django.http import HttpResponseForbidden, HttpResponseBadRequest
@@ -62,7 +74,59 @@ class LoginView(APIView):
         return Response(user_data)
 
 
-class SecurityListView(APIView):
+class ReadinessView(APIView):
+    """
+    Readiness probe: 200 once the Redis caches are warm (see casestudy.warmup),
+    503 until then.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, format=None):
+        try:
+            redis_client = redis.Redis.from_url(settings.REDIS_URL)
+            ready = is_warm(redis_client)
+        except Exception as e:
+            return Response({'ready': False, 'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if not ready:
+            return Response({'ready': False}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({'ready': True})
+
+
+# Security fields holding prices, returned as decimal strings like the serializer's
+PRICE_FIELDS = ('last_price', *STAT_FIELDS)
+# Fields of every security in the list, whichever source it is read from
+SECURITY_FIELDS = SecuritySerializer.Meta.fields
+
+# Seconds each process reuses the securities read from the database by the
+# price table and Redis paths of the security list
+SECURITY_DIRECTORY_TTL = 5
+
+_security_directory = (0, {})
+
+
+def get_security_directory():
+    """
+    Return {ticker: {field: value}} of every security, read from the database
+    at most every SECURITY_DIRECTORY_TTL seconds.
+    """
+    global _security_directory
+    expires, directory = _security_directory
+    if time.monotonic() >= expires:
+        directory = {security['ticker']: security for security in Security.objects.values(*SECURITY_FIELDS)}
+        _security_directory = (time.monotonic() + SECURITY_DIRECTORY_TTL, directory)
+    return directory
+
+
+def format_security(security):
+    """Return a security's SECURITY_FIELDS, with prices formatted like the serializer's"""
+    formatted = {field: security[field] for field in SECURITY_FIELDS}
+    for field in PRICE_FIELDS:
+        formatted[field] = format_price(security[field])
+    return formatted
+
+
+class SecurityListView(ReplicaReadMixin, APIView):
     """
     View to list all securities in the system.
     """
@@ -71,44 +135,46 @@ class SecurityListView(APIView):
 
     def get(self, request, format=None):
         """
-        Return a list of all securities, trying Redis first and falling back to database.
+        Return a list of all securities, trying the host's shared-memory price
+        table first, then Redis, and falling back to database.
+
+        The price table and Redis paths take ids and watcher counts (and,
+        for the table, names and statistics) from the securities directory,
+        so they return the same fields as the database without querying it on
+        every request.
         """
+        price_table = get_price_table()
+        if price_table:
+            securities_data = []
+            for ticker, security in get_security_directory().items():
+                record = price_table.get(ticker)
+                if record is not None:
+                    security = {**security, 'last_price': record[0]}
+                securities_data.append(format_security(security))
+            return Response(securities_data)
+
         try:
             # Try to get securities from Redis
-            redis_client = redis.Redis(host='redis', port=6379, db=0)
+            redis_client = redis.Redis.from_url(settings.REDIS_URL)
             
             # Check if Redis is available
             if redis_client.ping():
-                # Get all keys matching stock:detail:*
-                detail_keys = redis_client.keys('stock:detail:*')
+                # Names, prices and statistics of every ticker in one round trip
+                securities = read_securities(redis_client)
                 
-                if detail_keys:
+                if securities:
+                    directory = get_security_directory()
                     securities_data = []
                     
-                    for key in detail_keys:
-                        # Extract ticker from key (stock:detail:AAPL -> AAPL)
-                        ticker = key.decode('utf-8').split(':')[-1]
-                        
-                        # Get company details
-                        details = redis_client.hgetall(f'stock:detail:{ticker}')
-                        if not details:
-                            continue
-                            
-                        # Get price data
-                        price_data = redis_client.hgetall(f'stock:price:{ticker}')
-                        
-                        # Create security object
+                    for ticker, details in securities.items():
+                        known = directory.get(ticker, {})
                         security = {
+                            **details,
+                            'id': known.get('id'),
                             'ticker': ticker,
-                            'name': details.get(b'company_name', b'Unknown').decode('utf-8'),
-                            'last_price': Decimal(price_data.get(b'value', b'0').decode('utf-8')) if price_data else None
+                            'watcher_count': known.get('watcher_count', 0),
                         }
-                        
-                        # Get the database ID if available
-                        db_security = Security.objects.filter(ticker=ticker).first()
-                        security['id'] = db_security.id if db_security else None
-                        
-                        securities_data.append(security)
+                        securities_data.append(format_security(security))
                     
                     # If we have data from Redis, return it
                     if securities_data:
@@ -124,7 +190,101 @@ class SecurityListView(APIView):
         return Response(serializer.data)
 
 
-class UserWatchListView(APIView):
+# Most tickers accepted by the multi-ticker history endpoint
+MAX_HISTORY_TICKERS = 50
+
+
+class SecurityHistoryView(ReplicaReadMixin, APIView):
+    """
+    View to return a security's price history, downsampled server-side.
+
+        GET /securities/<id>/history/?from=YYYY-MM-DD&to=YYYY-MM-DD&points=500&method=lttb
+    """
+    authentication_classes = [SimpleTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk, format=None):
+        security = get_object_or_404(Security, pk=pk)
+        try:
+            start, end, points, method = parse_history_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        history = get_price_histories([security.id], start, end, points, method)[security.id]
+        return Response({
+            'id': security.id,
+            'ticker': security.ticker,
+            'from': start,
+            'to': end,
+            'method': method,
+            **history
+        })
+
+
+class SecurityBarsView(ReplicaReadMixin, APIView):
+    """
+    View to return a security's intraday OHLC bars, from the finest rollup
+    giving at most `points` bars over the range.
+
+        GET /securities/<id>/bars/?from=2024-01-02T14:30:00Z&to=2024-01-02T21:00:00Z&points=500
+    """
+    authentication_classes = [SimpleTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk, format=None):
+        security = get_object_or_404(Security, pk=pk)
+        try:
+            start, end, points = parse_bars_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        resolution, bars = bars_for_range([security.id], start, end, points)
+        return Response({
+            'id': security.id,
+            'ticker': security.ticker,
+            'from': start,
+            'to': end,
+            'resolution': resolution,
+            'bars': serialize_bars(bars),
+        })
+
+
+class SecuritiesHistoryView(ReplicaReadMixin, APIView):
+    """
+    View to return the downsampled price history of several securities at once.
+
+        GET /securities/history/?tickers=AAPL,MSFT&from=YYYY-MM-DD&to=YYYY-MM-DD&points=500
+    """
+    authentication_classes = [SimpleTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, format=None):
+        tickers = [ticker for ticker in request.query_params.get('tickers', '').split(',') if ticker]
+        if not tickers:
+            return Response({'error': 'tickers is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(tickers) > MAX_HISTORY_TICKERS:
+            return Response(
+                {'error': f'At most {MAX_HISTORY_TICKERS} tickers are allowed'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start, end, points, method = parse_history_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        securities = dict(Security.objects.filter(ticker__in=tickers).values_list('id', 'ticker'))
+        histories = get_price_histories(list(securities), start, end, points, method)
+        return Response({
+            'from': start,
+            'to': end,
+            'method': method,
+            'securities': {
+                ticker: {'id': security_id, **histories[security_id]}
+                for security_id, ticker in securities.items()
+            }
+        })
+
+class UserWatchListView(ReplicaReadMixin, APIView):
     """
     View to list all watchlists for the authenticated user and create new ones.
     """
@@ -135,7 +295,7 @@ class UserWatchListView(APIView):
         """
         Return a list of all watchlists for the authenticated user.
         """
-        watchlists = UserWatchList.objects.filter(user=request.user)
+        watchlists = user_watchlists(request.user.id).prefetch_related('memberships')
         serializer = UserWatchListSerializer(watchlists, many=True)
         return Response(serializer.data)
 
@@ -150,11 +310,12 @@ class UserWatchListView(APIView):
         serializer = UserWatchListSerializer(data=data)
         if serializer.is_valid():
             serializer.save()
+            notify_watchlists_changed(request.user.id)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserWatchListDetailView(APIView):
+class UserWatchListDetailView(ReplicaReadMixin, APIView):
     """
     View to manage a specific watchlist.
     """
@@ -165,7 +326,7 @@ class UserWatchListDetailView(APIView):
         """
         Retrieve a specific watchlist.
         """
-        watchlist = get_object_or_404(UserWatchList, pk=pk, user=request.user)
+        watchlist = get_object_or_404(user_watchlists(request.user.id), pk=pk)
         serializer = UserWatchListSerializer(watchlist)
         return Response(serializer.data)
     
@@ -173,10 +334,11 @@ class UserWatchListDetailView(APIView):
         """
         Update a specific watchlist.
         """
-        watchlist = get_object_or_404(UserWatchList, pk=pk, user=request.user)
+        watchlist = get_object_or_404(user_watchlists(request.user.id), pk=pk)
         serializer = UserWatchListSerializer(watchlist, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            notify_watchlists_changed(request.user.id)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -184,11 +346,36 @@ class UserWatchListDetailView(APIView):
         """
         Delete a specific watchlist.
         """
-        watchlist = get_object_or_404(UserWatchList, pk=pk, user=request.user)
-        watchlist.delete()
+        watchlist = get_object_or_404(user_watchlists(request.user.id), pk=pk)
+        delete_watchlist(watchlist)
+        notify_watchlists_changed(request.user.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class UserWatchListAnalyticsView(ReplicaReadMixin, APIView):
+    """
+    View to return a watchlist's return, volatility, drawdown and correlation
+    over a date range.
+
+        GET /watchlists/<id>/analytics/?from=YYYY-MM-DD&to=YYYY-MM-DD
+    """
+    authentication_classes = [SimpleTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk, format=None):
+        watchlist = get_object_or_404(user_watchlists(request.user.id), pk=pk)
+        try:
+            start, end = parse_date_range(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'id': watchlist.id,
+            'from': start,
+            'to': end,
+            **get_watchlist_analytics(watchlist, start, end)
+        })
+
 @api_view(['POST'])
 @authentication_classes([SimpleTokenAuthentication])
 @permission_classes([permissions.IsAuthenticated])
@@ -200,7 +387,7 @@ def add_security_to_watchlist(request, watchlist_id):
     user = request.user
     
     # Get the watchlist
-    watchlist = get_object_or_404(UserWatchList, id=watchlist_id, user=user)
+    watchlist = get_object_or_404(user_watchlists(user.id), id=watchlist_id)
     
     # Get the security ID from the request data
     security_id = request.data.get('security_id')
@@ -214,8 +401,9 @@ def add_security_to_watchlist(request, watchlist_id):
     # Get the security
     security = get_object_or_404(Security, id=security_id)
     
-    # Add the security to the watchlist
-    watchlist.securities.add(security)
+    # Add the security to the end of the watchlist
+    add_security(watchlist, security.id)
+    notify_watchlists_changed(user.id)
     
     return Response(
         {'message': f'Added {security.name} to your watchlist successfully'}, 
@@ -234,7 +422,7 @@ def remove_security_from_watchlist(request, pk):
     user = request.user
     
     # Get the watchlist
-    watchlist = get_object_or_404(UserWatchList, pk=pk, user=user)
+    watchlist = get_object_or_404(user_watchlists(user.id), pk=pk)
     
     # Get the security ID from the request data
     security_id = request.data.get('security_id')
@@ -249,9 +437,57 @@ def remove_security_from_watchlist(request, pk):
     security = get_object_or_404(Security, pk=security_id)
     
     # Remove the security from the watchlist
-    watchlist.securities.remove(security)
+    remove_security(watchlist, security.id)
+    notify_watchlists_changed(user.id)
     
     return Response(
         {'message': 'Security removed from watchlist successfully'}, 
         status=status.HTTP_200_OK
     )
+
+
+class PriceAlertListView(APIView):
+    """
+    View to list the authenticated user's price alerts and create new ones.
+    """
+    authentication_classes = [SimpleTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, format=None):
+        """
+        Return all price alerts of the authenticated user, newest first.
+        """
+        alerts = PriceAlert.objects.filter(user=request.user).order_by('-created_at')
+        serializer = PriceAlertSerializer(alerts, many=True)
+        return Response(serializer.data)
+
+    def post(self, request, format=None):
+        """
+        Create a price alert; the alert engine picks it up on its next tick.
+        """
+        data = request.data.copy()
+        data['user'] = request.user.id
+
+        serializer = PriceAlertSerializer(data=data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class PriceAlertDetailView(APIView):
+    """
+    View to retrieve or delete a specific price alert.
+    """
+    authentication_classes = [SimpleTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk, format=None):
+        alert = get_object_or_404(PriceAlert, pk=pk, user=request.user)
+        serializer = PriceAlertSerializer(alert)
+        return Response(serializer.data)
+
+    def delete(self, request, pk, format=None):
+        alert = get_object_or_404(PriceAlert, pk=pk, user=request.user)
+        alert.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,137 @@
+"""
+Cold-start warm-up of the Redis caches.
+
+Redis runs without persistence, so after a restart the security list finds no
+data in Redis and falls back to the database on every request, WebSocket
+snapshots have no prices and day changes have no day open until the ingest
+writes them again.
+
+`warm_caches` rebuilds them from the database: it streams every security
+(with a server-side cursor on Postgres) and, per `WARMUP_BATCH_SIZE`
+securities, reads which prices Redis already has, then writes in one pipeline:
+
+- names, prices and records with the statistics stored on `Security` (see
+  casestudy.keyspace)
+- day opens, from each security's first tick of the day (see
+  casestudy.price_stream)
+
+Prices already in Redis are newer than the database's and are left alone.
+When done it sets `WARM_KEY`, which is lost with the rest of the data when
+Redis restarts; `is_warm` is the readiness gate checked by the ingest before
+each cycle, the WebSocket server before accepting connections (or, under
+daphne, before serving its first one) and the `ready/` endpoint.
+
+`python manage.py warm_caches` runs it by hand.
+"""
+import datetime
+import logging
+import time
+import uuid
+from django.db.models import OuterRef, Subquery
+from casestudy.keyspace import PRICES_KEY, write_names, write_prices
+from casestudy.models import Security, SecurityTick
+from casestudy.price_stream import DAY_OPEN_KEY, DAY_OPEN_DATE_KEY
+from casestudy.security_stats import STAT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Set (to the Unix time it finished) once the caches are warm
+WARM_KEY = 'stock:warm'
+# Held while a process warms the caches, so concurrent starts warm them once
+WARM_LOCK_KEY = 'stock:warm:lock'
+WARM_LOCK_SECONDS = 300
+
+# Deletes the lock only if it still holds our token: after WARM_LOCK_SECONDS it
+# may have expired and been taken by another process
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+WARMUP_BATCH_SIZE = 1000
+
+
+def is_warm(client):
+    return bool(client.exists(WARM_KEY))
+
+
+def warm_caches(client, force=False):
+    """
+    Rebuild the Redis caches from the database unless they are already warm.
+
+    Returns the number of prices written, or None if the caches were warm or
+    another process is warming them.
+    """
+    if not force and is_warm(client):
+        return None
+    token = uuid.uuid4().hex
+    if not client.set(WARM_LOCK_KEY, token, nx=True, ex=WARM_LOCK_SECONDS):
+        logger.info('Caches are being warmed by another process')
+        return None
+
+    try:
+        started = time.monotonic()
+        today = datetime.date.today()
+        claim_day_opens(client, today)
+
+        count = 0
+        batch = []
+        for security in warmup_rows(today).iterator(chunk_size=WARMUP_BATCH_SIZE):
+            batch.append(security)
+            if len(batch) >= WARMUP_BATCH_SIZE:
+                count += write_batch(client, batch)
+                batch = []
+        if batch:
+            count += write_batch(client, batch)
+
+        client.set(WARM_KEY, time.time())
+        logger.info(f'Warmed caches with {count} prices in {time.monotonic() - started:.1f}s')
+        return count
+    finally:
+        client.eval(RELEASE_LOCK_SCRIPT, 1, WARM_LOCK_KEY, token)
+
+
+def claim_day_opens(client, today):
+    """Make DAY_OPEN_KEY today's, unless it already is"""
+    stored_date = client.get(DAY_OPEN_DATE_KEY)
+    if stored_date is None or stored_date.decode('utf-8') != today.isoformat():
+        with client.pipeline() as pipe:
+            pipe.delete(DAY_OPEN_KEY)
+            pipe.set(DAY_OPEN_DATE_KEY, today.isoformat())
+            pipe.execute()
+
+
+def warmup_rows(today):
+    """Every priced security with its statistics, last tick time and first price of `today`"""
+    ticks = SecurityTick.objects.filter(security=OuterRef('pk'))
+    start_of_day = datetime.datetime.combine(today, datetime.time.min, tzinfo=datetime.timezone.utc)
+    return Security.objects.filter(last_price__isnull=False).annotate(
+        last_tick=Subquery(ticks.order_by('-time').values('time')[:1]),
+        day_open=Subquery(ticks.filter(time__gte=start_of_day).order_by('time').values('price')[:1]),
+    ).values('ticker', 'name', 'last_price', 'last_tick', 'day_open', *STAT_FIELDS).order_by('pk')
+
+
+def write_batch(client, securities):
+    """Write a batch of warm-up rows; returns the number of prices written"""
+    tickers = [security['ticker'] for security in securities]
+    cached = {ticker for ticker, value in zip(tickers, client.hmget(PRICES_KEY, tickers)) if value is not None}
+
+    records = {}
+    with client.pipeline(transaction=False) as pipe:
+        write_names(pipe, {security['ticker']: security['name'] for security in securities})
+        for security in securities:
+            ticker = security['ticker']
+            if security['day_open'] is not None:
+                # Keeps an open the ingest recorded already
+                pipe.hsetnx(DAY_OPEN_KEY, ticker, security['day_open'])
+            if ticker in cached:
+                continue
+            updated = security['last_tick'].timestamp() if security['last_tick'] else 0.0
+            records[ticker] = (
+                security['last_price'], updated, {field: security[field] for field in STAT_FIELDS}
+            )
+        write_prices(pipe, records)
+        pipe.execute()
+    return len(records)
@@ -0,0 +1,78 @@
+"""
+Cached per-user watchlist tickers and watchlist change notifications.
+
+The WebSocket tier reads a user's watchlist tickers on connect to subscribe them
+server-side, and the tickers of each watchlist to compute watchlist metrics.
+The REST tier calls `notify_watchlists_changed` after every watchlist edit,
+which drops the cached tickers and tells the WebSocket nodes holding that
+user's sockets to resync them. It also pins the user's reads to the primary
+databases for a short while (see casestudy.replicas).
+"""
+import time
+from django.core.cache import cache
+from casestudy.models import Security, UserWatchList, WatchListSecurity
+from casestudy.sharding import shard_for_user
+from casestudy.replicas import pin_user
+from casestudy.websocket.cluster import send_to_user
+
+WATCHLIST_TICKERS_CACHE_KEY = 'watchlist:tickers:{user_id}'
+WATCHLIST_TICKERS_CACHE_TTL = 300
+USER_WATCHLISTS_CACHE_KEY = 'watchlist:lists:{user_id}'
+# Changes on every edit of a user's watchlists; part of the key of results
+# derived from them, such as watchlist analytics
+WATCHLISTS_VERSION_CACHE_KEY = 'watchlist:version:{user_id}'
+
+
+def get_user_watchlist_tickers(user_id):
+    """Return the sorted tickers across all of a user's watchlists"""
+    key = WATCHLIST_TICKERS_CACHE_KEY.format(user_id=user_id)
+    tickers = cache.get(key)
+    if tickers is None:
+        tickers = sorted(set(
+            Security.objects.using(shard_for_user(user_id)).filter(
+                watchlists__user_id=user_id
+            ).values_list('ticker', flat=True)
+        ))
+        cache.set(key, tickers, WATCHLIST_TICKERS_CACHE_TTL)
+    return tickers
+
+
+def get_user_watchlists(user_id):
+    """Return a user's watchlists as a list of (watchlist id, sorted tickers) tuples"""
+    key = USER_WATCHLISTS_CACHE_KEY.format(user_id=user_id)
+    watchlists = cache.get(key)
+    if watchlists is None:
+        shard = shard_for_user(user_id)
+        tickers_by_watchlist = {
+            watchlist_id: [] for watchlist_id in
+            UserWatchList.objects.using(shard).filter(user_id=user_id).values_list('id', flat=True)
+        }
+        rows = WatchListSecurity.objects.using(shard).filter(
+            watchlist__user_id=user_id
+        ).values_list('watchlist_id', 'security__ticker')
+        for watchlist_id, ticker in rows:
+            tickers_by_watchlist[watchlist_id].append(ticker)
+        watchlists = [
+            (watchlist_id, sorted(tickers)) for watchlist_id, tickers in tickers_by_watchlist.items()
+        ]
+        cache.set(key, watchlists, WATCHLIST_TICKERS_CACHE_TTL)
+    return watchlists
+
+
+def get_watchlists_version(user_id):
+    """Return the current version of a user's watchlists"""
+    return cache.get_or_set(WATCHLISTS_VERSION_CACHE_KEY.format(user_id=user_id), time.time_ns(), None)
+
+
+def notify_watchlists_changed(user_id):
+    """
+    Invalidate a user's cached watchlists and tickers, resync their open
+    sockets and keep their reads on the primaries until replicas have the edit
+    """
+    pin_user(user_id)
+    cache.delete_many([
+        WATCHLIST_TICKERS_CACHE_KEY.format(user_id=user_id),
+        USER_WATCHLISTS_CACHE_KEY.format(user_id=user_id),
+    ])
+    cache.set(WATCHLISTS_VERSION_CACHE_KEY.format(user_id=user_id), time.time_ns(), None)
+    send_to_user(user_id, {'type': 'watchlists_changed'})
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger('websocket')
+
+# New connections admitted per second per node, and the burst allowed on top
+CONNECT_RATE = 200
+CONNECT_BURST = 400
+# Connections wait up to this many seconds for a slot before being turned away
+MAX_QUEUE_WAIT = 2.0
+
+# Close code telling the client to come back after the advertised delay
+RETRY_AFTER_CLOSE_CODE = 4029
+# Close code for connections still open when a drain window ends (service restart)
+DRAINED_CLOSE_CODE = 1012
+
+# Default window (seconds) over which a draining node spreads its clients'
+# reconnects, and the extra time before it closes the stragglers
+DRAIN_WINDOW = 30
+DRAIN_GRACE = 5
+
+class AdmissionController:
+    """
+    Per-node connect rate limit with a bounded wait queue.
+
+    A token bucket where each connect reserves a token: connects within the
+    burst are admitted at once, later ones wait their turn as long as that is
+    under `MAX_QUEUE_WAIT`, and the rest are told when to retry. The retry delay
+    covers the current backlog plus jitter, so rejected clients come back spread
+    out rather than all at once. A draining node turns every connect away.
+    """
+    def __init__(self, rate=CONNECT_RATE, burst=CONNECT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.draining = False
+
+    async def admit(self):
+        """Wait for a connect slot; returns None if admitted, else seconds to retry after"""
+        if self.draining:
+            # Send the client to another node
+            return random.uniform(1, 5)
+
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return None
+
+        wait = -self.tokens / self.rate
+        if wait > MAX_QUEUE_WAIT:
+            # Give the reservation back and turn the client away
+            self.tokens += 1
+            return wait + random.uniform(0, wait)
+
+        await asyncio.sleep(wait)
+        return None
+
+# Create a singleton instance
+admission_controller = AdmissionController()
@@ -0,0 +1,178 @@
+"""
+Cluster-wide directory of WebSocket nodes.
+
+Each WebSocket process is a node with its own in-process registries (the module
+globals in `consumers`). This module publishes what each node holds to Redis so
+that several processes and hosts can share the load and still reach a user:
+
+- `ws:cluster:user:<user_id>` is the set of nodes with sockets open for a user
+- `ws:node:<node_id>:alive` is refreshed while a node is running and expires
+  when it dies, so readers can prune entries left behind by crashed nodes
+- `ws:node:<node_id>` is the pub/sub channel a node's listener subscribes to,
+  used to deliver events to one user's sockets wherever they are connected
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+logger = logging.getLogger('websocket')
+
+# Unique per process; set WS_NODE_ID to pin it, e.g. per container replica
+NODE_ID = os.environ.get('WS_NODE_ID') or f"{socket.gethostname()}:{os.getpid()}"
+
+NODE_CHANNEL_PREFIX = 'ws:node:'
+USER_NODES_KEY = 'ws:cluster:user:{user_id}'
+NODE_ALIVE_KEY = 'ws:node:{node_id}:alive'
+
+# Seconds a node stays listed without refreshing its alive key
+NODE_TTL = 30
+NODE_REFRESH_INTERVAL = 10
+
+_sync_client = None
+
+
+def node_channel(node_id):
+    return f"{NODE_CHANNEL_PREFIX}{node_id}"
+
+
+class ClusterRegistry:
+    """
+    This node's entries in the cluster directory.
+
+    Only the first local socket of a user touches Redis, so directory traffic
+    does not grow with connections.
+    Registration failures are logged rather than raised: the directory is only
+    used for routing and is fully re-asserted if Redis loses it.
+    """
+    def __init__(self, node_id=NODE_ID):
+        self.node_id = node_id
+        self.channel = node_channel(node_id)
+        self.redis_client = None
+        self.users = set()
+        self.running = False
+        self.task = None
+
+    def _client(self):
+        if self.redis_client is None:
+            self.redis_client = aioredis.from_url(settings.REDIS_URL)
+        return self.redis_client
+
+    async def _update(self, key_template, field, values, add):
+        if not values:
+            return
+        try:
+            async with self._client().pipeline(transaction=False) as pipe:
+                for value in values:
+                    key = key_template.format(**{field: value})
+                    if add:
+                        pipe.sadd(key, self.node_id)
+                    else:
+                        pipe.srem(key, self.node_id)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error updating cluster directory: {str(e)}")
+
+    async def register_user(self, user_id):
+        if user_id not in self.users:
+            self.users.add(user_id)
+            await self._update(USER_NODES_KEY, 'user_id', [user_id], add=True)
+
+    async def unregister_user(self, user_id):
+        if user_id in self.users:
+            self.users.discard(user_id)
+            await self._update(USER_NODES_KEY, 'user_id', [user_id], add=False)
+
+    def start(self):
+        """Start refreshing this node's alive key; cheap and safe to call repeatedly"""
+        if self.running:
+            return
+        self.running = True
+        self.task = asyncio.create_task(self._refresh())
+
+    async def stop(self):
+        self.running = False
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+        # Leave the directory cleanly instead of waiting for the TTL
+        await self._update(USER_NODES_KEY, 'user_id', self.users, add=False)
+        try:
+            await self._client().delete(NODE_ALIVE_KEY.format(node_id=self.node_id))
+        except Exception as e:
+            logger.error(f"Error leaving cluster directory: {str(e)}")
+
+    async def _refresh(self):
+        alive_key = NODE_ALIVE_KEY.format(node_id=self.node_id)
+        while self.running:
+            try:
+                # A missing alive key means this is a fresh start, or Redis lost
+                # its data or expired us during a partition: re-assert everything
+                if await self._client().set(alive_key, 1, ex=NODE_TTL, nx=True):
+                    await self._update(USER_NODES_KEY, 'user_id', self.users, add=True)
+                else:
+                    await self._client().expire(alive_key, NODE_TTL)
+            except Exception as e:
+                logger.error(f"Error refreshing cluster node: {str(e)}")
+            await asyncio.sleep(NODE_REFRESH_INTERVAL)
+
+
+def _get_sync_client():
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _sync_client
+
+
+def _live_nodes(client, key):
+    """Return the live nodes listed under `key`, pruning those that died"""
+    nodes = [node.decode('utf-8') for node in client.smembers(key)]
+    if not nodes:
+        return []
+
+    pipe = client.pipeline(transaction=False)
+    for node_id in nodes:
+        pipe.exists(NODE_ALIVE_KEY.format(node_id=node_id))
+    alive = pipe.execute()
+
+    dead = [node_id for node_id, is_alive in zip(nodes, alive) if not is_alive]
+    if dead:
+        client.srem(key, *dead)
+    return [node_id for node_id, is_alive in zip(nodes, alive) if is_alive]
+
+
+def send_to_user(user_id, event):
+    """
+    Deliver `event` to every open socket of a user, on whichever nodes they are.
+
+    Usable from any process, including the REST tier. Returns the number of
+    nodes the event was sent to.
+    """
+    try:
+        client = _get_sync_client()
+        nodes = _live_nodes(client, USER_NODES_KEY.format(user_id=user_id))
+        if not nodes:
+            return 0
+
+        message = json.dumps({'type': 'user_event', 'user_id': user_id, 'event': event})
+        pipe = client.pipeline(transaction=False)
+        for node_id in nodes:
+            pipe.publish(node_channel(node_id), message)
+        pipe.execute()
+        return len(nodes)
+    except redis.RedisError as e:
+        logger.error(f"Failed to send event to user {user_id}: {str(e)}")
+        return 0
+
+
+# Create a singleton instance
+cluster_registry = ClusterRegistry()
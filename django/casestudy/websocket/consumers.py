@@ -1,99 +1,564 @@
 import json
+import time
+import random
 import asyncio
-import weakref
-import datetime
 import logging
+import urllib.parse
+import redis
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from .redis_listener import redis_listener
+from django.conf import settings
+from casestudy.price_stream import PRICE_STREAM_KEY, MAX_RESUME_ENTRIES, DAY_OPEN_KEY, parse_seq, day_change
+from casestudy.price_table import get_price_table
+from casestudy.prices import from_redis, price_to_float, prices_to_floats
+from casestudy.keyspace import NAMES_KEY, PRICES_KEY, channel_ticker, parse_prices, price_channel
+from casestudy.watchlist_cache import get_user_watchlist_tickers, get_user_watchlists
+from casestudy.warmup import warm_caches
+from .redis_listener import redis_listener, CONTROL_CHANNEL
+from .heartbeat import heartbeat_scheduler
+from .cluster import cluster_registry
+from .subscriptions import SubscriptionIndex, valid_tickers
+from .derived import watchlist_metrics
+from .admission import (
+    admission_controller, RETRY_AFTER_CLOSE_CODE, DRAINED_CLOSE_CODE, DRAIN_WINDOW, DRAIN_GRACE
+)
 
 # Configure logger
 logger = logging.getLogger('websocket')
 
-# Track all active consumers by their channel_name
-active_consumers = weakref.WeakValueDictionary()
-# Track which securities each consumer is subscribed to
-security_subscribers = {}
-# Track which securities we're currently subscribed to at the Redis level
-subscribed_securities = set()
+# The registries below are per node (process); the users each node holds
+# sockets for are published to the cluster-wide directory in `cluster`
 
-async def initialize_redis():
-    """Initialize the shared Redis connection and start the listener"""
-    # Connect to Redis
-    await redis_listener.connect()
+# Track all active consumers and which securities each is subscribed to; a
+# ticker is subscribed at the Redis level while it has subscribers here
+subscription_index = SubscriptionIndex()
+ticker_ids = subscription_index.ticker_ids
+# Latest known price per ticker (micro-units), kept current by the listener so
+# snapshots for new subscribers are served from memory
+latest_prices = {}
+# Day open and statistics (day/52-week range, moving averages) per subscribed
+# ticker, kept current the same way
+day_opens = {}
+latest_stats = {}
+# Sequence number (price stream id) of the newest update seen by this process
+latest_seq = None
+# Track the connection ids of each authenticated user's open sockets
+user_consumers = {}
+# Running drain, see drain_connections
+drain_task = None
+# Running cache warm-up, and when the caches were last found or made warm,
+# see warm_up_caches
+warmup_task = None
+warm_checked_at = None
+# Seconds between checks that the Redis caches are still warm
+WARM_CHECK_INTERVAL = 10
+
+class Frame:
+    """
+    A message encoded once and shared by every connection it is sent to, in
+    both the WebSocket (`text`) and Server-Sent Events (`sse`) encodings.
+    """
+    __slots__ = ('text', 'seq', '_sse')
+
+    def __init__(self, message, seq=None):
+        self.text = json.dumps(message)
+        self.seq = seq
+        self._sse = None
+
+    @property
+    def sse(self):
+        if self._sse is None:
+            id_line = f"id: {self.seq}\n" if self.seq else ""
+            self._sse = f"{id_line}data: {self.text}\n\n".encode('utf-8')
+        return self._sse
+
+async def handle_price_update(channel, data):
+    """Fan a price update published on a ticker's price channel out to subscribers"""
+    global latest_seq
+    
+    ticker = channel_ticker(channel)
+    if ticker is None:
+        return
+    
+    try:
+
+        # Parse the message data
+        message_data = json.loads(data.decode('utf-8'))
+        price = message_data.get('price')
+        open_price = message_data.get('open')
+        stats = message_data.get('stats')
+        seq = message_data.get('seq')
+        if price is not None:
+            latest_prices[ticker] = price
+        if open_price is not None:
+            day_opens[ticker] = open_price
+        if stats is not None:
+            latest_stats[ticker] = stats
+        if seq is not None:
+            if latest_seq is None or parse_seq(seq) > parse_seq(latest_seq):
+                latest_seq = seq
+
+        # Send update to all consumers subscribed to this ticker, encoding the
+        # frame once for all of them. Prices are micro-units internally and
+        # floats in frames
+        if price is not None:
+            consumers = subscription_index.subscribers_of(ticker)
+            if consumers:
+                frame = Frame({
+                    'ticker': ticker,
+                    'price': price_to_float(price),
+                    'seq': seq,
+                    'stats': prices_to_floats(stats) if stats else stats,
+                    **day_change(price, day_opens.get(ticker))
+                }, seq)
+                for consumer in consumers:
+                    await consumer.send_frame(frame)
+
+            # Only the watchlists holding this ticker are recomputed
+            await send_watchlist_metrics(watchlist_metrics.update_price(ticker, price, open_price))
+    except Exception as e:
+        logger.error(f"Error processing message: {str(e)}")
+
+async def send_watchlist_metrics(states):
+    """Push watchlist metrics to the sockets following their owners' watchlists"""
+    for state in states:
+        frame = Frame(state.message())
+        for conn_id in list(user_consumers.get(state.user_id, ())):
+            consumer = subscription_index.consumer(conn_id)
+            if consumer and consumer.follow_watchlists:
+                await consumer.send_frame(frame)
+
+async def handle_control_message(channel, data):
+    """Handle messages on the broadcast control channel and this node's own channel"""
+    if channel != CONTROL_CHANNEL and channel != cluster_registry.channel:
+        return
+
+    global drain_task
+    
+    try:
+        message_data = json.loads(data.decode('utf-8'))
+        if message_data.get('type') == 'drain':
+            if drain_task is None:
+                drain_task = asyncio.create_task(
+                    drain_connections(message_data.get('window', DRAIN_WINDOW))
+                )
+        elif message_data.get('type') == 'user_event':
+            # Targeted at one user's sockets, see cluster.send_to_user
+            event = message_data.get('event', {})
+            for conn_id in list(user_consumers.get(message_data.get('user_id'), ())):
+                consumer = subscription_index.consumer(conn_id)
+                if consumer:
+                    await consumer.user_event(event)
+    except Exception as e:
+        logger.error(f"Error processing control message: {str(e)}")
+
+async def drain_connections(window):
+    """
+    Move this node's clients elsewhere ahead of a restart.
+
+    New connects are turned away, and every open socket is told to reconnect
+    after a random delay within `window` seconds, so the clients trickle over to
+    other nodes instead of stampeding them. Sockets still open after the window
+    are closed.
+    """
+    admission_controller.draining = True
+    consumers = [consumer for consumer in subscription_index.connections if consumer is not None]
+    logger.info(f"Draining {len(consumers)} connections over {window}s")
     
-    # Define the message handler for price updates
-    async def handle_price_update(channel, data):
+    for consumer in consumers:
         try:
-            # Extract ticker from channel name (stock:price:AAPL -> AAPL)
-            ticker = channel.split(':')[-1]
-            
-            # Parse the message data
-            message_data = json.loads(data.decode('utf-8'))
-            price = message_data.get('price')
-            
-            # Send update to all consumers subscribed to this ticker
-            if ticker in security_subscribers and price is not None:
-                for channel_name in security_subscribers[ticker]:
-                    consumer = active_consumers.get(channel_name)
-                    if consumer:
-                        await consumer.send(text_data=json.dumps({
-                            'ticker': ticker,
-                            'price': price
-                        }))
+            await consumer.send_text(json.dumps({
+                'type': 'reconnect',
+                'delay_ms': int(random.uniform(0, window) * 1000)
+            }))
         except Exception as e:
-            logger.error(f"Error processing message: {str(e)}")
+            logger.error(f"Error sending reconnect hint: {str(e)}")
     
-    # Register the handler
+    await asyncio.sleep(window + DRAIN_GRACE)
+    for consumer in list(subscription_index.connections):
+        if consumer is not None:
+            await consumer.close_connection(code=DRAINED_CLOSE_CODE)
+
+@database_sync_to_async
+def warm_redis_caches():
+    warm_caches(redis.Redis.from_url(settings.REDIS_URL))
+
+async def warm_up_caches():
+    """
+    Make sure the Redis caches are warm (see casestudy.warmup), so snapshots
+    have prices; concurrent callers wait for the same run.
+
+    `is_warm` is re-checked at most every WARM_CHECK_INTERVAL seconds, so a
+    Redis that lost its data after startup is warmed again, and a failed
+    warm-up is retried by the next caller.
+    """
+    global warmup_task, warm_checked_at
+    if warmup_task is None:
+        if warm_checked_at is not None and time.monotonic() - warm_checked_at < WARM_CHECK_INTERVAL:
+            return
+        warmup_task = asyncio.ensure_future(warm_redis_caches())
+    task = warmup_task
+    try:
+        await asyncio.shield(task)
+        warm_checked_at = time.monotonic()
+    except Exception as e:
+        # Snapshots fall back to prices published from now on
+        logger.error(f"Error warming Redis caches: {str(e)}")
+    finally:
+        if warmup_task is task:
+            warmup_task = None
+
+async def initialize_redis():
+    """
+    Warm the Redis caches and start the process-wide Redis listener.
+
+    Normally called once from the ASGI lifespan startup hook; consumers call it
+    too as a fallback for servers without lifespan support (e.g. daphne, which
+    runs the `websocket` service), so there the first connection waits for the
+    warm-up. After the first call this is only a flag check, plus a periodic
+    check that the caches are still warm.
+    """
+    await warm_up_caches()
     redis_listener.add_message_handler(handle_price_update)
-    
-    # Subscribe to all stock price updates
-    await redis_listener.subscribe("stock:price:*")
-    
-    # Start listening
+    redis_listener.add_message_handler(handle_control_message)
+    await redis_listener.subscribe(cluster_registry.channel)
     await redis_listener.start_listening()
-    
-    # Test the connection
-    is_working = await redis_listener.test_connection()
-    if is_working:
-        logger.info("Redis PubSub connection test successful")
-    else:
-        logger.error("Redis PubSub connection test failed")
-
-async def subscribe_to_ticker(ticker):
-    """Subscribe to a ticker if not already subscribed"""
-    global subscribed_securities
-    
-    if ticker not in subscribed_securities:
-        channel = f"stock:price:{ticker}"
-        await redis_listener.subscribe(channel)
-        subscribed_securities.add(ticker)
-        logger.info(f"Subscribed to Redis channel: {channel}")
-
-async def unsubscribe_from_ticker(ticker):
-    """Unsubscribe from a ticker if no consumers are subscribed"""
-    global subscribed_securities
-    
-    if ticker in subscribed_securities and (ticker not in security_subscribers or not security_subscribers[ticker]):
-        channel = f"stock:price:{ticker}"
-        await redis_listener.unsubscribe(channel)
-        subscribed_securities.remove(ticker)
-        logger.info(f"Unsubscribed from Redis channel: {channel}")
+    heartbeat_scheduler.start()
+    cluster_registry.start()
+
+async def subscribe_to_tickers(tickers):
+    """Subscribe at the Redis level to tickers that just got their first subscriber"""
+    if not tickers:
+        return
+
+    await redis_listener.subscribe(*[price_channel(ticker) for ticker in tickers])
+    logger.info(f"Subscribed to {len(tickers)} Redis price channels")
+
+async def unsubscribe_from_tickers(tickers):
+    """Unsubscribe at the Redis level from tickers that lost their last subscriber"""
+    if not tickers:
+        return
+
+    for ticker in tickers:
+        # No longer kept current by the listener
+        latest_prices.pop(ticker, None)
+        day_opens.pop(ticker, None)
+        latest_stats.pop(ticker, None)
+    await redis_listener.unsubscribe(*[price_channel(ticker) for ticker in tickers])
+    logger.info(f"Unsubscribed from {len(tickers)} Redis price channels")
+
+async def get_price_snapshot(tickers):
+    """
+    Return the current price of each ticker as a (prices, seq) tuple.
+
+    Prices are read from the in-memory table first, then from the host's
+    shared-memory price table; anything still missing is fetched from Redis in
+    a single pipelined round trip, together with the stream sequence number
+    the snapshot is at least as new as.
+    """
+    prices = {}
+    missing = []
+    for ticker in tickers:
+        if ticker in latest_prices:
+            prices[ticker] = latest_prices[ticker]
+        else:
+            missing.append(ticker)
+
+    seq = latest_seq
+    price_table = get_price_table()
+    if missing and price_table:
+        table_prices, table_seq = price_table.snapshot(missing)
+        for ticker, price in table_prices.items():
+            prices[ticker] = latest_prices.setdefault(ticker, price)
+        missing = [ticker for ticker in missing if ticker not in table_prices]
+        if seq is None or (table_seq and parse_seq(table_seq) < parse_seq(seq)):
+            seq = table_seq
+
+    redis_client = redis_listener.redis_client
+    if missing and redis_client:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            # Read the stream tail before the prices so they are at least as new
+            pipe.xrevrange(PRICE_STREAM_KEY, count=1)
+            pipe.hmget(PRICES_KEY, missing)
+            tail, values = await pipe.execute()
+
+        for ticker, price in parse_prices(missing, values).items():
+            prices[ticker] = latest_prices.setdefault(ticker, price)
+        if seq is None and tail:
+            seq = tail[0][0].decode('utf-8')
+
+    return prices, seq
+
+async def known_tickers(tickers):
+    """
+    Filter client-supplied tickers down to known securities.
+
+    Ticker ids are never freed, so tickers not interned yet are only accepted
+    if they have a name in Redis, looked up in one round trip.
+    """
+    tickers = valid_tickers(tickers)
+    unseen = [ticker for ticker in tickers if ticker not in ticker_ids.ids]
+    if not unseen:
+        return tickers
+
+    redis_client = redis_listener.redis_client
+    names = await redis_client.hmget(NAMES_KEY, unseen) if redis_client else [None] * len(unseen)
+    unknown = {ticker for ticker, name in zip(unseen, names) if name is None}
+    if unknown:
+        logger.info(f"Ignoring {len(unknown)} unknown tickers")
+    return tickers - unknown
+
+async def get_day_opens(tickers):
+    """Return the known day open of each ticker, fetching those not in memory in one round trip"""
+    opens = {}
+    missing = []
+    for ticker in tickers:
+        if ticker in day_opens:
+            opens[ticker] = day_opens[ticker]
+        else:
+            missing.append(ticker)
+
+    redis_client = redis_listener.redis_client
+    if missing and redis_client:
+        values = await redis_client.hmget(DAY_OPEN_KEY, missing)
+        for ticker, value in zip(missing, values):
+            if value is not None:
+                opens[ticker] = from_redis(value)
+                if subscription_index.has_subscribers(ticker):
+                    day_opens.setdefault(ticker, opens[ticker])
+    return opens
+
+async def get_missed_prices(tickers, resume_from):
+    """
+    Replay the updates for `tickers` appended to the price stream after `resume_from`.
+
+    Updates are collapsed to the latest price per ticker. Returns a (prices, seq)
+    tuple, or None if the client is too far behind and needs a snapshot instead.
+    """
+    resume_key = parse_seq(resume_from)
+    redis_client = redis_listener.redis_client
+    if resume_key is None or redis_client is None:
+        return None
+
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.xrange(PRICE_STREAM_KEY, count=1)
+        pipe.xrange(PRICE_STREAM_KEY, min=f"({resume_from}", count=MAX_RESUME_ENTRIES + 1)
+        oldest, entries = await pipe.execute()
+
+    # Updates after resume_from may already have been trimmed from the stream
+    if not oldest or parse_seq(oldest[0][0]) > resume_key:
+        return None
+    if len(entries) > MAX_RESUME_ENTRIES:
+        return None
+
+    prices = {}
+    for entry_id, fields in entries:
+        ticker = fields[b'ticker'].decode('utf-8')
+        if ticker in tickers:
+            prices[ticker] = from_redis(fields[b'price'])
+
+    seq = entries[-1][0].decode('utf-8') if entries else resume_from
+    return prices, seq
+
+class PriceSubscriber:
+    """
+    Connection side of the in-process fan-out hub, shared by the WebSocket
+    (`SecurityConsumer`) and Server-Sent Events (`PriceStreamConsumer`) tiers.
+
+    Subclasses implement `send_text`, `send_frame` and `close_connection` for
+    their transport.
+    """
+    # Whether heartbeats must be answered, see HeartbeatScheduler
+    expects_pongs = False
 
-class SecurityConsumer(AsyncWebsocketConsumer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.subscribed_securities = set()
+        # Subscription record, see SubscriptionIndex
+        self.subscription = None
+        self.follow_watchlists = False
+        self.user_id = None
+        # Sequence number to resume from on the first subscribe
+        self.resume_from = None
+        # Heartbeat bookkeeping, see HeartbeatScheduler
+        self.last_sent = time.monotonic()
+        self.last_received = time.monotonic()
+
+    async def send_text(self, text):
+        raise NotImplementedError
+
+    async def send_frame(self, frame):
+        raise NotImplementedError
+
+    async def close_connection(self, code=None):
+        raise NotImplementedError
+
+    async def register_subscriber(self):
+        """Add this connection to the hub"""
+        self.subscription = subscription_index.add_connection(self)
+        if self.user_id is not None:
+            user_consumers.setdefault(self.user_id, set()).add(self.subscription.conn_id)
+            await cluster_registry.register_user(self.user_id)
+        
+        # Hand the connection to the process-wide heartbeat scheduler
+        heartbeat_scheduler.add(self)
+
+    async def unregister_subscriber(self):
+        """Remove this connection from the hub; safe to call more than once"""
+        heartbeat_scheduler.remove(self)
+        
+        if self.subscription is None:
+            return
+        conn_id = self.subscription.conn_id
+        
+        # Unregister this consumer from all securities and from active consumers
+        idle_tickers = subscription_index.remove_connection(self.subscription)
+        self.subscription = None
+        
+        if self.user_id in user_consumers:
+            user_consumers[self.user_id].discard(conn_id)
+            if self.follow_watchlists and not any(
+                getattr(subscription_index.consumer(other), 'follow_watchlists', False)
+                for other in user_consumers[self.user_id]
+            ):
+                watchlist_metrics.untrack_user(self.user_id)
+            if not user_consumers[self.user_id]:
+                del user_consumers[self.user_id]
+                await cluster_registry.unregister_user(self.user_id)
+        
+        # If no more consumers are subscribed to these tickers, unsubscribe at Redis level
+        await unsubscribe_from_tickers(idle_tickers)
+
+    async def subscribe_to_securities(self, securities):
+        # Work out which securities are new for this consumer
+        mask = ticker_ids.mask(securities) & ~self.subscription.tickers
+        if not mask:
+            return
+        new_securities = set(ticker_ids.tickers_in(mask))
+        
+        # Register this consumer for all new securities, then subscribe at the
+        # Redis level in one call to those nobody else here was subscribed to
+        first_tickers = subscription_index.subscribe(self.subscription, mask)
+        await subscribe_to_tickers(first_tickers)
+        
+        # Send the missed updates if the client is resuming, otherwise the
+        # current prices, as a single frame
+        resume_from, self.resume_from = self.resume_from, None
+        try:
+            missed = await get_missed_prices(new_securities, resume_from) if resume_from else None
+            if missed is not None:
+                frame_type = 'delta'
+                prices, seq = missed
+            else:
+                frame_type = 'snapshot'
+                prices, seq = await get_price_snapshot(new_securities)
+            
+            if prices or seq:
+                opens = await get_day_opens(prices)
+                await self.send_frame(Frame({
+                    'type': frame_type,
+                    'prices': prices_to_floats(prices),
+                    'changes': {
+                        ticker: day_change(price, opens[ticker])
+                        for ticker, price in prices.items() if ticker in opens
+                    },
+                    'stats': {
+                        ticker: prices_to_floats(latest_stats[ticker]) for ticker in prices if ticker in latest_stats
+                    },
+                    'seq': seq
+                }, seq))
+        except Exception as e:
+            logger.error(f"Error sending initial prices: {str(e)}")
+                
+    async def unsubscribe_from_securities(self, securities):
+        # Unregister this consumer from each security
+        mask = ticker_ids.mask(securities, add=False)
+        idle_tickers = subscription_index.unsubscribe(self.subscription, mask)
+        
+        # Unsubscribe at the Redis level from tickers nobody watches any more
+        await unsubscribe_from_tickers(idle_tickers)
+
+    async def sync_watchlist_securities(self):
+        """Subscribe to the user's current watchlist securities and drop removed ones"""
+        tickers = await database_sync_to_async(get_user_watchlist_tickers)(self.user_id)
+        mask = ticker_ids.mask(tickers)
+        
+        subscription = self.subscription
+        added = mask & ~subscription.watchlist_tickers
+        removed = subscription.watchlist_tickers & ~mask & ~subscription.client_tickers
+        subscription.watchlist_tickers = mask
+        
+        await self.subscribe_to_securities(ticker_ids.tickers_in(added))
+        await self.unsubscribe_from_securities(ticker_ids.tickers_in(removed))
+        await self.sync_watchlist_metrics(tickers)
+
+    async def sync_watchlist_metrics(self, tickers):
+        """(Re)track the user's watchlists and send their current metrics"""
+        watchlists = await database_sync_to_async(get_user_watchlists)(self.user_id)
+        states = watchlist_metrics.track_user(self.user_id, watchlists)
+        
+        prices, _ = await get_price_snapshot(tickers)
+        opens = await get_day_opens(tickers)
+        for ticker in tickers:
+            watchlist_metrics.update_price(ticker, prices.get(ticker), opens.get(ticker))
+        
+        for state in states:
+            await self.send_frame(Frame(state.message()))
+    
+    async def user_event(self, event):
+        """Handle an event sent to this user through `cluster.send_to_user`"""
+        if event.get('type') == 'watchlists_changed':
+            await self.watchlists_changed()
+        else:
+            await self.send_text(json.dumps(event))
+    
+    async def watchlists_changed(self):
+        """Called when the user edited their watchlists through the REST endpoints"""
+        message = {'type': 'watchlists_changed'}
+        if self.follow_watchlists:
+            await self.sync_watchlist_securities()
+            message['securities'] = sorted(ticker_ids.tickers_in(self.subscription.watchlist_tickers))
+        
+        # Let the client refresh its watchlists without polling
+        await self.send_text(json.dumps(message))
+
+class SecurityConsumer(PriceSubscriber, AsyncWebsocketConsumer):
+    expects_pongs = True
         
     async def connect(self):
+        # Wait for a connect slot; when the node is overloaded or draining, tell
+        # the client when to come back instead
+        retry_after = await admission_controller.admit()
+        
         # Accept the connection
         await self.accept()
         
+        if retry_after is not None:
+            await self.send(text_data=json.dumps({
+                'type': 'reconnect',
+                'delay_ms': int(retry_after * 1000)
+            }))
+            await self.close(code=RETRY_AFTER_CLOSE_CODE)
+            return
+        
+        # A reconnecting client passes the last sequence number it saw, and is
+        # replayed only what it missed on its first subscribe
+        query_string = self.scope.get('query_string', b'').decode()
+        query_params = dict(urllib.parse.parse_qsl(query_string))
+        self.resume_from = query_params.get('resume_from')
+        
+        # With ?watchlists=1 the user's watchlist securities are subscribed
+        # server-side, saving the client the fetch-then-subscribe round trips
+        user = self.scope.get('user')
+        if user is not None and user.is_authenticated:
+            self.user_id = user.id
+            self.follow_watchlists = query_params.get('watchlists') in ('1', 'true')
+        
         try:
-            # Initialize the shared Redis connection if needed
+            # Make sure the process-wide listener is running
             await initialize_redis()
             
             # Register this consumer
-            active_consumers[self.channel_name] = self
+            await self.register_subscriber()
             
             # Send a connection confirmation
             await self.send(text_data=json.dumps({
@@ -101,40 +566,48 @@ class SecurityConsumer(AsyncWebsocketConsumer):
                 'message': 'Connected to WebSocket server'
             }))
             
-            # Start a heartbeat task to verify WebSocket is working
-            self.heartbeat_task = asyncio.create_task(self.send_heartbeat())
+            if self.follow_watchlists:
+                await self.sync_watchlist_securities()
         except Exception as e:
             logger.error(f"Error connecting to Redis: {str(e)}")
             await self.close(code=1011)  # Internal error
                 
     async def disconnect(self, close_code):
-        # Cancel heartbeat task if it exists
-        if hasattr(self, 'heartbeat_task') and self.heartbeat_task:
-            self.heartbeat_task.cancel()
-        
-        # Unregister this consumer from all securities
-        for ticker in list(self.subscribed_securities):
-            if ticker in security_subscribers and self.channel_name in security_subscribers[ticker]:
-                security_subscribers[ticker].remove(self.channel_name)
-                
-                # If no more consumers are subscribed to this ticker, unsubscribe at Redis level
-                await unsubscribe_from_ticker(ticker)
-        
-        # Remove from active consumers
-        if self.channel_name in active_consumers:
-            del active_consumers[self.channel_name]
+        await self.unregister_subscriber()
+            
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        self.last_sent = time.monotonic()
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+    async def send_text(self, text):
+        await self.send(text_data=text)
+
+    async def send_frame(self, frame):
+        await self.send(text_data=frame.text)
+
+    async def close_connection(self, code=None):
+        await self.close(code=code)
             
     async def receive(self, text_data):
+        # Anything from the client proves it is alive
+        self.last_received = time.monotonic()
+        
         try:
             data = json.loads(text_data)
             action = data.get('action')
             
-            if action == 'subscribe':
-                securities = data.get('securities', [])
+            if action == 'pong':
+                pass
+            elif action == 'subscribe':
+                securities = await known_tickers(data.get('securities', []))
+                self.subscription.client_tickers |= ticker_ids.mask(securities)
                 await self.subscribe_to_securities(securities)
             elif action == 'unsubscribe':
-                securities = data.get('securities', [])
-                await self.unsubscribe_from_securities(securities)
+                mask = ticker_ids.mask(data.get('securities', []), add=False)
+                self.subscription.client_tickers &= ~mask
+                # Securities still on a followed watchlist stay subscribed
+                mask &= ~self.subscription.watchlist_tickers
+                await self.unsubscribe_from_securities(ticker_ids.tickers_in(mask))
             else:
                 # Echo unknown messages for debugging
                 await self.send(text_data=json.dumps({
@@ -147,59 +620,3 @@ class SecurityConsumer(AsyncWebsocketConsumer):
                 'type': 'error',
                 'message': f'Error processing message: {str(e)}'
             }))
-            
-    async def subscribe_to_securities(self, securities):
-        # Add securities to the set of subscribed securities
-        new_securities = set(securities) - self.subscribed_securities
-        self.subscribed_securities.update(new_securities)
-        
-        # Register this consumer for each new security
-        for ticker in new_securities:
-            if ticker not in security_subscribers:
-                security_subscribers[ticker] = set()
-            security_subscribers[ticker].add(self.channel_name)
-            
-            # Subscribe at the Redis level if needed
-            await subscribe_to_ticker(ticker)
-            
-            # Send current price for this security
-            try:
-                # Get Redis client from the listener
-                redis_client = redis_listener.redis_client
-                if redis_client:
-                    price_data = await redis_client.hgetall(f"stock:price:{ticker}")
-                    
-                    if price_data and b'value' in price_data:
-                        price = price_data[b'value'].decode('utf-8')
-                        await self.send(text_data=json.dumps({
-                            'ticker': ticker,
-                            'price': price
-                        }))
-            except Exception as e:
-                logger.error(f"Error sending initial price for {ticker}: {str(e)}")
-                
-    async def unsubscribe_from_securities(self, securities):
-        # Remove securities from the set of subscribed securities
-        securities_to_remove = set(securities) & self.subscribed_securities
-        self.subscribed_securities -= securities_to_remove
-        
-        # Unregister this consumer from each security
-        for ticker in securities_to_remove:
-            if ticker in security_subscribers and self.channel_name in security_subscribers[ticker]:
-                security_subscribers[ticker].remove(self.channel_name)
-                
-                # If no more consumers are subscribed to this ticker, unsubscribe at Redis level
-                await unsubscribe_from_ticker(ticker)
-
-    async def send_heartbeat(self):
-        """Send periodic heartbeat messages to verify WebSocket is working"""
-        try:
-            while True:
-                await asyncio.sleep(10)  # Send heartbeat every 10 seconds
-                await self.send(text_data=json.dumps({
-                    'type': 'heartbeat',
-                    'timestamp': datetime.datetime.now().isoformat()
-                }))
-        except asyncio.CancelledError:
-            # Task was cancelled, clean up
-            pass 
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""
+Incrementally maintained watchlist metrics.
+
+Each node tracks the watchlists of users with a socket following their
+watchlists (`?watchlists=1`). A reverse index from ticker to watchlists means
+a price update touches only the watchlists holding that ticker: each keeps a
+running total of its securities' prices and day opens, adjusted by the
+difference rather than re-summed. Metrics are computed once here and pushed to
+the user's sockets, instead of every client deriving them from raw ticks.
+
+A watchlist holds no quantities, so its value is the sum of one share of each
+security. Prices and totals are integer micro-units (see casestudy.prices), so
+the adjusted totals never drift from a fresh sum.
+
+Watchlist ids are only unique within a database shard (see
+`casestudy.sharding`), so watchlists are tracked by (user id, watchlist id).
+"""
+from casestudy.price_stream import day_change
+from casestudy.prices import price_to_float
+
+
+class WatchlistState:
+    """Running totals of one watchlist"""
+    __slots__ = ('watchlist_id', 'user_id', 'tickers', 'value', 'open_value', 'priced', 'opened')
+
+    def __init__(self, watchlist_id, user_id, tickers):
+        self.watchlist_id = watchlist_id
+        self.user_id = user_id
+        self.tickers = tickers
+        self.value = 0
+        self.open_value = 0
+        # Number of tickers with a known price and a known day open
+        self.priced = 0
+        self.opened = 0
+
+    def message(self):
+        complete = self.priced == len(self.tickers) and self.opened == len(self.tickers)
+        message = {
+            'type': 'watchlist_metrics',
+            'watchlist_id': self.watchlist_id,
+            'value': price_to_float(self.value),
+            'complete': complete,
+        }
+        if complete:
+            message.update(day_change(self.value, self.open_value))
+        return message
+
+
+class WatchlistMetrics:
+    """Prices, day opens and tracked watchlists of one node"""
+    def __init__(self):
+        self.prices = {}
+        self.opens = {}
+        # (user id, watchlist id) -> WatchlistState
+        self.watchlists = {}
+        # User id -> keys of their tracked watchlists
+        self.user_watchlists = {}
+        # Ticker -> keys of tracked watchlists holding it
+        self.ticker_watchlists = {}
+
+    def track_user(self, user_id, watchlists):
+        """
+        Start (or restart) tracking a user's watchlists, given as (id, tickers) tuples.
+
+        Returns the user's WatchlistStates.
+        """
+        self.untrack_user(user_id)
+
+        states = []
+        for watchlist_id, tickers in watchlists:
+            key = (user_id, watchlist_id)
+            state = WatchlistState(watchlist_id, user_id, tuple(tickers))
+            for ticker in state.tickers:
+                self.ticker_watchlists.setdefault(ticker, set()).add(key)
+                if ticker in self.prices:
+                    state.value += self.prices[ticker]
+                    state.priced += 1
+                if ticker in self.opens:
+                    state.open_value += self.opens[ticker]
+                    state.opened += 1
+            self.watchlists[key] = state
+            states.append(state)
+
+        self.user_watchlists[user_id] = [(user_id, state.watchlist_id) for state in states]
+        return states
+
+    def untrack_user(self, user_id):
+        for key in self.user_watchlists.pop(user_id, ()):
+            state = self.watchlists.pop(key)
+            for ticker in state.tickers:
+                keys = self.ticker_watchlists.get(ticker)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self.ticker_watchlists[ticker]
+                        # Nothing tracked needs this ticker's totals any more
+                        self.prices.pop(ticker, None)
+                        self.opens.pop(ticker, None)
+
+    def update_price(self, ticker, price, open_price=None):
+        """
+        Apply a ticker's new micro-unit price and day open.
+
+        Returns the WatchlistStates that changed, or an empty list if the ticker
+        is in no tracked watchlist.
+        """
+        keys = self.ticker_watchlists.get(ticker)
+        if not keys:
+            return []
+
+        old_price = self.prices.get(ticker)
+        old_open = self.opens.get(ticker)
+        price = price if price is not None else old_price
+        open_price = open_price if open_price is not None else old_open
+        if price == old_price and open_price == old_open:
+            return []
+        if price is not None:
+            self.prices[ticker] = price
+        if open_price is not None:
+            self.opens[ticker] = open_price
+
+        states = []
+        for key in keys:
+            state = self.watchlists[key]
+            if price != old_price:
+                if old_price is None:
+                    state.priced += 1
+                    state.value += price
+                else:
+                    state.value += price - old_price
+            if open_price != old_open:
+                if old_open is None:
+                    state.opened += 1
+                    state.open_value += open_price
+                else:
+                    state.open_value += open_price - old_open
+            states.append(state)
+        return states
+
+
+# Create a singleton instance
+watchlist_metrics = WatchlistMetrics()
@@ -0,0 +1,107 @@
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import time
+
+logger = logging.getLogger('websocket')
+
+# Every idle connection gets a heartbeat once per interval (seconds)
+HEARTBEAT_INTERVAL = 10
+# Connections are spread over this many slots, one slot fired per tick
+HEARTBEAT_SLOTS = 10
+# Connections expecting pongs that sent nothing for this many intervals are closed
+MAX_MISSED_PONGS = 3
+
+
+class HeartbeatScheduler:
+    """
+    Process-wide heartbeat timer wheel.
+
+    Rather than one sleeping task per connection all firing in lockstep, every
+    connection is placed in one of `HEARTBEAT_SLOTS` slots and a single task
+    visits one slot per tick. A slot's connections are sent one pre-encoded
+    frame, except those that were sent data within the last interval.
+
+    Liveness comes from inbound traffic only: connections that expect pongs
+    and sent nothing for `MAX_MISSED_PONGS` intervals are closed, however busy
+    their outbound side is. Those that sent nothing for an interval get the
+    heartbeat even when busy, since clients only pong in answer to one.
+    """
+    def __init__(self):
+        self.slots = [set() for _ in range(HEARTBEAT_SLOTS)]
+        self.slot_counter = itertools.count()
+        self.running = False
+        self.task = None
+
+    def add(self, consumer):
+        slot = next(self.slot_counter) % HEARTBEAT_SLOTS
+        consumer.heartbeat_slot = slot
+        self.slots[slot].add(consumer)
+
+    def remove(self, consumer):
+        slot = getattr(consumer, 'heartbeat_slot', None)
+        if slot is not None:
+            self.slots[slot].discard(consumer)
+
+    def start(self):
+        """Start the wheel task; cheap and safe to call repeatedly"""
+        if self.running:
+            return
+        self.running = True
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.running = False
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        tick = HEARTBEAT_INTERVAL / HEARTBEAT_SLOTS
+        for slot in itertools.cycle(range(HEARTBEAT_SLOTS)):
+            await asyncio.sleep(tick)
+            try:
+                await self._fire(self.slots[slot])
+            except Exception as e:
+                logger.error(f"Error sending heartbeats: {str(e)}")
+
+    async def _fire(self, consumers):
+        if not consumers:
+            return
+
+        # Encoded once per tick and shared by every connection in the slot
+        frame = json.dumps({
+            'type': 'heartbeat',
+            'timestamp': datetime.datetime.now().isoformat()
+        })
+        now = time.monotonic()
+        idle_since = now - HEARTBEAT_INTERVAL
+        dead_since = now - MAX_MISSED_PONGS * HEARTBEAT_INTERVAL
+
+        for consumer in list(consumers):
+            if consumer.expects_pongs and consumer.last_received < dead_since:
+                logger.info(f"Closing unresponsive WebSocket {consumer.channel_name}")
+                consumers.discard(consumer)
+                await consumer.close_connection(code=4000)
+                continue
+
+            # Connections receiving price updates do not need a heartbeat,
+            # unless their client has been silent: it only pongs in answer to one
+            heard_from = not consumer.expects_pongs or consumer.last_received > idle_since
+            if consumer.last_sent > idle_since and heard_from:
+                continue
+
+            try:
+                await consumer.send_text(frame)
+            except Exception as e:
+                logger.error(f"Error sending heartbeat: {str(e)}")
+
+
+# Create a singleton instance
+heartbeat_scheduler = HeartbeatScheduler()
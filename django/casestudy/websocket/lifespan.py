@@ -0,0 +1,39 @@
+import logging
+from .consumers import initialize_redis
+from .redis_listener import redis_listener
+from .heartbeat import heartbeat_scheduler
+from .cluster import cluster_registry
+
+logger = logging.getLogger('websocket')
+
+class LifespanApp:
+    """
+    ASGI lifespan handler that owns the process-wide Redis listener.
+
+    Servers that speak the lifespan protocol (uvicorn, hypercorn) start the
+    listener here once per process. Servers without it (daphne) fall back to the
+    lazy start in `SecurityConsumer.connect`.
+
+    Startup completes, and the server accepts connections, only once the Redis
+    caches are warm (see casestudy.warmup), so the first snapshots have prices.
+    Under daphne the first connection waits for the warm-up instead.
+    """
+    async def __call__(self, scope, receive, send):
+        while True:
+            message = await receive()
+
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await initialize_redis()
+                except Exception as e:
+                    logger.error(f"Error starting Redis listener: {str(e)}")
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+
+            elif message['type'] == 'lifespan.shutdown':
+                await heartbeat_scheduler.stop()
+                await cluster_registry.stop()
+                await redis_listener.stop_listening()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -1,49 +1,119 @@
 import asyncio
-import json
 import logging
+import random
+import time
 import redis.asyncio as aioredis
 from django.conf import settings
 
 logger = logging.getLogger('websocket')
 
+# Channel the listener always holds, so the pubsub connection exists before
+# any client has subscribed to a ticker
+CONTROL_CHANNEL = 'ws:control'
+
+# Reconnect backoff bounds in seconds
+RECONNECT_BACKOFF_BASE = 0.5
+RECONNECT_BACKOFF_MAX = 30.0
+
 class RedisListener:
+    """
+    Process-wide Redis pub/sub listener shared by every WebSocket consumer.
+
+    The listener is started once per process and remembers every channel it
+    has been asked to subscribe to, so that when the connection drops it can
+    reconnect with backoff and restore all active subscriptions.
+    """
     def __init__(self):
         self.redis_client = None
         self.pubsub = None
         self.running = False
         self.listener_task = None
         self.message_handlers = []
+        self.channels = {CONTROL_CHANNEL}
         self.lock = asyncio.Lock()
-        
+        self.start_lock = asyncio.Lock()
+
+        # Health state
+        self.healthy = False
+        self.last_error = None
+        self.reconnect_attempts = 0
+        self.connected_at = None
+
     async def connect(self):
-        if self.redis_client is None:
-            self.redis_client = await aioredis.from_url('redis://redis:6379/0')
+        async with self.lock:
+            if self.redis_client is not None:
+                return
+            self.redis_client = aioredis.from_url(settings.REDIS_URL)
             self.pubsub = self.redis_client.pubsub()
-            
-    async def subscribe(self, pattern):
-        await self.connect()
+            # Restore every subscription recorded so far
+            await self.pubsub.subscribe(*self.channels)
+            self.healthy = True
+            self.last_error = None
+            self.reconnect_attempts = 0
+            self.connected_at = time.time()
+            logger.info(f"Redis listener connected, {len(self.channels)} channels subscribed")
+
+    async def _reset(self):
+        """Drop the current connection so the next `connect` starts fresh"""
         async with self.lock:
-            await self.pubsub.psubscribe(pattern)
-        
-    async def unsubscribe(self, channel):
-        if self.pubsub:
-            async with self.lock:
-                await self.pubsub.unsubscribe(channel)
-            
+            pubsub, client = self.pubsub, self.redis_client
+            self.pubsub = None
+            self.redis_client = None
+        for resource in (pubsub, client):
+            if resource is None:
+                continue
+            try:
+                await resource.aclose()
+            except Exception:
+                pass
+
+    async def subscribe(self, *channels):
+        async with self.lock:
+            new_channels = set(channels) - self.channels
+            if not new_channels:
+                return
+            self.channels.update(new_channels)
+            if self.pubsub is None:
+                # Picked up by `connect` once the listener is (re)connected
+                return
+            try:
+                await self.pubsub.subscribe(*new_channels)
+            except Exception as e:
+                # The listen loop notices the broken connection and resubscribes
+                logger.error(f"Error subscribing to {new_channels}: {str(e)}")
+
+    async def unsubscribe(self, *channels):
+        async with self.lock:
+            old_channels = (set(channels) & self.channels) - {CONTROL_CHANNEL}
+            if not old_channels:
+                return
+            self.channels -= old_channels
+            if self.pubsub is None:
+                return
+            try:
+                await self.pubsub.unsubscribe(*old_channels)
+            except Exception as e:
+                logger.error(f"Error unsubscribing from {old_channels}: {str(e)}")
+
     def add_message_handler(self, handler):
-        self.message_handlers.append(handler)
-        
+        if handler not in self.message_handlers:
+            self.message_handlers.append(handler)
+
     def remove_message_handler(self, handler):
         if handler in self.message_handlers:
             self.message_handlers.remove(handler)
-            
+
     async def start_listening(self):
+        """Start the listener task; cheap and safe to call repeatedly"""
         if self.running:
             return
-            
-        self.running = True
-        self.listener_task = asyncio.create_task(self._listen())
-        
+
+        async with self.start_lock:
+            if self.running:
+                return
+            self.running = True
+            self.listener_task = asyncio.create_task(self._listen())
+
     async def stop_listening(self):
         self.running = False
         if self.listener_task:
@@ -53,61 +123,63 @@ class RedisListener:
             except asyncio.CancelledError:
                 pass
             self.listener_task = None
-            
+        await self._reset()
+        self.healthy = False
+
     async def _listen(self):
-        await self.connect()
-        
-        try:
-            async with self.lock:
-                async for message in self.pubsub.listen():
-                    if not self.running:
-                        break
-                        
-                    if message['type'] == 'message' or message['type'] == 'pmessage':
-                        # Process message
-                        channel = message['channel'].decode('utf-8')
-                        data = message['data']
-                        
-                        # Call all registered handlers
-                        for handler in self.message_handlers:
-                            try:
-                                await handler(channel, data)
-                            except Exception as e:
-                                logger.error(f"Error in message handler: {str(e)}")
-        except asyncio.CancelledError:
-            logger.info("Redis listener task cancelled")
-        except Exception as e:
-            logger.error(f"Error in Redis listener: {str(e)}")
-            if self.running:
-                # Restart listening after a short delay
-                await asyncio.sleep(1)
-                self.listener_task = asyncio.create_task(self._listen())
+        while self.running:
+            try:
+                await self.connect()
+
+                while self.running:
+                    message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None:
+                        continue
+
+                    channel = message['channel'].decode('utf-8')
+                    data = message['data']
+
+                    # Call all registered handlers
+                    for handler in self.message_handlers:
+                        try:
+                            await handler(channel, data)
+                        except Exception as e:
+                            logger.error(f"Error in message handler: {str(e)}")
+            except asyncio.CancelledError:
+                logger.info("Redis listener task cancelled")
+                raise
+            except Exception as e:
+                self.healthy = False
+                self.last_error = str(e)
+                logger.error(f"Error in Redis listener: {str(e)}")
+                await self._reset()
+
+                # Exponential backoff with jitter so that every process does
+                # not hammer Redis at the same instant when it comes back
+                delay = min(RECONNECT_BACKOFF_MAX, RECONNECT_BACKOFF_BASE * (2 ** self.reconnect_attempts))
+                self.reconnect_attempts += 1
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    def health(self):
+        """Return a snapshot of the listener's health state"""
+        return {
+            'running': self.running,
+            'healthy': self.healthy,
+            'channels': len(self.channels),
+            'handlers': len(self.message_handlers),
+            'reconnect_attempts': self.reconnect_attempts,
+            'connected_at': self.connected_at,
+            'last_error': self.last_error,
+        }
 
     async def test_connection(self):
-        """Test Redis PubSub functionality with a separate connection"""
-        # Create a separate connection for testing
-        test_redis = await aioredis.from_url('redis://redis:6379/0')
-        test_pubsub = test_redis.pubsub()
-        
+        """Test the shared Redis connection without opening a new one"""
+        if self.redis_client is None:
+            return False
         try:
-            test_channel = "test:channel"
-            await test_pubsub.subscribe(test_channel)
-            
-            # Publish a test message
-            await test_redis.publish(test_channel, json.dumps({"test": "message"}))
-            
-            # Wait for the message with a timeout
-            received = False
-            async for message in test_pubsub.listen():
-                if message['type'] == 'message':
-                    received = True
-                    break
-                    
-            await test_pubsub.unsubscribe(test_channel)
-            return received
-        finally:
-            await test_pubsub.close()
-            await test_redis.close()
+            return await self.redis_client.ping()
+        except Exception:
+            return False
 
 # Create a singleton instance
-redis_listener = RedisListener() 
\ No newline at end of file
+redis_listener = RedisListener()
@@ -1,6 +1,13 @@
-from django.urls import re_path
+from django.urls import path, re_path
 from . import consumers
+from . import sse
 
 websocket_urlpatterns = [
     re_path(r'ws/securities/$', consumers.SecurityConsumer.as_asgi()),
-] 
\ No newline at end of file
+]
+
+# HTTP routes served by the ASGI app itself rather than Django views, mounted
+# under `stream/` in casestudy.asgi (nested routers only see the rest of the path)
+sse_urlpatterns = [
+    path('prices/', sse.PriceStreamConsumer.as_asgi()),
+]
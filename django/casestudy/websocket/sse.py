@@ -0,0 +1,117 @@
+import time
+import logging
+import urllib.parse
+from django.conf import settings
+from channels.exceptions import StopConsumer
+from channels.generic.http import AsyncHttpConsumer
+from .consumers import PriceSubscriber, initialize_redis, known_tickers, ticker_ids
+from .admission import admission_controller
+
+logger = logging.getLogger('websocket')
+
+# How long an EventSource client waits before reconnecting (milliseconds)
+SSE_RETRY_MS = 3000
+
+class PriceStreamConsumer(PriceSubscriber, AsyncHttpConsumer):
+    """
+    Server-Sent Events price stream for clients that cannot hold a WebSocket.
+
+        GET /stream/prices/?token=<user id>&tickers=AAPL,MSFT[&watchlists=1]
+
+    Subscribes through the same in-process fan-out hub and pre-encoded frames
+    as `SecurityConsumer`, and sends the same JSON messages as `data:` lines.
+    Frames carrying a price stream sequence number set the event id, so a
+    reconnecting EventSource's `Last-Event-ID` resumes like `?resume_from=`.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.streaming = False
+        self.closed = False
+
+    async def http_request(self, message):
+        # Unlike AsyncHttpConsumer, keep the consumer alive after `handle`
+        # while the stream is open; it stops on http.disconnect
+        if "body" in message:
+            self.body.append(message["body"])
+        if not message.get("more_body"):
+            try:
+                await self.handle(b"".join(self.body))
+            finally:
+                if not self.streaming:
+                    await self.disconnect()
+                    raise StopConsumer()
+
+    async def handle(self, body):
+        headers = dict(self.scope.get('headers', []))
+        cors_headers = []
+        origin = headers.get(b'origin', b'').decode()
+        if origin in settings.CORS_ALLOWED_ORIGINS:
+            cors_headers.append((b'Access-Control-Allow-Origin', origin.encode()))
+
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.send_response(401, b'Authentication required', headers=cors_headers)
+            return
+
+        retry_after = await admission_controller.admit()
+        if retry_after is not None:
+            await self.send_response(503, b'Try again later', headers=cors_headers + [
+                (b'Retry-After', str(int(retry_after) + 1).encode()),
+            ])
+            return
+
+        query_string = self.scope.get('query_string', b'').decode()
+        query_params = dict(urllib.parse.parse_qsl(query_string))
+        tickers = query_params.get('tickers', '').split(',')
+        self.user_id = user.id
+        self.follow_watchlists = query_params.get('watchlists') in ('1', 'true')
+        last_event_id = headers.get(b'last-event-id', b'').decode()
+        self.resume_from = last_event_id or query_params.get('resume_from')
+
+        try:
+            await initialize_redis()
+
+            await self.send_headers(headers=cors_headers + [
+                (b'Content-Type', b'text/event-stream'),
+                (b'Cache-Control', b'no-cache'),
+                (b'X-Accel-Buffering', b'no'),
+            ])
+            await self.send_body(f"retry: {SSE_RETRY_MS}\n\n".encode('utf-8'), more_body=True)
+            self.streaming = True
+
+            await self.register_subscriber()
+            tickers = await known_tickers(tickers)
+            if self.follow_watchlists:
+                await self.sync_watchlist_securities()
+            if tickers:
+                self.subscription.client_tickers |= ticker_ids.mask(tickers)
+                await self.subscribe_to_securities(tickers)
+        except Exception as e:
+            logger.error(f"Error opening price stream: {str(e)}")
+            await self.close_connection()
+
+    async def disconnect(self):
+        self.closed = True
+        await self.unregister_subscriber()
+
+    async def write(self, chunk):
+        if self.closed:
+            return
+        self.last_sent = time.monotonic()
+        await self.send_body(chunk, more_body=True)
+
+    async def send_text(self, text):
+        await self.write(f"data: {text}\n\n".encode('utf-8'))
+
+    async def send_frame(self, frame):
+        await self.write(frame.sse)
+
+    async def close_connection(self, code=None):
+        if self.closed:
+            return
+        self.closed = True
+        await self.unregister_subscriber()
+        if self.streaming:
+            await self.send_body(b'', more_body=False)
+        else:
+            await self.send_response(500, b'Internal error')
@@ -0,0 +1,182 @@
+"""
+Compact per-node subscription state.
+
+At millions of subscriptions, sets of ticker strings per connection and sets of
+channel-name strings per ticker are dominated by object overhead. Instead:
+
+- tickers are interned to small dense integer ids (`TickerIds`); ids are
+  never freed, so only known securities are given one (see
+  `consumers.known_tickers`), and at most `MAX_TICKER_IDS`
+- each connection gets a small integer id, reused after it disconnects, and a
+  `__slots__` `Subscription` record whose ticker sets are bitmasks over ticker
+  ids (one int instead of a set)
+- each ticker's subscribers are a sorted `array('I')` of connection ids, four
+  bytes per subscription
+
+`python manage.py measure_subscription_memory` reports the per-connection cost
+of this layout against the previous set-based one for several numbers of
+distinct tickers. Bitmasks grow with the highest ticker id they hold, so the
+saving is largest for small universes.
+"""
+import sys
+from array import array
+from bisect import bisect_left
+
+# Longest ticker accepted from clients
+MAX_TICKER_LENGTH = 16
+# Most tickers interned per node; ticker ids are never freed, and bitmasks
+# grow with the highest id in them
+MAX_TICKER_IDS = 65536
+
+
+class TickerIds:
+    """Interns ticker strings to small dense integer ids"""
+    def __init__(self, capacity=MAX_TICKER_IDS):
+        self.ids = {}
+        self.tickers = []
+        self.capacity = capacity
+
+    def id_for(self, ticker):
+        """Return a ticker's id, assigning one if needed; None once `capacity` ids are taken"""
+        ticker_id = self.ids.get(ticker)
+        if ticker_id is None:
+            if len(self.tickers) >= self.capacity:
+                return None
+            ticker = sys.intern(ticker)
+            ticker_id = len(self.tickers)
+            self.ids[ticker] = ticker_id
+            self.tickers.append(ticker)
+        return ticker_id
+
+    def mask(self, tickers, add=True):
+        """
+        Return the bitmask of a collection of tickers.
+
+        With `add=False` unknown tickers are skipped instead of assigned an id;
+        so are new tickers once the ids run out.
+        """
+        mask = 0
+        for ticker in tickers:
+            ticker_id = self.id_for(ticker) if add else self.ids.get(ticker)
+            if ticker_id is not None:
+                mask |= 1 << ticker_id
+        return mask
+
+    def tickers_in(self, mask):
+        """Return the tickers whose bits are set in `mask`"""
+        return [self.tickers[ticker_id] for ticker_id in ids_in(mask)]
+
+
+def ids_in(mask):
+    """Yield the ids whose bits are set in `mask`"""
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+def valid_tickers(tickers):
+    """Filter client-supplied tickers down to plausible ticker strings"""
+    return {
+        ticker for ticker in tickers
+        if isinstance(ticker, str) and 0 < len(ticker) <= MAX_TICKER_LENGTH
+    }
+
+
+class Subscription:
+    """
+    A connection's subscription record.
+
+    `client_tickers` are the tickers the client asked for, `watchlist_tickers`
+    those followed from the user's watchlists, and `tickers` their union, all
+    as bitmasks over ticker ids.
+    """
+    __slots__ = ('conn_id', 'tickers', 'client_tickers', 'watchlist_tickers')
+
+    def __init__(self, conn_id):
+        self.conn_id = conn_id
+        self.tickers = 0
+        self.client_tickers = 0
+        self.watchlist_tickers = 0
+
+
+class SubscriptionIndex:
+    """Connections and per-ticker subscriber indexes of one node"""
+    def __init__(self):
+        self.ticker_ids = TickerIds()
+        # Ticker id -> sorted array of subscribed connection ids
+        self.subscribers = []
+        # Connection id -> consumer, None for free ids
+        self.connections = []
+        self.free_conn_ids = []
+
+    def add_connection(self, consumer):
+        """Register a connection and return its Subscription record"""
+        if self.free_conn_ids:
+            conn_id = self.free_conn_ids.pop()
+            self.connections[conn_id] = consumer
+        else:
+            conn_id = len(self.connections)
+            self.connections.append(consumer)
+        return Subscription(conn_id)
+
+    def remove_connection(self, subscription):
+        """Unregister a connection; returns the tickers left without subscribers"""
+        idle_tickers = self.unsubscribe(subscription, subscription.tickers)
+        self.connections[subscription.conn_id] = None
+        self.free_conn_ids.append(subscription.conn_id)
+        return idle_tickers
+
+    def consumer(self, conn_id):
+        if conn_id < len(self.connections):
+            return self.connections[conn_id]
+        return None
+
+    def subscribe(self, subscription, mask):
+        """
+        Add the tickers in `mask` to a connection.
+
+        Returns the tickers that had no subscribers on this node before.
+        """
+        new_mask = mask & ~subscription.tickers
+        subscription.tickers |= new_mask
+
+        first_tickers = []
+        for ticker_id in ids_in(new_mask):
+            while len(self.subscribers) <= ticker_id:
+                self.subscribers.append(array('I'))
+            conn_ids = self.subscribers[ticker_id]
+            if not conn_ids:
+                first_tickers.append(self.ticker_ids.tickers[ticker_id])
+            conn_ids.insert(bisect_left(conn_ids, subscription.conn_id), subscription.conn_id)
+        return first_tickers
+
+    def unsubscribe(self, subscription, mask):
+        """
+        Remove the tickers in `mask` from a connection.
+
+        Returns the tickers left without subscribers on this node.
+        """
+        old_mask = mask & subscription.tickers
+        subscription.tickers &= ~old_mask
+
+        idle_tickers = []
+        for ticker_id in ids_in(old_mask):
+            conn_ids = self.subscribers[ticker_id]
+            position = bisect_left(conn_ids, subscription.conn_id)
+            if position < len(conn_ids) and conn_ids[position] == subscription.conn_id:
+                del conn_ids[position]
+            if not conn_ids:
+                idle_tickers.append(self.ticker_ids.tickers[ticker_id])
+        return idle_tickers
+
+    def subscribers_of(self, ticker):
+        """Return the consumers subscribed to a ticker"""
+        ticker_id = self.ticker_ids.ids.get(ticker)
+        if ticker_id is None or ticker_id >= len(self.subscribers):
+            return []
+        return [self.connections[conn_id] for conn_id in self.subscribers[ticker_id]]
+
+    def has_subscribers(self, ticker):
+        ticker_id = self.ticker_ids.ids.get(ticker)
+        return ticker_id is not None and ticker_id < len(self.subscribers) and len(self.subscribers[ticker_id]) > 0